@@ -0,0 +1,118 @@
+"""
+Бенчмарк сборки DOCX из ответа VLM в режиме «Сложный документ».
+
+Генерирует markdown, похожий на распознанный многостраничный скан (заголовки, абзацы с **жирным**,
+списки и по несколько таблиц на страницу), и сравнивает прежнюю сборку (регулярное выражение
+по всему тексту и абзац на каждую строку, таблицы остаются строками с «|») с MarkdownDocxRenderer.
+
+Для каждого варианта выводятся медианное время, размер файла и число абзацев и таблиц в документе.
+Сеть и ключи API не нужны.
+
+Запуск из корня проекта:
+    python -m benchmarks.docx_render
+    python -m benchmarks.docx_render --pages 50 --tables 3 --repeat 5
+"""
+import argparse
+import io
+import random
+import re
+import statistics
+import sys
+import time
+
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.shared import Pt
+
+from src.utils.markdown_docx import MarkdownDocxRenderer
+
+WORDS = (
+    "образовательной программы учащихся методических рекомендаций аттестации педагогических "
+    "работников учебного плана внеурочной деятельности результаты контрольной работы оценивания "
+    "федерального стандарта мониторинга качества"
+).split()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Сборка DOCX из markdown-ответа VLM")
+    parser.add_argument("--pages", type=int, default=50, help="Страниц в документе")
+    parser.add_argument("--tables", type=int, default=2, help="Таблиц на страницу")
+    parser.add_argument("--rows", type=int, default=15, help="Строк в таблице")
+    parser.add_argument("--cols", type=int, default=5, help="Столбцов в таблице")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов каждого варианта")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choices(WORDS, k=words))
+    return text[0].upper() + text[1:] + "."
+
+
+def generate_markdown(args: argparse.Namespace) -> str:
+    rng = random.Random(args.seed)
+    lines = ["Вот извлеченный текст документа:", ""]
+    for page in range(1, args.pages + 1):
+        lines += [f"## Раздел {page}. {sentence(rng, 4)[:-1]}", ""]
+        for _ in range(3):
+            lines += [f"{sentence(rng, 12)} **{sentence(rng, 3)}** {sentence(rng, 10)}", ""]
+        lines += [f"- {sentence(rng, 6)}" for _ in range(3)] + [""]
+        for table in range(args.tables):
+            header = [f"Показатель {col}" for col in range(1, args.cols + 1)]
+            lines.append("| " + " | ".join(header) + " |")
+            lines.append("|" + "---|" * args.cols)
+            for row in range(args.rows):
+                cells = [" ".join(rng.choices(WORDS, k=2))] + [str(rng.randint(1, 999)) for _ in range(args.cols - 1)]
+                lines.append("| " + " | ".join(cells) + " |")
+            lines.append("")
+    return "\n".join(lines)
+
+
+def legacy_docx(md_text: str, title: str = "Распознанный документ") -> io.BytesIO:
+    """Прежняя create_formatted_docx."""
+    doc = Document()
+    style = doc.styles['Normal']
+    style.font.name = 'Times New Roman'
+    style.font.size = Pt(12)
+    clean_text = re.sub(r'^(Вот|Here is|Результат|Analysis|Извлеченный|Ниже).*?[:\n]', '', md_text,
+                        flags=re.IGNORECASE | re.DOTALL).strip()
+    doc.add_heading(title, 0).alignment = WD_ALIGN_PARAGRAPH.CENTER
+    for line in clean_text.split('\n'):
+        line = line.strip()
+        if line: doc.add_paragraph(line)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def measure(name: str, render, md_text: str, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        buffer = render(md_text, "Распознанный документ")
+        timings.append(time.perf_counter() - started)
+    doc = Document(buffer)
+    print(
+        f"{name:>10} {statistics.median(timings):>9.3f} {len(buffer.getvalue()) / 1024:>10.0f} "
+        f"{len(doc.paragraphs):>8} {len(doc.tables):>8}"
+    )
+    return statistics.median(timings)
+
+
+def main() -> int:
+    args = parse_args()
+    md_text = generate_markdown(args)
+    print(
+        f"Markdown: {len(md_text) / 1024:.0f} КБ, {args.pages} страниц, "
+        f"{args.pages * args.tables} таблиц {args.rows}x{args.cols}\n"
+    )
+    print(f"{'Вариант':>10} {'Время, с':>9} {'Файл, КБ':>10} {'Абзацев':>8} {'Таблиц':>8}")
+    legacy = measure("legacy", legacy_docx, md_text, args.repeat)
+    renderer = measure("renderer", MarkdownDocxRenderer().render, md_text, args.repeat)
+    print(f"\nУскорение: {legacy / renderer:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
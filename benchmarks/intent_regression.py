@@ -0,0 +1,66 @@
+"""
+Регрессионный тест распознавания small talk (IntentEngine).
+
+Для размеченных сообщений проверяет, что чистый small talk получает готовый ответ нужного намерения,
+а настоящие запросы («Помоги составить план», «Умеешь писать отчеты?») уходят в модель.
+При расхождении завершается с кодом 1, поэтому его можно запускать в CI. Сеть и ключи API не нужны.
+
+Запуск из корня проекта:
+    python -m benchmarks.intent_regression
+"""
+import os
+import sys
+
+# Сообщение -> ожидаемое намерение готового ответа (None — запрос должен уйти в модель)
+CASES = {
+    "Привет!": "greeting",
+    "Добрый день": "greeting",
+    "Здравствуйте, бот": "greeting",
+    "Спасибо большое!": "thanks",
+    "Ну спасибо": "thanks",
+    "Кто ты?": "about",
+    "А ты кто такой?": "about",
+    "Что ты умеешь?": "abilities",
+    "А что вы умеете?": "abilities",
+    "Привет! Что умеешь?": "abilities",
+    "Чем можешь помочь?": "abilities",
+    "Помощь": "abilities",
+    "Помощь, пожалуйста": "abilities",
+    "Помоги составить план": None,
+    "Помощь с отчетом": None,
+    "Помоги написать сценарий": None,
+    "Умеешь писать отчеты?": None,
+    "Помоги мне с методичкой": None,
+    "Что ты думаешь о ФГОС?": None,
+    "Привет, как оформить методичку?": None,
+    "Спасибо, а где график аттестации?": None,
+    "Архайский период": None,
+}
+
+
+def configure_env():
+    """config требует ключи при импорте; для проверки намерений они не используются."""
+    for name in ("BOT_TOKEN", "YANDEX_API_KEY", "YANDEX_FOLDER_ID", "ADMIN_ID"):
+        os.environ.setdefault(name, "offline" if name != "BOT_TOKEN" else "123456:offline-benchmark")
+
+
+def main() -> int:
+    configure_env()
+    from src.services.intent_service import IntentEngine
+
+    engine = IntentEngine()
+    failures = []
+    for text, expected in CASES.items():
+        answer = engine.answer(text, "Коллега")
+        intent = answer[0] if answer else None
+        if intent != expected:
+            failures.append(f"{text!r}: ожидалось {expected}, получено {intent}")
+
+    print(f"Сообщений: {len(CASES)}, расхождений: {len(failures)}")
+    for failure in failures:
+        print(f"  {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""
+Офлайн нагрузочный тест бота.
+
+Поднимает локальные заглушки Yandex Cloud API и Telegram Bot API, собирает настоящий
+Dispatcher со всеми роутерами и прогоняет через feed_update синтетические апдейты.
+Сеть наружу не нужна: HTTP-пул Yandex API перенаправлен на заглушку, бот ходит в локальный Bot API.
+
+Запуск из корня проекта:
+    python -m benchmarks.load_test --scenario all --users 20 --messages 5
+    python -m benchmarks.load_test --scenario text --gpt-latency 3 --error-rate 0.1 --json result.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.stubs import DEFAULT_PROFILES, EndpointProfile, YandexStubServer, TelegramStubServer, RedirectTransport
+
+QUESTIONS = [
+    "Как составить рабочую программу по математике для 5 класса?",
+    "Какие требования ФГОС к планируемым результатам обучения?",
+    "Как оформить тематическое планирование по литературе?",
+    "Что должно быть в пояснительной записке к программе?",
+    "Как организовать проектную деятельность в начальной школе?",
+    "Какие формы контроля использовать на уроках истории?",
+    "Как учитывать воспитательный компонент в рабочей программе?",
+    "Какие критерии оценивания устных ответов рекомендуются?",
+]
+BROADCAST_TEXT = "Напоминаем о вебинаре по обновленным ФГОС в четверг в 15:00."
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Офлайн нагрузочный тест Методиста")
+    parser.add_argument("--scenario", choices=["text", "recognition", "broadcast", "all"], default="all")
+    parser.add_argument("--users", type=int, default=20, help="Одновременных пользователей")
+    parser.add_argument("--messages", type=int, default=5, help="Сообщений на пользователя")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Пауза пользователя между сообщениями, с")
+    parser.add_argument("--recipients", type=int, default=500, help="Получателей рассылки")
+    parser.add_argument("--recognition-types", default="simple,simple,simple,describe",
+                        help="Режимы распознавания по кругу (simple, complex, describe)")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Множитель задержек всех заглушек")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ошибок (429/503) у заглушек Yandex")
+    parser.add_argument("--gpt-latency", type=float, help="Медианная задержка completion, с")
+    parser.add_argument("--telegram-latency", type=float, help="Медианная задержка Bot API, с")
+    parser.add_argument("--no-outbound", action="store_true",
+                        help="Без очередей исходящих сообщений (вызовы Bot API напрямую, как до них)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", type=Path, help="Сохранить результаты в JSON (для сравнения прогонов)")
+    return parser.parse_args()
+
+
+def build_profiles(args: argparse.Namespace) -> dict[str, EndpointProfile]:
+    profiles = {}
+    for name, default in DEFAULT_PROFILES.items():
+        profile = EndpointProfile(default.latency * args.latency_scale, default.jitter,
+                                  0.0 if name == "telegram" else args.error_rate, default.error_statuses)
+        profiles[name] = profile
+    if args.gpt_latency is not None:
+        profiles["gpt"].latency = args.gpt_latency
+    if args.telegram_latency is not None:
+        profiles["telegram"].latency = args.telegram_latency
+    return profiles
+
+
+def configure_env(workdir: Path):
+    """Окружение задается до импорта src: config читает переменные при загрузке модуля."""
+    os.environ.setdefault("BOT_TOKEN", "123456:offline-benchmark")
+    os.environ.setdefault("YANDEX_API_KEY", "offline")
+    os.environ.setdefault("YANDEX_FOLDER_ID", "offline")
+    os.environ.setdefault("ADMIN_ID", "1")
+    os.environ["RUN_MODE"] = "polling"
+    # Рабочую базу не трогаем
+    os.environ["DB_NAME"] = str(workdir / "benchmark.db")
+    # Бюджеты токенов отключены, чтобы замерять штатный путь, а не экономный режим
+    os.environ.setdefault("USER_DAILY_TOKEN_BUDGET", "0")
+    os.environ.setdefault("DAILY_TOKEN_BUDGET", "0")
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(name: str, latencies: list[float], errors: int, wall: float) -> dict:
+    count = len(latencies)
+    return {
+        "scenario": name,
+        "count": count,
+        "errors": errors,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "throughput": count / wall if wall else 0.0,
+        "wall_seconds": wall,
+    }
+
+
+class LoadTest:
+    def __init__(self, args: argparse.Namespace, profiles: dict[str, EndpointProfile]):
+        self.args = args
+        self.profiles = profiles
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.send_latencies: dict[str, list[float]] = {}
+
+    async def setup(self):
+        import httpx
+        from aiogram import Bot, Dispatcher
+        from aiogram.client.default import DefaultBotProperties
+        from aiogram.client.session.aiohttp import AiohttpSession
+        from aiogram.client.telegram import TelegramAPIServer
+        from aiogram.enums import ParseMode
+        from aiogram.fsm.storage.memory import MemoryStorage
+
+        from src.config import ADMIN_ID, BOT_TOKEN
+        from src.handlers import get_user_router, get_admin_router
+        from src.middlewares.metrics import HandlerMetricsMiddleware
+        from src.middlewares.outbound import OutboundDispatcher
+        from src.services.api_scheduler import api_scheduler
+        from src.services.database import db
+
+        self.yandex = YandexStubServer(self.profiles)
+        self.telegram = TelegramStubServer(self.profiles["telegram"])
+        yandex_base = await self.yandex.start()
+        telegram_base = await self.telegram.start()
+
+        # Общий HTTP-пул планировщика создается лениво — подменяем его клиентом с перенаправлением на заглушку
+        api_scheduler._client = httpx.AsyncClient(transport=RedirectTransport(yandex_base))
+        self.api_scheduler = api_scheduler
+
+        db.init_db()
+        self.db = db
+        self.admin_id = int(ADMIN_ID)
+
+        session = AiohttpSession(api=TelegramAPIServer.from_base(telegram_base))
+        session.middleware(self._time_request)
+        if not self.args.no_outbound:
+            session.middleware(OutboundDispatcher())
+        self.bot = Bot(token=BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+        self.dp = Dispatcher(storage=MemoryStorage())
+        handler_metrics = HandlerMetricsMiddleware()
+        self.dp.message.middleware(handler_metrics)
+        self.dp.callback_query.middleware(handler_metrics)
+        self.dp.include_router(get_admin_router())
+        self.dp.include_router(get_user_router())
+
+    async def teardown(self):
+        from src.services.history_manager import history_manager
+        await history_manager.close()
+        await self.api_scheduler.close()
+        await self.bot.session.close()
+        await self.yandex.stop()
+        await self.telegram.stop()
+        self.db.close()
+
+    async def _time_request(self, make_request, bot, method):
+        """Middleware сессии бота: задержка каждого вызова Bot API с точки зрения бота."""
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            self.send_latencies.setdefault(type(method).__name__, []).append(time.perf_counter() - started)
+
+    def _update(self, user_id: int, **content):
+        from aiogram.types import Update
+        message = {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Учитель", "last_name": str(user_id)},
+            **content,
+        }
+        return Update.model_validate({"update_id": next(self.update_ids), "message": message},
+                                     context={"bot": self.bot})
+
+    async def _feed(self, update) -> tuple[float, bool]:
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+            ok = True
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Апдейт {update.update_id} завершился ошибкой: {e}")
+            ok = False
+        return time.perf_counter() - started, ok
+
+    async def _run_users(self, make_update) -> tuple[list[float], int, float]:
+        """
+        Каждый пользователь шлет сообщения последовательно, пользователи работают параллельно.
+
+        :param make_update: Корутина (user_id, номер сообщения) -> Update.
+        """
+        latencies: list[float] = []
+        errors = 0
+
+        async def user_loop(user_id: int):
+            nonlocal errors
+            for n in range(self.args.messages):
+                latency, ok = await self._feed(await make_update(user_id, n))
+                latencies.append(latency)
+                errors += not ok
+                if self.args.think_time:
+                    await asyncio.sleep(random.expovariate(1 / self.args.think_time))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user_loop(10_000 + i) for i in range(self.args.users)))
+        return latencies, errors, time.perf_counter() - started
+
+    async def scenario_text(self) -> dict:
+        async def make_update(user_id: int, n: int):
+            return self._update(user_id, text=QUESTIONS[(user_id + n) % len(QUESTIONS)])
+
+        latencies, errors, wall = await self._run_users(make_update)
+        return summarize("text_qa", latencies, errors, wall)
+
+    async def scenario_recognition(self) -> dict:
+        from src.core.states import DialogStates
+        kinds = self.args.recognition_types.split(",")
+
+        async def make_update(user_id: int, n: int):
+            context = self.dp.fsm.get_context(self.bot, chat_id=user_id, user_id=user_id)
+            await context.set_state(DialogStates.recognition_mode)
+            await context.update_data(recognition_type=kinds[(user_id + n) % len(kinds)])
+            file_id = f"photo{user_id}_{n}"
+            return self._update(user_id, photo=[
+                {"file_id": f"{file_id}_s", "file_unique_id": f"{file_id}_s", "width": 320, "height": 240},
+                {"file_id": file_id, "file_unique_id": file_id, "width": 1280, "height": 960, "file_size": 200_000},
+            ])
+
+        latencies, errors, wall = await self._run_users(make_update)
+        return summarize("recognition", latencies, errors, wall)
+
+    async def scenario_broadcast(self) -> dict:
+        for i in range(self.args.recipients):
+            self.db.add_user(500_000 + i, f"user{i}", f"Учитель {i}")
+        self.send_latencies.pop("SendMessage", None)
+        latency, ok = await self._feed(self._update(self.admin_id, text=f"/broadcast {BROADCAST_TEXT}"))
+        sends = self.send_latencies.get("SendMessage", [])
+        # Пропускная способность считается по исходящим сообщениям, задержка — по каждому sendMessage
+        result = summarize("broadcast", sends, 0 if ok else 1, latency)
+        result["update_seconds"] = latency
+        return result
+
+
+def print_report(results: list[dict], stubs: list):
+    print(f"\n{'сценарий':<14}{'кол-во':>8}{'ошибок':>8}{'p50, с':>10}{'p95, с':>10}{'p99, с':>10}{'сообщ/с':>10}")
+    for r in results:
+        print(f"{r['scenario']:<14}{r['count']:>8}{r['errors']:>8}{r['p50']:>10.3f}{r['p95']:>10.3f}"
+              f"{r['p99']:>10.3f}{r['throughput']:>10.1f}")
+    for stub in stubs:
+        calls = ", ".join(f"{name}={count} (ошибок {stub.stats.errors.get(name, 0)})"
+                          for name, count in sorted(stub.stats.calls.items()))
+        print(f"{type(stub).__name__}: {calls or 'нет вызовов'}")
+
+
+async def run(args: argparse.Namespace) -> list[dict]:
+    load_test = LoadTest(args, build_profiles(args))
+    await load_test.setup()
+    results = []
+    try:
+        scenarios = ["text", "recognition", "broadcast"] if args.scenario == "all" else [args.scenario]
+        for name in scenarios:
+            results.append(await getattr(load_test, f"scenario_{name}")())
+        print_report(results, [load_test.yandex, load_test.telegram])
+    finally:
+        await load_test.teardown()
+    return results
+
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_env(Path(workdir))
+        results = asyncio.run(run(args))
+    if args.json:
+        args.json.write_text(json.dumps({"args": {k: str(v) for k, v in vars(args).items()}, "results": results},
+                                        ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Бенчмарк памяти на пути фото -> Yandex Vision / VLM.
+
+Сравнивает прежнюю схему (BytesIO.getvalue() -> b64encode().decode() -> f-строка data URL -> json=)
+с потоковой (BytesIO.getbuffer() -> Base64JsonBody): для каждого размера изображения и каждой схемы
+в отдельном процессе выполняются запросы OCR и VLM через api_scheduler, а тело запроса вычитывается
+транспортом-заглушкой по частям, как это делает настоящий сетевой транспорт.
+
+Замеряются пиковый RSS процесса сверх исходного (ru_maxrss) и пик аллокаций Python (tracemalloc)
+на один запрос. Сеть не используется.
+
+Запуск из корня проекта:
+    python -m benchmarks.media_memory
+    python -m benchmarks.media_memory --sizes 2,10 --requests 5
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tracemalloc
+
+VARIANTS = ("legacy", "streaming")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Пиковая память на запрос распознавания фото")
+    parser.add_argument("--sizes", default="1,5,10", help="Размеры изображения в МБ через запятую")
+    parser.add_argument("--requests", type=int, default=3, help="Запросов OCR и VLM на каждый замер")
+    parser.add_argument("--child", nargs=2, metavar=("VARIANT", "SIZE_MB"), help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def configure_env():
+    """config требует ключи при импорте; запросы уходят в заглушку."""
+    for name in ("BOT_TOKEN", "YANDEX_API_KEY", "YANDEX_FOLDER_ID", "ADMIN_ID"):
+        os.environ.setdefault(name, "offline" if name != "BOT_TOKEN" else "123456:offline-benchmark")
+
+
+def max_rss_mb() -> float:
+    # ru_maxrss на Linux в КБ, на macOS в байтах
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+async def run_child(variant: str, size_mb: float, requests: int) -> dict:
+    import httpx
+
+    from src.services.api_scheduler import api_scheduler
+    from src.services.ocr_service import YandexOCRService
+    from src.services.yandex_gpt import YandexGPTService
+
+    class DrainTransport(httpx.AsyncBaseTransport):
+        """Вычитывает тело запроса по частям и отвечает готовым JSON, как Vision и VLM."""
+
+        def __init__(self):
+            self.sent = 0
+
+        async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+            async for chunk in request.stream:
+                self.sent += len(chunk)
+            if "chat/completions" in str(request.url):
+                body = {"choices": [{"message": {"content": "описание"}}]}
+            else:
+                body = {"results": [{"results": [{"textDetection": {"pages": [{"blocks": []}]}}]}]}
+            return httpx.Response(200, json=body)
+
+    transport = DrainTransport()
+    api_scheduler._client = httpx.AsyncClient(transport=transport)
+    ocr_service, gpt_service = YandexOCRService(), YandexGPTService()
+
+    async def legacy_ocr(photo: io.BytesIO):
+        # Прежний recognize_text: копия байтов, строка base64 и JSON целиком в памяти
+        encoded = base64.b64encode(photo.getvalue()).decode("utf-8")
+        payload = {"folderId": ocr_service.folder_id, "analyze_specs": [{
+            "content": encoded, "features": [{"type": "TEXT_DETECTION"}]
+        }]}
+        await api_scheduler.request("vision", "POST", ocr_service.api_url, headers=ocr_service.headers, json=payload)
+
+    async def legacy_vlm(photo: io.BytesIO):
+        # Прежний encode_image_to_base64 + generate_vlm_response
+        image_base64 = base64.b64encode(photo.getvalue()).decode("utf-8")
+        data = {"model": "gemma", "messages": [{"role": "user", "content": [
+            {"type": "text", "text": "Опиши"},
+            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}},
+        ]}]}
+        await api_scheduler.request("vlm", "POST", gpt_service.vlm_url, json=data)
+
+    async def streaming_ocr(photo: io.BytesIO):
+        view = photo.getbuffer()
+        try:
+            await ocr_service.recognize_text(view)
+        finally:
+            view.release()
+
+    async def streaming_vlm(photo: io.BytesIO):
+        view = photo.getbuffer()
+        try:
+            await gpt_service.generate_vlm_response("Опиши", view)
+        finally:
+            view.release()
+
+    calls = (legacy_ocr, legacy_vlm) if variant == "legacy" else (streaming_ocr, streaming_vlm)
+    # Несжимаемые случайные байты, как у JPEG; BytesIO — то же, что дает bot.download
+    photo = io.BytesIO(os.urandom(int(size_mb * 1024 * 1024)))
+
+    # Прогрев: импорты, пул соединений, ленивые структуры httpx не должны попадать в замер
+    await calls[0](io.BytesIO(b"warmup"))
+    rss_before = max_rss_mb()
+    tracemalloc.start()
+    for _ in range(requests):
+        for call in calls:
+            await call(photo)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await api_scheduler.close()
+    return {
+        "variant": variant,
+        "size_mb": size_mb,
+        "rss_peak_mb": max_rss_mb() - rss_before,
+        "traced_peak_mb": traced_peak / (1024 * 1024),
+        "sent_mb": transport.sent / (1024 * 1024) / (requests * len(calls)),
+    }
+
+
+def measure(variant: str, size_mb: float, requests: int) -> dict:
+    """Каждый замер — в новом процессе: ru_maxrss только растет и не сбрасывается между замерами."""
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.media_memory", "--requests", str(requests), "--child", variant, str(size_mb)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> int:
+    args = parse_args()
+    configure_env()
+    if args.child:
+        variant, size_mb = args.child
+        print(json.dumps(asyncio.run(run_child(variant, float(size_mb), args.requests))))
+        return 0
+
+    print(f"{'Размер':>8} {'Схема':>10} {'RSS пик, МБ':>12} {'Python пик, МБ':>15} {'Тело, МБ':>9}")
+    for size_mb in (float(size) for size in args.sizes.split(",")):
+        results = {variant: measure(variant, size_mb, args.requests) for variant in VARIANTS}
+        for variant, result in results.items():
+            print(
+                f"{size_mb:>6g}МБ {variant:>10} {result['rss_peak_mb']:>12.1f} "
+                f"{result['traced_peak_mb']:>15.1f} {result['sent_mb']:>9.2f}"
+            )
+        legacy, streaming = results["legacy"], results["streaming"]
+        if streaming["traced_peak_mb"]:
+            print(f"{'':>8} {'выигрыш':>10} {legacy['rss_peak_mb'] - streaming['rss_peak_mb']:>+12.1f} "
+                  f"{legacy['traced_peak_mb'] / streaming['traced_peak_mb']:>14.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
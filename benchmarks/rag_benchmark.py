@@ -0,0 +1,215 @@
+"""
+Бенчмарк и регрессионный тест поиска RagEngine.
+
+Для реального корпуса data/markdown и его синтетического расширения (по умолчанию 1k, 10k и 100k
+документов) замеряет время построения индекса, занимаемую память и задержку запросов,
+а по размеченному набору вопрос -> slug (rag_queries.json) считает MRR и recall@k.
+Синтетические документы собраны из словаря реального корпуса и служат "шумом",
+на фоне которого реальные документы должны по-прежнему находиться.
+
+Результаты сравниваются с rag_baseline.json; при ухудшении скорости или качества сверх
+допусков скрипт завершается с кодом 1, поэтому его можно запускать в CI. Качество (MRR, recall)
+проверяется для всех корпусов, скорость и память — только для корпусов от --speed-min-docs документов:
+на реальном корпусе из нескольких документов время измеряется миллисекундами и зависит от машины сильнее,
+чем от кода.
+
+Запуск из корня проекта:
+    python -m benchmarks.rag_benchmark
+    python -m benchmarks.rag_benchmark --sizes 1000,10000 --update-baseline
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent
+QUERIES_PATH = BENCH_DIR / "rag_queries.json"
+BASELINE_PATH = BENCH_DIR / "rag_baseline.json"
+RANK_DEPTH = 5
+# Абсолютный запас к допуску скорости: колебания таймера и нагрузки машины не считаются регрессией
+SPEED_FLOORS = {"build_seconds": 0.05, "memory_mb": 1.0, "query_p95_ms": 2.0}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска по базе знаний")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Размеры синтетических корпусов через запятую")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="Записать текущие результаты как эталон")
+    parser.add_argument("--speed-tolerance", type=float, default=0.5,
+                        help="Допустимое относительное ухудшение времени и памяти (0.5 = +50%%)")
+    parser.add_argument("--quality-tolerance", type=float, default=0.02,
+                        help="Допустимое абсолютное снижение MRR и recall")
+    parser.add_argument("--speed-min-docs", type=int, default=1000,
+                        help="Скорость и память сравниваются с эталоном только для корпусов от стольких документов")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def configure_env():
+    """config требует ключи при импорте; для бенчмарка поиска они не используются."""
+    for name in ("BOT_TOKEN", "YANDEX_API_KEY", "YANDEX_FOLDER_ID", "ADMIN_ID"):
+        os.environ.setdefault(name, "offline" if name != "BOT_TOKEN" else "123456:offline-benchmark")
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def build_vocabulary(markdown_dir: Path) -> tuple[list[str], list[int]]:
+    """Слова реального корпуса с частотами — для правдоподобных синтетических документов."""
+    counter = Counter()
+    for md_file in markdown_dir.glob("*.md"):
+        counter.update(re.findall(r"[а-яё]{4,}", md_file.read_text(encoding="utf-8", errors="ignore").lower()))
+    words, weights = zip(*counter.most_common())
+    return list(words), list(weights)
+
+
+def generate_corpus(target: Path, real_dir: Path, size: int, vocabulary: tuple[list[str], list[int]],
+                    rng: random.Random):
+    """Реальные документы + (size - реальные) синтетических."""
+    target.mkdir(parents=True)
+    real_files = list(real_dir.glob("*.md"))
+    for md_file in real_files:
+        shutil.copy(md_file, target / md_file.name)
+
+    words, weights = vocabulary
+    for i in range(size - len(real_files)):
+        title = " ".join(rng.choices(words, weights, k=rng.randint(4, 8))).capitalize()
+        sections = []
+        for _ in range(rng.randint(2, 4)):
+            heading = " ".join(rng.choices(words, weights, k=3)).capitalize()
+            body = " ".join(rng.choices(words, weights, k=rng.randint(30, 60)))
+            sections.append(f"## {heading}\n\n{body}.")
+        (target / f"synthetic_{i:06d}.md").write_text(
+            f'---\ntitle: "{title}"\nslug: "synthetic_{i:06d}"\nfile_name: "synthetic_{i:06d}.pdf"\n---\n\n'
+            + "\n\n".join(sections),
+            encoding="utf-8"
+        )
+
+
+def measure(name: str, markdown_dir: Path, queries: list[dict]) -> dict:
+    from src.services.rag_engine import RagEngine
+
+    gc.collect()
+    started = time.perf_counter()
+    engine = RagEngine(markdown_dir)
+    build_seconds = time.perf_counter() - started
+    documents = len(engine.documents)
+    del engine
+
+    # Память замеряется отдельным построением: tracemalloc заметно замедляет загрузку
+    gc.collect()
+    tracemalloc.start()
+    engine = RagEngine(markdown_dir)
+    memory_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+    tracemalloc.stop()
+
+    latencies = []
+    reciprocal_ranks = []
+    hits = {1: 0, 3: 0}
+    for item in queries:
+        started = time.perf_counter()
+        ranked = engine.rank(item["question"], limit=RANK_DEPTH)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        slugs = [doc.metadata.get("slug") for _, doc in ranked]
+        position = slugs.index(item["slug"]) + 1 if item["slug"] in slugs else None
+        reciprocal_ranks.append(1 / position if position else 0.0)
+        for k in hits:
+            hits[k] += bool(position and position <= k)
+
+    return {
+        "corpus": name,
+        "documents": documents,
+        "build_seconds": round(build_seconds, 3),
+        "memory_mb": round(memory_mb, 1),
+        "query_p50_ms": round(percentile(latencies, 50), 2),
+        "query_p95_ms": round(percentile(latencies, 95), 2),
+        "mrr": round(sum(reciprocal_ranks) / len(queries), 4),
+        "recall@1": round(hits[1] / len(queries), 4),
+        "recall@3": round(hits[3] / len(queries), 4),
+    }
+
+
+def find_regressions(results: list[dict], baseline: dict, speed_tolerance: float, quality_tolerance: float,
+                     speed_min_docs: int) -> list[str]:
+    problems = []
+    for result in results:
+        reference = baseline.get(result["corpus"])
+        if not reference:
+            continue
+        for key in ("build_seconds", "memory_mb", "query_p95_ms") if result["documents"] >= speed_min_docs else ():
+            limit = max(reference[key] * (1 + speed_tolerance), reference[key] + SPEED_FLOORS[key])
+            if result[key] > limit:
+                problems.append(f"{result['corpus']}: {key} {result[key]} > {limit:.2f} (эталон {reference[key]})")
+        for key in ("mrr", "recall@1", "recall@3"):
+            limit = reference[key] - quality_tolerance
+            if result[key] < limit:
+                problems.append(f"{result['corpus']}: {key} {result[key]} < {limit:.4f} (эталон {reference[key]})")
+    return problems
+
+
+def print_report(results: list[dict]):
+    print(f"\n{'корпус':<10}{'док.':>8}{'сборка, с':>11}{'память, МБ':>12}{'p50, мс':>10}{'p95, мс':>10}"
+          f"{'MRR':>8}{'R@1':>7}{'R@3':>7}")
+    for r in results:
+        print(f"{r['corpus']:<10}{r['documents']:>8}{r['build_seconds']:>11.3f}{r['memory_mb']:>12.1f}"
+              f"{r['query_p50_ms']:>10.2f}{r['query_p95_ms']:>10.2f}{r['mrr']:>8.3f}{r['recall@1']:>7.2f}"
+              f"{r['recall@3']:>7.2f}")
+
+
+def main() -> int:
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    configure_env()
+    from src.config import MARKDOWN_DIR
+
+    queries = json.loads(QUERIES_PATH.read_text(encoding="utf-8"))
+    rng = random.Random(args.seed)
+    results = [measure("real", MARKDOWN_DIR, queries)]
+
+    vocabulary = build_vocabulary(MARKDOWN_DIR)
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in (int(value) for value in args.sizes.split(",") if value):
+            corpus_dir = Path(workdir) / str(size)
+            generate_corpus(corpus_dir, MARKDOWN_DIR, size, vocabulary, rng)
+            results.append(measure(str(size), corpus_dir, queries))
+            shutil.rmtree(corpus_dir)
+
+    print_report(results)
+
+    if args.update_baseline:
+        args.baseline.write_text(
+            json.dumps({r["corpus"]: r for r in results}, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+        )
+        print(f"\nЭталон обновлен: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print("\nЭталон не найден, сравнение пропущено (запустите с --update-baseline).")
+        return 0
+    problems = find_regressions(results, json.loads(args.baseline.read_text(encoding="utf-8")),
+                                args.speed_tolerance, args.quality_tolerance, args.speed_min_docs)
+    if problems:
+        print("\nРЕГРЕССИЯ:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    print("\nРегрессий нет.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Локальные заглушки Yandex Cloud API и Telegram Bot API для офлайн-бенчмарков.
+
+Задержка и ошибки каждого эндпоинта задаются профилем (EndpointProfile), поэтому можно
+воспроизводить как штатную работу, так и деградацию внешних сервисов (429, 5xx, медленные ответы).
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from dataclasses import dataclass, field
+
+import httpx
+from aiohttp import web
+
+
+@dataclass
+class EndpointProfile:
+    """
+    Поведение заглушки одного эндпоинта.
+
+    :param latency: Медианная задержка ответа, в секундах.
+    :param jitter: Разброс задержки (логнормальное распределение, sigma).
+    :param error_rate: Доля ответов с ошибкой.
+    :param error_statuses: Коды ошибок, из которых выбирается случайный.
+    """
+    latency: float = 0.1
+    jitter: float = 0.3
+    error_rate: float = 0.0
+    error_statuses: tuple[int, ...] = (429, 503)
+
+    def delay(self) -> float:
+        return self.latency * random.lognormvariate(0, self.jitter) if self.jitter else self.latency
+
+    def error_status(self) -> int | None:
+        if self.error_rate and random.random() < self.error_rate:
+            return random.choice(self.error_statuses)
+        return None
+
+
+# Задержки по умолчанию — порядок величин, наблюдаемый у реальных API
+DEFAULT_PROFILES = {
+    "gpt": EndpointProfile(latency=1.5),
+    "gpt_lite": EndpointProfile(latency=0.6),
+    "vlm": EndpointProfile(latency=4.0),
+    "vision": EndpointProfile(latency=0.8),
+    "stt": EndpointProfile(latency=0.6),
+    "tts": EndpointProfile(latency=0.7),
+    "search": EndpointProfile(latency=3.0),
+    "telegram": EndpointProfile(latency=0.05, jitter=0.2),
+}
+
+_ANSWER = (
+    "Для <b>рабочей программы</b> по предмету учитывайте требования ФГОС: планируемые результаты, "
+    "содержание учебного предмета и тематическое планирование с указанием количества часов. "
+) * 4
+
+
+@dataclass
+class _Stats:
+    calls: dict[str, int] = field(default_factory=dict)
+    errors: dict[str, int] = field(default_factory=dict)
+
+    def count(self, name: str, error: bool):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if error:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+
+class _StubServer:
+    def __init__(self, profiles: dict[str, EndpointProfile]):
+        self.profiles = profiles
+        self.stats = _Stats()
+        self.app = web.Application(client_max_size=64 * 1024 * 1024)
+        self._runner: web.AppRunner | None = None
+        self.port: int | None = None
+
+    async def start(self, host: str = "127.0.0.1") -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{self.port}"
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _simulate(self, name: str) -> web.Response | None:
+        """Выдерживает задержку профиля; возвращает ответ-ошибку, если она выпала."""
+        profile = self.profiles[name]
+        await asyncio.sleep(profile.delay())
+        status = profile.error_status()
+        self.stats.count(name, status is not None)
+        if status is None:
+            return None
+        headers = {"Retry-After": "1"} if status == 429 else None
+        return web.json_response({"error": "stub"}, status=status, headers=headers)
+
+
+class YandexStubServer(_StubServer):
+    """Заглушки completion, chat/completions, batchAnalyze, STT, TTS и gen/search."""
+
+    def __init__(self, profiles: dict[str, EndpointProfile]):
+        super().__init__(profiles)
+        self.app.router.add_post("/foundationModels/v1/completion", self.completion)
+        self.app.router.add_post("/v1/chat/completions", self.chat_completions)
+        self.app.router.add_post("/vision/v1/batchAnalyze", self.batch_analyze)
+        self.app.router.add_post("/speech/v1/stt:recognize", self.stt)
+        self.app.router.add_post("/speech/v1/tts:synthesize", self.tts)
+        self.app.router.add_post("/v2/gen/search", self.search)
+
+    async def completion(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if error := await self._simulate("gpt_lite" if "-lite/" in body.get("modelUri", "") else "gpt"):
+            return error
+        prompt_chars = sum(len(message.get("text", "")) for message in body.get("messages", []))
+        text = json.dumps({"text": _ANSWER, "suggestions": ["Пример КТП", "Требования ФГОС"]}, ensure_ascii=False)
+        return web.json_response({"result": {
+            "alternatives": [{"message": {"role": "assistant", "text": text}, "status": "ALTERNATIVE_STATUS_FINAL"}],
+            "usage": {"inputTextTokens": str(prompt_chars // 4), "completionTokens": str(len(text) // 4)},
+        }})
+
+    async def chat_completions(self, request: web.Request) -> web.Response:
+        await request.read()
+        if error := await self._simulate("vlm"):
+            return error
+        return web.json_response({
+            "choices": [{"message": {"role": "assistant", "content": _ANSWER}}],
+            "usage": {"prompt_tokens": 1200, "completion_tokens": len(_ANSWER) // 4},
+        })
+
+    async def batch_analyze(self, request: web.Request) -> web.Response:
+        await request.read()
+        if error := await self._simulate("vision"):
+            return error
+        lines = [{"words": [{"text": word} for word in sentence.split()]} for sentence in _ANSWER.split(". ") if sentence]
+        return web.json_response({"results": [{"results": [{"textDetection": {"pages": [{"blocks": [{"lines": lines}]}]}}]}]})
+
+    async def stt(self, request: web.Request) -> web.Response:
+        await request.read()
+        if error := await self._simulate("stt"):
+            return error
+        return web.json_response({"result": "Как составить рабочую программу по математике"})
+
+    async def tts(self, request: web.Request) -> web.Response:
+        await request.read()
+        if error := await self._simulate("tts"):
+            return error
+        return web.Response(body=b"OggS" + bytes(16 * 1024), content_type="audio/ogg")
+
+    async def search(self, request: web.Request) -> web.Response:
+        await request.read()
+        if error := await self._simulate("search"):
+            return error
+        return web.json_response([{
+            "message": {"role": "assistant", "content": _ANSWER},
+            "sources": [{"url": "https://edu.gov.ru/", "title": "Минпросвещения России", "used": True}],
+        }])
+
+
+class TelegramStubServer(_StubServer):
+    """
+    Заглушка Bot API: отвечает на любой метод правдоподобным результатом
+    и отдает файлы по /file/bot<token>/<path>. Подключается через TelegramAPIServer.from_base().
+    """
+
+    def __init__(self, profile: EndpointProfile, file_size: int = 200 * 1024):
+        super().__init__({"telegram": profile})
+        self.file_body = b"\xff\xd8\xff\xe0" + bytes(file_size)
+        self._message_ids = itertools.count(1_000_000)
+        self.sent_at: list[float] = []
+        self.app.router.add_post("/bot{token}/{method}", self.method)
+        self.app.router.add_get("/file/bot{token}/{path:.+}", self.file)
+
+    async def method(self, request: web.Request) -> web.Response:
+        name = request.match_info["method"]
+        form = await request.post()
+        if error := await self._simulate("telegram"):
+            return web.json_response(
+                {"ok": False, "error_code": error.status, "description": "Too Many Requests: retry after 1",
+                 "parameters": {"retry_after": 1}} if error.status == 429 else
+                {"ok": False, "error_code": error.status, "description": "Internal Server Error"},
+                status=error.status
+            )
+        if name.startswith("send"):
+            self.sent_at.append(time.perf_counter())
+        return web.json_response({"ok": True, "result": self._result(name, form)})
+
+    def _result(self, name: str, form) -> object:
+        if name == "getMe":
+            return {"id": 123456, "is_bot": True, "first_name": "Методист", "username": "methodist_bench_bot"}
+        if name == "getFile":
+            file_id = form.get("file_id", "file")
+            return {"file_id": file_id, "file_unique_id": f"u{file_id}", "file_size": len(self.file_body),
+                    "file_path": f"photos/{file_id}.jpg"}
+        if name.startswith("send") or name.startswith("edit"):
+            chat_id = int(form.get("chat_id") or 0)
+            return {"message_id": next(self._message_ids), "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"}, "text": form.get("text", "")}
+        return True
+
+    async def file(self, request: web.Request) -> web.Response:
+        if error := await self._simulate("telegram"):
+            return error
+        return web.Response(body=self.file_body, content_type="application/octet-stream")
+
+
+class RedirectTransport(httpx.AsyncBaseTransport):
+    """Перенаправляет запросы к *.api.cloud.yandex.net на локальную заглушку (пути у эндпоинтов различаются)."""
+
+    def __init__(self, base_url: str):
+        self.target = httpx.URL(base_url)
+        self.inner = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=200))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.url = request.url.copy_with(scheme=self.target.scheme, host=self.target.host, port=self.target.port)
+        request.headers["Host"] = request.url.netloc.decode()
+        return await self.inner.handle_async_request(request)
+
+    async def aclose(self):
+        await self.inner.aclose()
@@ -0,0 +1,141 @@
+"""
+Бенчмарк очистки и разбиения длинных HTML-ответов для Telegram.
+
+Генерирует ответы модели по ~50 КБ (абзацы с <b>, <i>, **markdown**, ссылки, эмодзи, сущности, HTML-таблицы,
+блоки <pre><code> и «мусорные» теги) и сравнивает прежнюю схему (шесть регулярных выражений + textwrap.wrap)
+с однопроходными clean_html_for_telegram и split_html_for_telegram.
+
+Каждое сообщение проверяется валидатором, повторяющим правила Telegram: только поддерживаемые теги,
+правильная вложенность, известные сущности, не больше 4096 видимых символов. Невалидное сообщение
+в боте означает TelegramBadRequest и повторную отправку, то есть лишний запрос к Bot API.
+Сеть и ключи API не нужны.
+
+Запуск из корня проекта:
+    python -m benchmarks.telegram_html
+    python -m benchmarks.telegram_html --answers 50 --size 50
+"""
+import argparse
+import random
+import re
+import statistics
+import sys
+import textwrap
+import time
+from html import unescape
+
+from src.utils.text_tools import ALLOWED_TAGS, MESSAGE_LIMIT, clean_html_for_telegram, split_html_for_telegram
+
+WORDS = (
+    "учебный план методической работы педагог аттестация программа внеурочной деятельности "
+    "оценивание результатов федеральный стандарт мониторинг качества урок"
+).split()
+_TAG_RE = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9-]*)[^>]*>")
+_ENTITY_RE = re.compile(r"&(#\d+|#x[0-9a-fA-F]+|lt|gt|amp|quot);")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Очистка и разбиение HTML для Telegram")
+    parser.add_argument("--answers", type=int, default=20, help="Число ответов")
+    parser.add_argument("--size", type=int, default=50, help="Размер ответа, КБ")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def generate_answer(rng: random.Random, size_kb: int) -> str:
+    parts: list[str] = []
+    total = 0
+    while total < size_kb * 1024:
+        kind = rng.random()
+        words = lambda count: " ".join(rng.choices(WORDS, k=count))
+        if kind < 0.55:
+            part = (f"{words(15)} <b>{words(3)}</b> {words(10)} **{words(2)}** {words(8)} "
+                    f"<i>{words(4)} <u>{words(2)}</u></i> 📌 {words(6)} &amp; {words(5)}.\n\n")
+        elif kind < 0.7:
+            part = "".join(f"• {words(7)} <a href='https://example.org/{rng.randint(1, 999)}?a=1&b=2'>{words(2)}</a>\n"
+                           for _ in range(4)) + "\n"
+        elif kind < 0.8:
+            rows = "".join(f"<tr><td>{words(2)}</td><td>{rng.randint(1, 99)}</td></tr>" for _ in range(5))
+            part = f"<table>{rows}</table>\n"
+        elif kind < 0.9:
+            part = f"<pre><code class=\"language-python\">if score < 5 and **x**:\n    print('{words(3)}')</code></pre>\n\n"
+        else:
+            part = f"<div><p>{words(10)}&nbsp;— {words(6)}</p><span>{words(4)}</span> 3 < 5</div>\n"
+        parts.append(part)
+        total += len(part.encode("utf-8"))
+    return "".join(parts)
+
+
+def legacy_clean(text: str) -> str:
+    """Прежняя clean_html_for_telegram."""
+    text = re.sub(r'<!DOCTYPE.*?>', '', text, flags=re.IGNORECASE | re.DOTALL)
+    text = re.sub(r'<br\s*/?>', '\n', text, flags=re.IGNORECASE)
+    text = re.sub(r'</?(table|tr|div|p|body|html|head).*?>', '\n', text, flags=re.IGNORECASE)
+    text = re.sub(r'<td.*?>', ' ', text, flags=re.IGNORECASE)
+    text = re.sub(r'</td>', ' | ', text, flags=re.IGNORECASE)
+    text = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', text)
+    return text.strip()
+
+
+def legacy_split(text: str) -> list[str]:
+    """Разбиение из прежней send_split_message."""
+    text = legacy_clean(text)
+    if len(text) <= 4096:
+        return [text]
+    return textwrap.wrap(text, width=4000, replace_whitespace=False, drop_whitespace=False)
+
+
+def new_split(text: str) -> list[str]:
+    return split_html_for_telegram(clean_html_for_telegram(text))
+
+
+def telegram_accepts(chunk: str) -> bool:
+    """Упрощенная проверка Telegram Bot API для parse_mode=HTML."""
+    stack: list[str] = []
+    position = 0
+    for match in _TAG_RE.finditer(chunk):
+        if "<" in chunk[position:match.start()]:
+            return False
+        position = match.end()
+        name = match.group(2).lower()
+        if name not in ALLOWED_TAGS:
+            return False
+        if match.group(1):
+            if not stack or stack.pop() != name:
+                return False
+        else:
+            stack.append(name)
+    if stack or "<" in chunk[position:]:
+        return False
+    text = _TAG_RE.sub("", chunk)
+    if "&" in _ENTITY_RE.sub("", text):
+        return False
+    return len(unescape(text).encode("utf-16-le")) // 2 <= MESSAGE_LIMIT
+
+
+def measure(name: str, split, answers: list[str]):
+    timings, messages, rejected = [], 0, 0
+    for answer in answers:
+        started = time.perf_counter()
+        chunks = split(answer)
+        timings.append(time.perf_counter() - started)
+        messages += len(chunks)
+        rejected += sum(not telegram_accepts(chunk) for chunk in chunks)
+    # Каждое отклоненное сообщение отправляется второй раз без разметки
+    calls = messages + rejected
+    print(f"{name:>10} {statistics.median(timings) * 1000:>10.2f} {messages / len(answers):>11.1f} "
+          f"{rejected / len(answers):>11.1f} {calls / len(answers):>11.1f}")
+
+
+def main() -> int:
+    args = parse_args()
+    rng = random.Random(args.seed)
+    answers = [generate_answer(rng, args.size) for _ in range(args.answers)]
+    print(f"{args.answers} ответов по ~{args.size} КБ\n")
+    print(f"{'Вариант':>10} {'мс/ответ':>10} {'сообщений':>11} {'отклонено':>11} {'запросов':>11}")
+    measure("legacy", legacy_split, answers)
+    measure("tokenizer", new_split, answers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,31 +1,155 @@
 import asyncio
 import logging
-import sys
+import signal
 
+from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
-from src.config import BOT_TOKEN
+from src.config import (
+    BOT_TOKEN, RUN_MODE, SHUTDOWN_TIMEOUT, METRICS_HOST, METRICS_PORT, LOGS_DIR,
+    LOG_LEVEL, SLOW_HANDLER_SECONDS, PROFILE_SAMPLE_INTERVAL,
+    WEBHOOK_BASE_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET
+)
+from src.core.lifecycle import LifecycleManager
+from src.core.tracing import setup_logging, create_slow_trace_logger, StackSampler
 from src.services.database import db
+from src.services.api_scheduler import api_scheduler
+from src.services.token_accounting import token_accountant
+from src.services.history_manager import history_manager
+from src.services.file_search_service import file_search_service
+from src.services.metrics import FSM_SESSIONS, INFLIGHT_UPDATES, start_metrics_server
 from src.handlers import get_user_router, get_admin_router
+from src.middlewares.inflight import InFlightMiddleware
+from src.middlewares.metrics import HandlerMetricsMiddleware
+from src.middlewares.outbound import outbound_dispatcher
+from src.middlewares.tracing import TracingMiddleware
+
+logger = logging.getLogger(__name__)
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """
+    Обработчик вебхука, который во время остановки отвечает 503.
+    Telegram повторит доставку апдейта позже или на другую реплику за балансировщиком.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, lifecycle: LifecycleManager, **kwargs):
+        super().__init__(dispatcher=dispatcher, bot=bot, **kwargs)
+        self.lifecycle = lifecycle
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self.lifecycle.accepting:
+            return web.Response(status=503, text="Shutting down")
+        return await super().handle(request)
+
+
+async def run_polling(bot: Bot, dp: Dispatcher) -> None:
+    """
+    Запуск в режиме long polling.
+    Накопившиеся за время перезапуска апдейты не сбрасываются, а обрабатываются после старта.
+    Остановка: aiogram прекращает опрос, затем dp.shutdown вызывает LifecycleManager.shutdown
+    (ожидание обработчиков и закрытие ресурсов), и только после этого закрывается сессия бота.
+    """
+    await bot.delete_webhook(drop_pending_updates=False)
+    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, lifecycle: LifecycleManager) -> None:
+    """
+    Запуск в режиме вебхука на aiohttp. Можно держать несколько реплик за балансировщиком.
+    При SIGINT/SIGTERM перестает принимать апдейты и дожидается начатых ответов.
+    """
+    app = web.Application()
+    handler = DrainingRequestHandler(dispatcher=dp, bot=bot, lifecycle=lifecycle, secret_token=WEBHOOK_SECRET)
+    handler.register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+
+    # Накопившиеся апдейты не сбрасываем: Telegram доставит их на новый адрес
+    await bot.set_webhook(
+        f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=False
+    )
+    logger.info(f"Вебхук слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows: остановка по Ctrl+C придет как KeyboardInterrupt
+            pass
+
+    try:
+        await stop_event.wait()
+    finally:
+        # Сначала дожидаемся обработчиков: при cleanup aiohttp закроет сессию бота
+        await lifecycle.shutdown()
+        # Вебхук не удаляем: остальные реплики продолжают принимать апдейты
+        await runner.cleanup()
+
 
 async def main() -> None:
     db.init_db()
     storage = MemoryStorage()
     bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    # Все исходящие сообщения — через очереди чатов с общим лимитом и повтором при RetryAfter
+    bot.session.middleware(outbound_dispatcher)
     dp = Dispatcher(storage=storage)
 
+    sampler = None
+    if PROFILE_SAMPLE_INTERVAL > 0:
+        sampler = StackSampler(PROFILE_SAMPLE_INTERVAL)
+        sampler.start()
+    dp.update.outer_middleware(TracingMiddleware(
+        SLOW_HANDLER_SECONDS, create_slow_trace_logger(LOGS_DIR / "slow_traces.jsonl"), sampler
+    ))
+
+    inflight = InFlightMiddleware()
+    dp.update.outer_middleware(inflight)
+
+    handler_metrics = HandlerMetricsMiddleware()
+    dp.message.middleware(handler_metrics)
+    dp.callback_query.middleware(handler_metrics)
+    FSM_SESSIONS.set_function(lambda: sum(1 for record in storage.storage.values() if record.state))
+    INFLIGHT_UPDATES.set_function(lambda: inflight.count)
+
+    lifecycle = LifecycleManager(inflight, SHUTDOWN_TIMEOUT)
+    lifecycle.add_resource("База данных", db.close)
+    # Буфер учета токенов сбрасывается до закрытия базы (ресурсы закрываются в обратном порядке)
+    token_accountant.start()
+    file_search_service.start()
+    lifecycle.add_resource("Учет токенов", token_accountant.close)
+    lifecycle.add_resource("HTTP-пул Yandex API", api_scheduler.close)
+    lifecycle.add_resource("Сжатие истории диалогов", history_manager.close)
+    if sampler:
+        lifecycle.add_resource("Профилировщик стеков", sampler.stop)
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+        lifecycle.add_resource("Эндпоинт метрик", metrics_runner.cleanup)
+    dp.shutdown.register(lifecycle.shutdown)
+
     dp.include_router(get_admin_router())
     dp.include_router(get_user_router())
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot, skip_updates=True)
+    if RUN_MODE == "webhook":
+        await run_webhook(bot, dp, lifecycle)
+    else:
+        await run_polling(bot, dp)
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.DEBUG, stream=sys.stdout)
+    setup_logging(LOG_LEVEL)
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print("Бот остановлен.")
\ No newline at end of file
+        print("Бот остановлен.")
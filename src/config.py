@@ -26,14 +26,136 @@ if not ADMIN_ID:
     raise ValueError("ОШИБКА: В файле .env не найден ADMIN_ID. Узнайте его у @userinfobot.")
 # ------------------------------
 
+# --- РЕЖИМ ЗАПУСКА: polling (по умолчанию) или webhook ---
+RUN_MODE = os.getenv("RUN_MODE", "polling").lower()
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL")  # Публичный https-адрес балансировщика
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# Сколько секунд ждать завершения начатых ответов при остановке
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", 30))
+
+if RUN_MODE not in ("polling", "webhook"):
+    raise ValueError(f"ОШИБКА: Неизвестный RUN_MODE '{RUN_MODE}' (допустимо: polling, webhook)")
+if RUN_MODE == "webhook" and not WEBHOOK_BASE_URL:
+    raise ValueError("ОШИБКА: Для RUN_MODE=webhook в файле .env нужен WEBHOOK_BASE_URL")
+if RUN_MODE == "webhook" and not WEBHOOK_SECRET:
+    raise ValueError("ОШИБКА: Для RUN_MODE=webhook в файле .env нужен WEBHOOK_SECRET")
+
+# --- МЕТРИКИ: локальный эндпоинт /metrics в формате Prometheus (0 — отключить) ---
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))
+
+# --- ЛОГИ И ТРАССИРОВКА ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Апдейты дольше этого порога (в секундах) записываются в файл медленных трассировок
+SLOW_HANDLER_SECONDS = float(os.getenv("SLOW_HANDLER_SECONDS", 15))
+# Интервал снятия стеков профилировщиком, в секундах (0 — без профиля)
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.02))
+
 # --- URI МОДЕЛИ ---
 YANDEX_MODEL_URI = f"gpt://{YANDEX_FOLDER_ID}/yandexgpt/latest"
+# Более дешевая модель для экономного режима при превышении бюджета
+YANDEX_LITE_MODEL_URI = f"gpt://{YANDEX_FOLDER_ID}/yandexgpt-lite/latest"
+
+# --- МАРШРУТИЗАЦИЯ ЗАПРОСОВ ПО МОДЕЛЯМ: задача -> (модель, temperature, maxTokens) ---
+# Переопределение: GPT_ROUTE_CHAT="yandexgpt-lite,0.6,500"
+def _route(name: str, model: str, temperature: float, max_tokens: int) -> tuple[str, float, int]:
+    value = os.getenv(f"GPT_ROUTE_{name.upper()}")
+    if not value:
+        return model, temperature, max_tokens
+    try:
+        model, temperature, max_tokens = (part.strip() for part in value.split(","))
+        return model, float(temperature), int(max_tokens)
+    except ValueError:
+        raise ValueError(f"ОШИБКА: GPT_ROUTE_{name.upper()} должен иметь вид 'модель,temperature,maxTokens'")
+
+
+GPT_ROUTES = {
+    "chat": _route("chat", "yandexgpt-lite", 0.6, 500),         # Приветствия и болтовня
+    "rag": _route("rag", "yandexgpt", 0.3, 2000),               # Ответы по базе знаний
+    "general": _route("general", "yandexgpt", 0.5, 2000),       # Вопросы вне базы знаний и по фото
+    "cleanup": _route("cleanup", "yandexgpt-lite", 0.1, 2000),  # Чистка OCR, структурирование, резюме
+    "creative": _route("creative", "yandexgpt", 0.7, 2000),     # Посты, релизы, анонсы
+}
+
+# Режим JSON-ответа YandexGPT (jsonObject); 0 — только инструкция в промпте
+GPT_JSON_MODE = os.getenv("GPT_JSON_MODE", "1") == "1"
+
+# --- БЮДЖЕТЫ ТОКЕНОВ (в сутки) ---
+USER_DAILY_TOKEN_BUDGET = int(os.getenv("USER_DAILY_TOKEN_BUDGET", 60000))
+DAILY_TOKEN_BUDGET = int(os.getenv("DAILY_TOKEN_BUDGET", 3000000))
+# Доля бюджета, после которой включается экономный режим
+TOKEN_BUDGET_SOFT_LIMIT = float(os.getenv("TOKEN_BUDGET_SOFT_LIMIT", 0.8))
+# Ориентировочная цена, ₽ за 1000 токенов (для отчета /usage)
+TOKEN_PRICES = {"yandexgpt": 1.2, "yandexgpt-lite": 0.2, "gemma-3-27b-it": 0.4}
+
+# --- ИСТОРИЯ ДИАЛОГА (в токенах) ---
+# Бюджет истории в промпте: резюме старых реплик + последний обмен дословно
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 1500))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", 300))
+
+# --- SMALL TALK ---
+# Как часто перерисовывать готовые ответы (приветствие по времени суток, темы базы знаний), в секундах
+INTENT_REFRESH_SECONDS = float(os.getenv("INTENT_REFRESH_SECONDS", 600))
+
+# --- ДОКУМЕНТЫ ПОЛЬЗОВАТЕЛЕЙ ---
+# Bot API отдает боту файлы не больше 20 МБ
+MAX_DOCUMENT_SIZE = int(os.getenv("MAX_DOCUMENT_SIZE", 20 * 1024 * 1024))
+# Размер фрагмента для map-шага выжимки и число фрагментов, обрабатываемых одновременно
+DOC_CHUNK_CHARS = int(os.getenv("DOC_CHUNK_CHARS", 6000))
+DOC_MAX_CHUNKS = int(os.getenv("DOC_MAX_CHUNKS", 30))
+DOC_SUMMARY_CONCURRENCY = int(os.getenv("DOC_SUMMARY_CONCURRENCY", 3))
+
+# --- ИСХОДЯЩИЕ СООБЩЕНИЯ TELEGRAM ---
+# Общий лимит Bot API (~30 сообщений в секунду) и лимит одного чата: в личном — около 1 в секунду
+# с короткими всплесками, в группе — 20 в минуту. Паузы RetryAfter длиннее предела не пережидаются.
+TELEGRAM_GLOBAL_RPS = float(os.getenv("TELEGRAM_GLOBAL_RPS", 30))
+TELEGRAM_CHAT_RPS = float(os.getenv("TELEGRAM_CHAT_RPS", 1))
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", 5))
+TELEGRAM_GROUP_PER_MINUTE = float(os.getenv("TELEGRAM_GROUP_PER_MINUTE", 20))
+TELEGRAM_MAX_RETRY_AFTER = float(os.getenv("TELEGRAM_MAX_RETRY_AFTER", 60))
+
+# --- ВЕБ-ПОИСК ---
+# Ответы генеративного поиска кэшируются по нормализованному запросу
+WEB_SEARCH_CACHE_TTL = float(os.getenv("WEB_SEARCH_CACHE_TTL", 3600))
+WEB_SEARCH_CACHE_SIZE = int(os.getenv("WEB_SEARCH_CACHE_SIZE", 256))
+
+# --- ЛИМИТЫ YANDEX API: (одновременных запросов, запросов в секунду) ---
+API_LIMITS = {
+    "gpt": (int(os.getenv("GPT_MAX_CONCURRENCY", 8)), float(os.getenv("GPT_MAX_RPS", 8))),
+    # Отдельная квота для yandexgpt-lite: легкие задачи не ждут в очереди основной модели
+    "gpt_lite": (int(os.getenv("GPT_LITE_MAX_CONCURRENCY", 8)), float(os.getenv("GPT_LITE_MAX_RPS", 8))),
+    "vlm": (int(os.getenv("VLM_MAX_CONCURRENCY", 2)), float(os.getenv("VLM_MAX_RPS", 1))),
+    "vision": (int(os.getenv("VISION_MAX_CONCURRENCY", 4)), float(os.getenv("VISION_MAX_RPS", 5))),
+    "stt": (int(os.getenv("STT_MAX_CONCURRENCY", 4)), float(os.getenv("STT_MAX_RPS", 10))),
+    "tts": (int(os.getenv("TTS_MAX_CONCURRENCY", 4)), float(os.getenv("TTS_MAX_RPS", 10))),
+    "search": (int(os.getenv("SEARCH_MAX_CONCURRENCY", 2)), float(os.getenv("SEARCH_MAX_RPS", 1))),
+}
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", 3))
+
+# --- ПРЕДОХРАНИТЕЛИ (circuit breaker) ДЛЯ YANDEX API ---
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", 60))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", 0.5))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", 30))
+# Порог "медленного" ответа для каждого API, в секундах
+API_SLOW_CALL_SECONDS = {
+    "gpt": 15.0, "gpt_lite": 10.0, "vlm": 60.0, "vision": 15.0, "stt": 15.0, "tts": 20.0, "search": 40.0
+}
 
 # --- ПУТИ К ДАННЫМ ---
 BASE_DIR = Path(__file__).parent.parent
 DATA_DIR = BASE_DIR / "data"
 MARKDOWN_DIR = DATA_DIR / "markdown"
 PDF_DIR = DATA_DIR / "pdf"
+DOCUMENTS_DIR = DATA_DIR / "documents"
+# Автоматический каталог документов для отправки (строится из содержимого DOCUMENTS_DIR)
+DOCUMENT_CATALOG_PATH = DATA_DIR / "document_catalog.json"
+DOCUMENT_INDEX_WORKERS = int(os.getenv("DOCUMENT_INDEX_WORKERS", 4))
+LOGS_DIR = BASE_DIR / "logs"
+# Файл SQLite (относительно корня проекта или абсолютный путь)
+DB_NAME = os.getenv("DB_NAME", "bot_users.db")
 
 # Вывод для отладки при старте
 print(f"✅ Конфигурация загружена.")
@@ -0,0 +1,45 @@
+import inspect
+import logging
+from typing import Any, Callable
+
+from src.middlewares.inflight import InFlightMiddleware
+
+logger = logging.getLogger(__name__)
+
+
+class LifecycleManager:
+    def __init__(self, inflight: InFlightMiddleware, timeout: float):
+        """
+        Управляет корректной остановкой бота.
+
+        Порядок остановки: перестать принимать новые апдейты -> дождаться начатых
+        обработчиков (не дольше timeout) -> закрыть ресурсы в порядке, обратном регистрации.
+        """
+        self.inflight = inflight
+        self.timeout = timeout
+        self.accepting = True
+        self._resources: list[tuple[str, Callable[[], Any]]] = []
+
+    def add_resource(self, name: str, close: Callable[[], Any]):
+        """Регистрирует ресурс (HTTP-пул, БД и т.п.), который нужно закрыть при остановке."""
+        self._resources.append((name, close))
+
+    async def shutdown(self):
+        """Останавливает бота. Повторные вызовы ничего не делают."""
+        if not self.accepting:
+            return
+        self.accepting = False
+        logger.info("Остановка: новые апдейты больше не принимаются.")
+
+        left = await self.inflight.drain(self.timeout)
+        if left:
+            logger.warning(f"Остановка по таймауту: прервано обработчиков — {left}.")
+
+        for name, close in reversed(self._resources):
+            try:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+                logger.info(f"Ресурс закрыт: {name}")
+            except Exception as e:
+                logger.error(f"Ошибка при закрытии ресурса {name}: {e}")
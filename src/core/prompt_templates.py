@@ -0,0 +1,61 @@
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable
+
+from src.core.prompts import (
+    JSON_RESPONSE_INSTRUCTION, SYSTEM_PROMPT, CHIT_CHAT_PROMPT, OCR_CLEANUP_PROMPT,
+    IDEA_PROMPT, POST_PROMPT, PRESS_RELEASE_PROMPT, ANNOUNCEMENT_PROMPT, CUSTOM_CREATIVE_PROMPT,
+    DOC_MAP_PROMPT, DOC_SUMMARY_PROMPT, DOC_EXPLAIN_PROMPT
+)
+
+SUMMARY_HEADER = "Краткое содержание предыдущего диалога:\n"
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """
+    Скомпилированный шаблон промпта.
+
+    Неизменяемый префикс (системный промпт + формат ответа) одинаков у всех запросов с этим шаблоном
+    и идет первым, поэтому повторно используется на стороне API. Все переменные части —
+    резюме, история, имя пользователя, контекст и вопрос — добавляются после него.
+    Сообщения префикса общие для всех запросов и не должны изменяться.
+    """
+    system_text: str
+    prefix: tuple[dict, ...]
+    prefix_bytes: int
+
+    def build(self, user_text: str, context_text: str = "", history: Iterable[dict] = (), summary: str = "",
+              full_name: str = "") -> list[dict]:
+        messages = list(self.prefix)
+        if summary:
+            messages.append({"role": "system", "text": SUMMARY_HEADER + summary})
+        messages.extend(history)
+
+        parts = []
+        if full_name:
+            parts.append(f"Пользователь: {full_name}.")
+        if context_text:
+            parts.append(f"Контекст:\n{context_text}")
+        parts.append(f"Вопрос:\n{user_text}")
+        messages.append({"role": "user", "text": "\n\n".join(parts)})
+        return messages
+
+
+@lru_cache(maxsize=64)
+def get_template(system_prompt: str, response_format: str = JSON_RESPONSE_INSTRUCTION) -> PromptTemplate:
+    """Возвращает шаблон из кэша; статический текст префикса интернируется и собирается один раз."""
+    system_text = sys.intern(f"{system_prompt}\n\n{response_format}")
+    return PromptTemplate(
+        system_text=system_text,
+        prefix=({"role": "system", "text": system_text},),
+        prefix_bytes=len(system_text.encode("utf-8"))
+    )
+
+
+# Шаблоны для постоянных промптов компилируются при импорте
+for _prompt in (SYSTEM_PROMPT, CHIT_CHAT_PROMPT, OCR_CLEANUP_PROMPT, IDEA_PROMPT, POST_PROMPT,
+                PRESS_RELEASE_PROMPT, ANNOUNCEMENT_PROMPT, CUSTOM_CREATIVE_PROMPT,
+                DOC_MAP_PROMPT, DOC_SUMMARY_PROMPT, DOC_EXPLAIN_PROMPT):
+    get_template(_prompt)
@@ -31,6 +31,31 @@ VLM_COMPLEX_PROMPT = """Проанализируй изображение. Из
 
 VLM_DESCRIBE_PROMPT = "Опиши детально изображение. Используй <b> для акцентов."
 
+# Формат ответа текстовой модели (часть стабильного префикса промпта)
+JSON_RESPONSE_INSTRUCTION = (
+    "ВАЖНО: Твой ответ ДОЛЖЕН БЫТЬ СТРОГО в формате JSON.\n"
+    "Используй HTML-теги <b></b> для жирного шрифта.\n"
+    '{\n'
+    '  "text": "Текст ответа...",\n'
+    '  "suggestions": ["Подсказка 1", "Подсказка 2"]\n'
+    '}\n'
+)
+
+# Сжатие истории диалога
+HISTORY_SUMMARY_PROMPT = """Ты ведешь краткое резюме диалога методиста с пользователем.
+Дополни текущее резюме новыми репликами: темы вопросов, ключевые факты и договоренности, уточнения пользователя.
+Не пересказывай ответы подробно, без вводных фраз. Не более {max_words} слов."""
+
+# Документы пользователя (map-reduce)
+DOC_MAP_PROMPT = """Ты — методист. Перед тобой фрагмент большого документа.
+Кратко изложи его содержание: ключевые положения, цифры, сроки, требования. Без вводных фраз."""
+DOC_SUMMARY_PROMPT = """Ты — методист. Перед тобой краткие изложения частей одного документа по порядку.
+Составь единую выжимку документа: о чем он, основные положения списком, важные сроки и требования.
+Используй <b> для акцентов."""
+DOC_EXPLAIN_PROMPT = """Ты — методист. Перед тобой краткие изложения частей одного документа по порядку.
+Объясни простыми словами суть документа: зачем он нужен, кому адресован и что из него следует на практике.
+Используй <b> для акцентов."""
+
 # Креатив и Идеи
 IDEA_PROMPT = "Ты — аналитик. Структурируй идею пользователя с помощью HTML <b>."
 POST_PROMPT = "Ты — SMM-менеджер. Напиши ПОДРОБНЫЙ пост (3-4 абзаца). Используй <b>."
@@ -41,4 +66,43 @@ CUSTOM_CREATIVE_PROMPT = "Помоги создать текст. Будь кр
 # Константы
 STARTUP_SUGGESTIONS = ["Об НМО НБ РА", "Правила оформления методички", "О комплектовании фондов"]
 FILE_REQUEST_TRIGGERS = ["скинь", "дай", "пришли", "отправь", "файл", "документ", "график", "список"]
-MAX_AUDIO_SIZE = 1024 * 1024  # 1 МБ
\ No newline at end of file
+MAX_AUDIO_SIZE = 1024 * 1024  # 1 МБ
+# Small talk: триггеры намерений и готовые ответы (без обращения к YandexGPT).
+# Порядок ключей — приоритет, если в сообщении несколько намерений («Привет! Что умеешь?»)
+SMALL_TALK_TRIGGERS = {
+    "abilities": [
+        "что умеешь", "что ты умеешь", "что вы умеете", "что можешь", "что ты можешь", "что вы можете",
+        "чем можешь помочь", "чем ты можешь помочь", "помощь"
+    ],
+    "about": ["кто ты", "что ты", "ты кто", "как тебя зовут"],
+    "thanks": ["спасибо", "благодарю", "спс"],
+    "greeting": ["привет", "здравствуй", "добрый день", "доброе утро", "добрый вечер", "хай", "салют"],
+}
+# Слова, которые не превращают small talk в вопрос («Спасибо большое!», «А ты кто?», «Помощь, пожалуйста»)
+SMALL_TALK_FILLERS = [
+    "а", "и", "ну", "же", "ты", "вы", "мне", "всем", "бот", "такой", "пожалуйста", "большое", "огромное"
+]
+# {greeting} — приветствие по времени суток, {name} — имя пользователя, {topics} — темы базы знаний
+SMALL_TALK_ANSWERS = {
+    "greeting": [
+        "{greeting}, <b>{name}</b>! Я — «Цифровой помощник НМО НБ РА». Задайте вопрос о методической работе "
+        "или выберите тему ниже.",
+        "{greeting}, <b>{name}</b>! Рад помочь с методическими вопросами. С чего начнем?",
+    ],
+    "about": [
+        "Я — «Цифровой помощник НМО НБ РА». Отвечаю на вопросы по базе знаний научно-методического отдела, "
+        "распознаю фото документов и голосовые сообщения, помогаю с текстами в креативном режиме.",
+    ],
+    "abilities": [
+        "Вот что я умею:\n"
+        "• отвечать на вопросы по базе знаний НМО;\n"
+        "• присылать документы и методички по запросу;\n"
+        "• распознавать текст с фото и голосовые сообщения;\n"
+        "• искать информацию в сети и писать тексты в креативном режиме.\n\n"
+        "<b>Темы базы знаний:</b>\n{topics}",
+    ],
+    "thanks": [
+        "Рад быть полезным, <b>{name}</b>! Обращайтесь.",
+        "Пожалуйста! Если появятся вопросы — пишите.",
+    ],
+}
@@ -0,0 +1,122 @@
+import json
+import logging
+import logging.handlers
+import sys
+import threading
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+
+# ID трассировки текущего апдейта. Контекст наследуется задачами asyncio,
+# поэтому ID попадает и в логи сервисов, вызванных из хендлера.
+trace_id_var: ContextVar[str] = ContextVar("trace_id", default="-")
+# Пользователь и хендлер текущего апдейта — для учета расхода токенов в сервисах
+user_id_var: ContextVar[int | None] = ContextVar("user_id", default=None)
+handler_var: ContextVar[str] = ContextVar("handler", default="unknown")
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s"
+
+
+class TraceIdFilter(logging.Filter):
+    """Добавляет trace_id в каждую запись лога."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = trace_id_var.get()
+        return True
+
+
+def setup_logging(level: str = "INFO"):
+    """Настраивает вывод логов в stdout с trace_id в каждой строке."""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(TraceIdFilter())
+    logging.basicConfig(level=level.upper(), handlers=[handler])
+
+
+def create_slow_trace_logger(path: Path, max_bytes: int = 5 * 1024 * 1024, backup_count: int = 5) -> logging.Logger:
+    """Отдельный логгер медленных трассировок: JSON-строки в ротируемый файл."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    slow_logger = logging.getLogger("methodist.slow_traces")
+    slow_logger.propagate = False
+    slow_logger.setLevel(logging.INFO)
+    if not slow_logger.handlers:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        slow_logger.addHandler(handler)
+    return slow_logger
+
+
+def dump_slow_trace(slow_logger: logging.Logger, record: dict):
+    slow_logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+class StackSampler:
+    def __init__(self, interval: float = 0.02, max_depth: int = 40):
+        """
+        Легковесный профилировщик: фоновый поток периодически снимает стек главного потока.
+
+        Апдейт регистрирует кадр своего middleware; сэмпл засчитывается апдейту, если этот кадр
+        есть в стеке, то есть код апдейта действительно выполнялся в event loop в момент снимка.
+        Ожидание ответов API (await) в профиль не попадает — только то, что занимает процессор.
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self._main_thread_id = threading.main_thread().ident
+        self._frames: dict[int, str] = {}  # id кадра middleware -> trace_id
+        self._samples: dict[str, Counter] = {}
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def register(self, frame, trace_id: str):
+        self._frames[id(frame)] = trace_id
+        self._samples[trace_id] = Counter()
+
+    def unregister(self, frame, trace_id: str) -> Counter:
+        """Снимает апдейт с учета и возвращает собранные стеки."""
+        self._frames.pop(id(frame), None)
+        return self._samples.pop(trace_id, Counter())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self._frames:
+                continue
+            frame = sys._current_frames().get(self._main_thread_id)
+            stack = []
+            trace_id = None
+            depth = 0
+            # Кадр middleware лежит глубоко под цепочкой aiogram, поэтому проходим стек целиком,
+            # а в профиль записываем только max_depth самых вложенных кадров
+            while frame is not None:
+                if depth < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{Path(code.co_filename).name}:{code.co_name}:{frame.f_lineno}")
+                trace_id = trace_id or self._frames.get(id(frame))
+                frame = frame.f_back
+                depth += 1
+            if trace_id:
+                samples = self._samples.get(trace_id)
+                if samples is not None:
+                    samples[";".join(reversed(stack))] += 1
+
+
+def collapse_samples(samples: Counter, interval: float, top: int = 15) -> list[dict]:
+    """Самые частые стеки с оценкой затраченного времени."""
+    return [
+        {"stack": stack, "samples": count, "approx_seconds": round(count * interval, 3)}
+        for stack, count in samples.most_common(top)
+    ]
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:12]
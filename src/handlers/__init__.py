@@ -3,6 +3,7 @@ from .settings import router as settings_router
 from .recognition import router as recognition_router
 from .creative import router as creative_router
 from .feedback import router as feedback_router
+from .documents import router as documents_router
 from .base import router as base_router
 from .admin import router as admin_router
 
@@ -17,6 +18,8 @@ def get_user_router() -> Router:
     main_router.include_router(recognition_router)
     # Затем обратную связь
     main_router.include_router(feedback_router)
+    # Присланные документы (PDF, DOCX) и действия с ними
+    main_router.include_router(documents_router)
     # И только в самом конце — базовый роутер (RAG и Small Talk)
     main_router.include_router(base_router)
 
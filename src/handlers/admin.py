@@ -1,12 +1,20 @@
+import asyncio
 import logging
 import re
+from datetime import date
 from aiogram import Router, F, Bot
 from aiogram.filters import Filter, Command
 from aiogram.types import Message
 from html import escape
 
 from src.config import ADMIN_ID
+from src.middlewares.outbound import background_sends
 from src.services.database import db
+from src.services.api_scheduler import api_scheduler
+from src.services.file_search_service import file_search_service
+from src.services.ingestion import knowledge_ingestor
+from src.services.rag_engine import rag_service
+from src.services.token_accounting import token_accountant
 
 router = Router()
 
@@ -24,14 +32,86 @@ async def broadcast_handler(message: Message, bot: Bot):
         return
 
     users = db.get_all_users()
-    count = 0
-    for user_id in users:
+
+    async def deliver(user_id) -> bool:
         try:
             await bot.send_message(user_id, f"📢 <b>Объявление:</b>\n\n{text}", parse_mode="HTML")
-            count += 1
-        except:
-            continue
-    await message.answer(f"✅ Рассылка завершена. Получателей: {count}")
+            return True
+        except Exception:
+            return False
+
+    # Темп отправки задает очередь исходящих сообщений: рассылка идет с фоновым приоритетом
+    # и не задерживает ответы пользователям
+    with background_sends():
+        delivered = await asyncio.gather(*(deliver(user_id) for user_id in users))
+    await message.answer(f"✅ Рассылка завершена. Получателей: {sum(delivered)}")
+
+
+@router.message(Command("status"), IsAdmin())
+async def status_handler(message: Message):
+    """Состояние очередей и предохранителей внешних API."""
+    icons = {"closed": "🟢", "half_open": "🟡", "open": "🔴"}
+    lines = ["<b>Состояние API:</b>"]
+    for name, info in api_scheduler.stats().items():
+        breaker = info["breaker"]
+        lines.append(
+            f"{icons.get(breaker['state'], '⚪')} <b>{name}</b>: {breaker['state']}, "
+            f"ошибок {breaker['error_rate']:.0%} из {breaker['calls']}, "
+            f"в работе {info['active']}/{info['limit']}, в очереди {info['queued']}"
+        )
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
+@router.message(Command("usage"), IsAdmin())
+async def usage_handler(message: Message):
+    """Расход токенов за день: /usage или /usage 2024-05-01."""
+    arg = message.text.replace("/usage", "").strip()
+    try:
+        day = date.fromisoformat(arg).isoformat() if arg else None
+    except ValueError:
+        await message.answer("Использование: /usage [ГГГГ-ММ-ДД]")
+        return
+
+    report = token_accountant.report(day)
+    lines = [
+        f"<b>Расход токенов за {report['day']}:</b>",
+        f"Вызовов: {report['calls']}, вход {report['input']}, выход {report['output']}, "
+        f"≈ {report['cost']:.2f} ₽",
+        "",
+        "<b>По моделям:</b>"
+    ]
+    for item in report["by_model"]:
+        lines.append(f"• {escape(str(item['key']))}: {item['input'] + item['output']} ток., ≈ {item['cost']:.2f} ₽")
+    lines.append("\n<b>По хендлерам:</b>")
+    for item in report["by_handler"]:
+        lines.append(f"• {escape(str(item['key']))}: {item['calls']} выз., {item['input'] + item['output']} ток.")
+    lines.append("\n<b>Топ пользователей:</b>")
+    for item in report["top_users"]:
+        lines.append(f"• ID: {item['key']} — {item['input'] + item['output']} ток., ≈ {item['cost']:.2f} ₽")
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
+@router.message(Command("reload_files"), IsAdmin())
+async def reload_files_handler(message: Message):
+    """Переиндексирует data/documents и перечитывает data/file_index.json без перезапуска бота."""
+    count = await file_search_service.refresh()
+    await message.answer(f"✅ Индекс файлов обновлен. Документов: {count}")
+
+
+@router.message(Command("ingest"), IsAdmin())
+async def ingest_handler(message: Message):
+    """Конвертирует новые PDF/DOCX из data/pdf в базу знаний: /ingest или /ingest force."""
+    force = message.text.replace("/ingest", "").strip() == "force"
+    status_msg = await message.answer("⏳ Конвертирую документы...")
+    result = await knowledge_ingestor.ingest(rag_service, force=force)
+    lines = [
+        f"✅ Сконвертировано: {len(result.converted)}, без изменений: {result.skipped}, "
+        f"удалено: {len(result.removed)}.",
+        f"Документов в базе знаний: {len(rag_service.documents)}."
+    ]
+    if result.failed:
+        lines.append(f"❌ Ошибки: {escape(', '.join(result.failed))}")
+    await status_msg.edit_text("\n".join(lines), parse_mode="HTML")
 
 
 @router.message(IsAdmin(), F.reply_to_message)
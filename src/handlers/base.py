@@ -1,86 +1,129 @@
+import io
 import logging
 from typing import Tuple, List, Optional, Dict, Any
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, FSInputFile, BufferedInputFile
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
 from aiogram.filters import CommandStart, StateFilter
 from aiogram.fsm.context import FSMContext
 from html import escape
 from aiogram.exceptions import TelegramBadRequest
 
+from src.config import PDF_DIR
 from src.core.states import DialogStates
 # ИСПРАВЛЕНО: Импорт из prompts
-from src.core.prompts import SYSTEM_PROMPT, CHIT_CHAT_PROMPT, STARTUP_SUGGESTIONS, FILE_REQUEST_TRIGGERS, MAX_AUDIO_SIZE
+from src.core.prompts import SYSTEM_PROMPT, CHIT_CHAT_PROMPT, STARTUP_SUGGESTIONS, MAX_AUDIO_SIZE
 from src.keyboards.builders import get_main_menu_keyboard, create_smart_keyboard, create_file_actions_keyboard
-from src.utils.text_tools import clean_html_for_telegram, send_split_message
+from src.utils.text_tools import clean_html_for_telegram, send_split_message, make_queue_notifier
 
 from src.services.database import db
-from src.services.rag_engine import RagEngine
+from src.services.rag_engine import rag_service
 from src.services.yandex_gpt import YandexGPTService
-from src.services.file_search_service import FileSearchService
+from src.services.file_search_service import file_search_service
 from src.services.speech_service import YandexSpeechKitService
 from src.services.ocr_service import YandexOCRService
+from src.services.request_scheduler import user_scheduler, RequestSuperseded
+from src.services.history_manager import history_manager
+from src.services.intent_service import IntentEngine
+from src.services.telegram_file_cache import telegram_file_cache
+from src.services.api_scheduler import QueueCallback
+from src.services.metrics import STAGE_SECONDS
 
 logger = logging.getLogger(__name__)
 router = Router()
-rag_service = RagEngine()
 gpt_service = YandexGPTService()
-file_search_service = FileSearchService()
 speech_service = YandexSpeechKitService()
 ocr_service = YandexOCRService()
+intent_engine = IntentEngine(topics_provider=lambda: (doc.metadata.get("title") for doc in rag_service.documents))
 
 
 # --- Вспомогательные ---
 def is_small_talk(text: str) -> bool:
-    text_lower = text.lower().strip()
-    triggers = ["привет", "здравствуй", "добрый день", "хай", "кто ты", "что ты", "что умеешь", "помощь", "спасибо",
-                "благодарю"]
-    if len(text_lower.split()) < 6:
-        for trigger in triggers:
-            if trigger in text_lower: return True
-    return False
+    return intent_engine.match(text) is not None
 
 
 async def try_send_file(message: Message, bot: Bot) -> bool:
     if not message.text: return False
-    user_text = message.text.lower()
-    if any(trigger in user_text for trigger in FILE_REQUEST_TRIGGERS):
-        file_data = file_search_service.find_file(user_text)
+    if file_search_service.is_file_request(message.text):
+        file_data = file_search_service.find_file(message.text)
         if file_data:
             file_path = file_search_service.get_full_path(file_data["filename"])
             if file_path.exists():
                 await bot.send_chat_action(message.chat.id, "upload_document")
-                await message.reply_document(FSInputFile(file_path), caption=f"Вот файл: <b>{file_data['title']}</b>",
-                                             parse_mode="HTML")
+                caption = f"Вот файл: <b>{file_data['title']}</b>"
+                await telegram_file_cache.send(
+                    file_path, lambda document: message.reply_document(document, caption=caption, parse_mode="HTML")
+                )
                 return True
     return False
 
 
-async def get_ai_response(state: FSMContext, user_id: int, user_text: str) -> Tuple[
+async def get_ai_response(state: FSMContext, user_id: int, user_text: str,
+                          on_queued: Optional[QueueCallback] = None) -> Tuple[
+    str, List[str], Optional[str], Optional[Dict[str, Any]]]:
+    """
+    Генерирует ответ через планировщик пользователя.
+    Повторные одинаковые запросы объединяются, а более новый запрос отменяет устаревший.
+
+    :param on_queued: Уведомление о месте в очереди к YandexGPT при пиковой нагрузке.
+    :raises RequestSuperseded: если ответ уже не нужен (пользователь задал новый вопрос).
+    """
+    return await user_scheduler.run(
+        user_id, user_text, lambda: _generate_ai_response(state, user_id, user_text, on_queued)
+    )
+
+
+async def _generate_ai_response(state: FSMContext, user_id: int, user_text: str,
+                                on_queued: Optional[QueueCallback] = None) -> Tuple[
     str, List[str], Optional[str], Optional[Dict[str, Any]]]:
-    user_data = db.get_user(user_id)
+    with STAGE_SECONDS.time(stage="db_get_user"):
+        user_data = db.get_user(user_id) or {}
     full_name = user_data.get("full_name") or user_data.get("first_name") or "Коллега"
     fsm_data = await state.get_data()
-    history = fsm_data.get("history", [])
+    summary, history = await history_manager.load(state)
     recognized_context = fsm_data.get("last_recognized_text", "")
 
+    # Чистый small talk — готовый ответ без обращения к модели
+    canned = intent_engine.answer(user_text, full_name) if not recognized_context else None
+    if canned:
+        _, ai_text, suggestions = canned
+        await state.update_data(last_query=user_text, last_suggestions=suggestions)
+        return ai_text, suggestions, None, None
+
     context = ""
     metadata = None
     pdf_slug = None
     prompt = CHIT_CHAT_PROMPT
+    # Легкая модель с коротким ответом — только для болтовни; вопросы без совпадений в базе знаний
+    # и вопросы по распознанному фото получают полную модель и полный лимит токенов
+    route = "general"
 
     if is_small_talk(user_text) and not recognized_context:
         context = ""
+        route = "chat"
     else:
-        context, metadata = rag_service.search(user_text)
+        with STAGE_SECONDS.time(stage="rag_search"):
+            context, metadata = rag_service.search(user_text)
         pdf_slug = metadata.get("slug") if metadata else None
-        if context: prompt = SYSTEM_PROMPT
+        if context: prompt, route = SYSTEM_PROMPT, "rag"
 
     full_context = f"КОНТЕКСТ ИЗ ФОТО:\n{recognized_context}\n\nБАЗА ЗНАНИЙ:\n{context}" if recognized_context else context
-    res = gpt_service.generate_response(prompt, user_text, full_context, history, full_name)
+    with STAGE_SECONDS.time(stage="generate_response"):
+        res = await gpt_service.generate_response(prompt, user_text, full_context, history, full_name,
+                                                  summary=summary, route=route, on_queued=on_queued)
+    if res.get("error"):
+        # Нейросеть недоступна — отдаем исходный фрагмент базы знаний без пересказа и не портим историю
+        if context:
+            return (f"⚠️ Нейросеть сейчас недоступна, привожу фрагмент из базы знаний:\n\n{escape(context[:1500])}",
+                    [], pdf_slug, metadata)
+        return res.get("text", "Ошибка."), [], pdf_slug, metadata
+
     ai_text = res.get("text", "Ошибка.")
     suggestions = res.get("suggestions", [])
-    new_history = history + [{"role": "user", "text": user_text}, {"role": "assistant", "text": ai_text}]
-    await state.update_data(history=new_history[-6:], last_query=user_text, last_suggestions=suggestions)
+
+    # История обновляется под блокировкой пользователя, старые реплики сворачиваются в резюме в фоне
+    with STAGE_SECONDS.time(stage="history_update"):
+        await history_manager.append(state, user_id, user_text, ai_text, last_query=user_text,
+                                     last_suggestions=suggestions)
     return ai_text, suggestions, pdf_slug, metadata
 
 
@@ -90,7 +133,7 @@ async def get_ai_response(state: FSMContext, user_id: int, user_text: str) -> Tu
 async def command_start_handler(message: Message, state: FSMContext):
     db.add_user(message.from_user.id, message.from_user.username, message.from_user.full_name)
     await state.set_state(DialogStates.main)
-    await state.update_data(history=[], settings={"voice_mode": "text_to_text"}, last_recognized_text="",
+    await state.update_data(history=[], history_summary="", settings={"voice_mode": "text_to_text"}, last_recognized_text="",
                             last_suggestions=STARTUP_SUGGESTIONS)
     await message.answer(f"Здравствуйте, <b>{escape(message.from_user.full_name)}</b>!",
                          reply_markup=get_main_menu_keyboard(), parse_mode="HTML")
@@ -115,19 +158,24 @@ async def handle_voice_message(message: Message, bot: Bot, state: FSMContext):
         if voice_mode == "voice_to_text":
             await status_msg.edit_text(f"<i>Вы сказали:</i>\n\n{escape(recognized_text)}", parse_mode="HTML")
         elif voice_mode == "voice_to_voice":
-            ai_text, _, _, _ = await get_ai_response(state, message.from_user.id, recognized_text)
-            voice_res = await speech_service.text_to_speech(ai_text)
+            ai_text, _, _, _ = await get_ai_response(state, message.from_user.id, recognized_text,
+                                                     make_queue_notifier(status_msg))
+            with STAGE_SECONDS.time(stage="text_to_speech"):
+                voice_res = await speech_service.text_to_speech(ai_text)
             if voice_res:
                 await status_msg.delete()
                 await message.reply_voice(BufferedInputFile(voice_res, "ans.ogg"))
         else:
             ai_text, suggestions, pdf_slug, metadata = await get_ai_response(state, message.from_user.id,
-                                                                             recognized_text)
+                                                                             recognized_text,
+                                                                             make_queue_notifier(status_msg))
             final = ai_text + (
                 f"\n\n📚 <i>Источник: {escape(str(metadata.get('title')))}</i>" if metadata and metadata.get(
                     'title') else "")
             await status_msg.edit_text(clean_html_for_telegram(final),
                                        reply_markup=create_smart_keyboard(suggestions, pdf_slug), parse_mode="HTML")
+    except RequestSuperseded:
+        await status_msg.delete()
     except Exception:
         await status_msg.edit_text("Ошибка голоса.")
 
@@ -145,8 +193,12 @@ async def handle_text_query(message: Message, bot: Bot, state: FSMContext):
         if voice_bytes: await message.reply_voice(BufferedInputFile(voice_bytes, "play.ogg"))
         return
     if voice_mode == "text_to_voice":
-        ai_text, _, _, _ = await get_ai_response(state, message.from_user.id, message.text)
-        voice_bytes = await speech_service.text_to_speech(ai_text)
+        try:
+            ai_text, _, _, _ = await get_ai_response(state, message.from_user.id, message.text)
+        except RequestSuperseded:
+            return
+        with STAGE_SECONDS.time(stage="text_to_speech"):
+            voice_bytes = await speech_service.text_to_speech(ai_text)
         if voice_bytes: await message.reply_voice(BufferedInputFile(voice_bytes, "ans.ogg"))
         return
 
@@ -155,12 +207,18 @@ async def handle_text_query(message: Message, bot: Bot, state: FSMContext):
     else:
         status_msg = None
 
-    ai_text, suggestions, pdf_slug, metadata = await get_ai_response(state, message.from_user.id, message.text)
+    try:
+        ai_text, suggestions, pdf_slug, metadata = await get_ai_response(state, message.from_user.id, message.text,
+                                                                         make_queue_notifier(status_msg))
+    except RequestSuperseded:
+        if status_msg: await status_msg.delete()
+        return
     final_text = ai_text + (
         f"\n\n📚 <i>Источник: {escape(str(metadata.get('title')))}</i>" if metadata and metadata.get('title') else "")
 
-    if status_msg: await status_msg.delete()
-    await send_split_message(message, final_text, reply_markup=create_smart_keyboard(suggestions, pdf_slug))
+    with STAGE_SECONDS.time(stage="telegram_send"):
+        if status_msg: await status_msg.delete()
+        await send_split_message(message, final_text, reply_markup=create_smart_keyboard(suggestions, pdf_slug))
 
 
 @router.callback_query(F.data.startswith("ask_suggestion:"))
@@ -176,20 +234,52 @@ async def handle_suggestion(callback: CallbackQuery, bot: Bot, state: FSMContext
         await callback.answer()
         status_msg = await callback.message.answer(f"💭 Готовлю ответ на вопрос: «{escape(txt)}»...")
         await bot.send_chat_action(callback.message.chat.id, "typing")
-        ai_text, suggestions, pdf_slug, metadata = await get_ai_response(state, callback.from_user.id, txt)
+        ai_text, suggestions, pdf_slug, metadata = await get_ai_response(state, callback.from_user.id, txt,
+                                                                         make_queue_notifier(status_msg))
         source_text = f"\n\n📚 <i>Источник: {escape(str(metadata.get('title')))}</i>" if metadata and metadata.get(
             'title') else ""
         final_text = ai_text + source_text
         await status_msg.edit_text(clean_html_for_telegram(final_text),
                                    reply_markup=create_smart_keyboard(suggestions, pdf_slug), parse_mode="HTML")
+    except RequestSuperseded:
+        await status_msg.delete()
     except Exception as e:
         logger.error(f"Suggestion Error: {e}")
         await callback.answer("Ошибка.", show_alert=True)
 
 
+@router.callback_query(F.data.startswith("get_pdf:"))
+async def handle_get_pdf(callback: CallbackQuery, bot: Bot):
+    slug = callback.data.split(":", 1)[1]
+    filename = rag_service.get_filename_by_slug(slug)
+    file_path = PDF_DIR / filename if filename else None
+    if not file_path or not file_path.exists():
+        await callback.answer("Файл не найден.", show_alert=True)
+        return
+    await callback.answer()
+    await bot.send_chat_action(callback.message.chat.id, "upload_document")
+    await telegram_file_cache.send(file_path, lambda document: callback.message.answer_document(document))
+
+
 @router.callback_query(F.data == "regenerate")
 async def handle_regen(callback: CallbackQuery, bot: Bot, state: FSMContext):
     data = await state.get_data()
     last = data.get("last_query")
-    if last:
-        await callback.answ
\ No newline at end of file
+    if not last:
+        await callback.answer("Нет вопроса для повтора.")
+        return
+    await callback.answer()
+    status_msg = await callback.message.answer("🔄 Готовлю другой вариант ответа...")
+    try:
+        await bot.send_chat_action(callback.message.chat.id, "typing")
+        ai_text, suggestions, pdf_slug, metadata = await get_ai_response(state, callback.from_user.id, last,
+                                                                         make_queue_notifier(status_msg))
+        source_text = f"\n\n📚 <i>Источник: {escape(str(metadata.get('title')))}</i>" if metadata and metadata.get(
+            'title') else ""
+        await status_msg.edit_text(clean_html_for_telegram(ai_text + source_text),
+                                   reply_markup=create_smart_keyboard(suggestions, pdf_slug), parse_mode="HTML")
+    except RequestSuperseded:
+        await status_msg.delete()
+    except Exception as e:
+        logger.error(f"Regenerate Error: {e}")
+        await status_msg.edit_text("Ошибка.")
@@ -12,8 +12,10 @@ from src.core.prompts import (
     CUSTOM_CREATIVE_PROMPT
 )
 from src.keyboards.builders import create_creative_keyboard
-from src.utils.text_tools import send_split_message
+from src.utils.text_tools import send_split_message, make_queue_notifier
 from src.services.yandex_gpt import YandexGPTService
+from src.services.api_scheduler import Priority
+from src.services.history_manager import history_manager
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -38,13 +40,13 @@ async def select_genre(callback: CallbackQuery, state: FSMContext):
 
     if genre == "exit":
         await state.set_state(DialogStates.main)
-        await state.update_data(creative_history=[])
+        await history_manager.reset(state, "creative_history")
         await callback.message.edit_text("Вы вышли из креативного режима. Чем я могу помочь?")
         await callback.answer()
         return
 
     # Очищаем историю при смене жанра для чистоты новой задачи
-    await state.update_data(creative_history=[])
+    await history_manager.reset(state, "creative_history")
 
     mapping = {
         "post": (POST_PROMPT, "📝 Опишите тему <b>поста для соцсетей</b>. Я подготовлю подробный вариант с эмодзи."),
@@ -73,21 +75,22 @@ async def handle_creative_text(message: Message, state: FSMContext):
 
     fsm_data = await state.get_data()
     prompt = fsm_data.get("current_creative_prompt", CUSTOM_CREATIVE_PROMPT)
-    creative_history = fsm_data.get("creative_history", [])
+    summary, creative_history = await history_manager.load(state, "creative_history")
 
     status_msg = await message.answer("🖋️ <b>Генерирую текст, пожалуйста, подождите...</b>", parse_mode="HTML")
 
     try:
         # Запрос к GPT с учетом истории этого сеанса
-        res = gpt_service.generate_response(prompt, message.text, history=creative_history)
+        res = await gpt_service.generate_response(prompt, message.text, history=creative_history,
+                                                  summary=summary, route="creative", priority=Priority.BATCH,
+                                                  on_queued=make_queue_notifier(status_msg))
+        if res.get("error"):
+            await status_msg.edit_text(f"❌ {res.get('text')} Попробуйте позже.")
+            return
         ans = res.get("text", "К сожалению, не удалось сгенерировать текст. Попробуйте еще раз.")
 
-        # Обновляем историю (храним последние 3 пары для контекста уточнений)
-        new_history = creative_history + [
-            {"role": "user", "text": message.text},
-            {"role": "assistant", "text": ans}
-        ]
-        await state.update_data(creative_history=new_history[-6:])
+        # Обновляем историю: последний черновик дословно, ранние уточнения — в резюме
+        await history_manager.append(state, message.from_user.id, message.text, ans, key="creative_history")
 
         await status_msg.delete()
 
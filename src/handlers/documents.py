@@ -0,0 +1,81 @@
+import logging
+from html import escape
+
+from aiogram import Router, F, Bot
+from aiogram.filters import StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
+
+from src.config import MAX_DOCUMENT_SIZE
+from src.core.states import DialogStates
+from src.keyboards.builders import create_file_actions_keyboard
+from src.services.document_service import document_processor, DocumentError
+from src.utils.text_tools import send_split_message
+
+logger = logging.getLogger(__name__)
+router = Router()
+
+# Длиннее — отдаем извлеченный текст файлом, а не пачкой сообщений
+MAX_TEXT_IN_CHAT = 8000
+
+
+@router.message(F.document, StateFilter(None, DialogStates.main))
+async def handle_document_upload(message: Message, state: FSMContext):
+    document = message.document
+    if not document_processor.is_supported(document.file_name):
+        await message.reply("Я умею работать с документами PDF и DOCX.")
+        return
+    if document.file_size and document.file_size > MAX_DOCUMENT_SIZE:
+        await message.reply(f"Файл слишком большой. Максимум — {MAX_DOCUMENT_SIZE // (1024 * 1024)} МБ.")
+        return
+
+    # Сам файл не скачиваем, пока пользователь не выберет действие
+    await state.update_data(uploaded_file={
+        "file_id": document.file_id,
+        "file_unique_id": document.file_unique_id,
+        "file_name": document.file_name,
+    })
+    await message.reply(
+        f"📎 <b>{escape(document.file_name)}</b>\nЧто сделать с документом?",
+        reply_markup=create_file_actions_keyboard(),
+        parse_mode="HTML"
+    )
+
+
+@router.callback_query(F.data.startswith("file_action:"))
+async def handle_file_action(callback: CallbackQuery, bot: Bot, state: FSMContext):
+    action = callback.data.split(":", 1)[1]
+    data = await state.get_data()
+    file = data.get("uploaded_file")
+    if not file:
+        await callback.answer("Пришлите документ заново.", show_alert=True)
+        return
+    await callback.answer()
+
+    labels = {"summarize": "Готовлю выжимку", "explain": "Разбираюсь в сути", "extract": "Извлекаю текст"}
+    status_msg = await callback.message.answer(f"⏳ {labels.get(action, 'Обрабатываю')}...")
+    try:
+        await bot.send_chat_action(callback.message.chat.id, "typing")
+        if action == "extract":
+            text = await document_processor.extract_text(bot, file)
+            await status_msg.delete()
+            if len(text) > MAX_TEXT_IN_CHAT:
+                name = f"{file['file_name'].rsplit('.', 1)[0]}.txt"
+                await callback.message.answer_document(
+                    BufferedInputFile(text.encode("utf-8"), name), caption="📄 Текст документа"
+                )
+            else:
+                await send_split_message(callback.message, escape(text))
+            return
+
+        if action not in ("summarize", "explain"):
+            await status_msg.edit_text("Неизвестное действие.")
+            return
+        text = await document_processor.analyze(bot, file, action)
+        await status_msg.delete()
+        await send_split_message(callback.message, text, reply_markup=create_file_actions_keyboard())
+    except DocumentError as e:
+        await status_msg.edit_text(f"⚠️ {e}")
+    except Exception as e:
+        logger.error(f"File Action Error: {e}")
+        await status_msg.edit_text("Ошибка при обработке документа.")
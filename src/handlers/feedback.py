@@ -12,9 +12,11 @@ from src.config import ADMIN_ID
 from src.keyboards.builders import get_main_menu_keyboard
 
 # Импорты утилит и сервисов
-from src.utils.text_tools import clean_html_for_telegram, format_web_search_result, send_split_message
+from src.utils.text_tools import clean_html_for_telegram, format_web_search_result, send_split_message, \
+    make_queue_notifier
 from src.services.yandex_gpt import YandexGPTService
-from src.services.web_search_service import YandexWebSearchService
+from src.services.web_search_service import web_search_service
+from src.services.api_scheduler import Priority
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +24,6 @@ logger = logging.getLogger(__name__)
 router = Router()
 
 gpt_service = YandexGPTService()
-web_search_service = YandexWebSearchService()
 
 
 # --- Блок функционала "💡 Есть идея" (Связь с разработчиком) ---
@@ -43,8 +44,10 @@ async def process_idea(message: Message, state: FSMContext, bot: Bot):
     status_msg = await message.answer("📤 Обрабатываю и отправляю ваше сообщение...")
 
     # Генерация структурированного текста идеи через GPT
-    res = gpt_service.generate_response(IDEA_PROMPT, message.text)
-    formatted_text = res.get("text", message.text)
+    res = await gpt_service.generate_response(IDEA_PROMPT, message.text, route="cleanup", priority=Priority.NORMAL,
+                                              on_queued=make_queue_notifier(status_msg))
+    # Если нейросеть недоступна, передаем идею как есть
+    formatted_text = escape(message.text) if res.get("error") else res.get("text", message.text)
 
     # Формирование отчета для администратора (разработчика)
     report = (
@@ -117,7 +120,7 @@ async def process_web_search(message: Message, state: FSMContext):
 
     try:
         # Запрос к сервису веб-поиска
-        res = web_search_service.generate_web_response(message.text)
+        res = await web_search_service.generate_web_response(message.text, on_queued=make_queue_notifier(status_msg))
 
         if res and isinstance(res, list) and res[0].get("message"):
             raw_text = res[0]["message"]["content"]
@@ -9,13 +9,14 @@ from aiogram.filters import StateFilter
 from src.core.states import DialogStates
 from src.core.prompts import VLM_COMPLEX_PROMPT, VLM_DESCRIBE_PROMPT, OCR_CLEANUP_PROMPT, MAX_AUDIO_SIZE
 from src.keyboards.builders import create_recognition_keyboard, get_main_menu_keyboard
-from src.utils.media_tools import encode_image_to_base64, decode_qr_code, create_formatted_docx, generate_qr_image
-from src.utils.text_tools import send_split_message
+from src.utils.media_tools import read_telegram_file, decode_qr_code, create_formatted_docx, generate_qr_image
+from src.utils.text_tools import send_split_message, make_queue_notifier
 
 # Импорты сервисов
 from src.services.ocr_service import YandexOCRService
 from src.services.yandex_gpt import YandexGPTService
 from src.services.speech_service import YandexSpeechKitService
+from src.services.api_scheduler import api_scheduler, Priority
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -104,15 +105,15 @@ async def handle_photo_recognition(message: Message, bot: Bot, state: FSMContext
     recog_type = fsm_data.get("recognition_type", "simple")
     status_msg = await message.reply("⏳ Обрабатываю...")
 
+    photo_bytes, photo_data = None, None
     try:
-        # Скачиваем фото в память
-        photo_bytes = io.BytesIO()
-        await bot.download(message.photo[-1], destination=photo_bytes)
-        photo_data = photo_bytes.getvalue()
+        # Скачиваем фото в память один раз; все режимы читают его через memoryview без копий
+        photo_bytes = await read_telegram_file(bot, message.photo[-1])
+        photo_data = photo_bytes.getbuffer()
 
         # 1. Режим QR
         if recog_type == "qr":
-            qr_text = await decode_qr_code(bot, message.photo[-1].file_id)
+            qr_text = await decode_qr_code(photo_data)
             if qr_text:
                 await status_msg.delete()
                 await message.reply(f"📱 <b>QR:</b> <code>{qr_text}</code>", parse_mode="HTML")
@@ -125,22 +126,29 @@ async def handle_photo_recognition(message: Message, bot: Bot, state: FSMContext
 
         # 2. Режим Простой текст (OCR)
         if recog_type == "simple":
-            raw_text = ocr_service.recognize_text(photo_data)
+            raw_text = await ocr_service.recognize_text(photo_data, on_queued=make_queue_notifier(status_msg))
             if raw_text:
                 await status_msg.edit_text("🧹 Чищу текст...")
-                res = gpt_service.generate_response(OCR_CLEANUP_PROMPT, raw_text)
-                result_text = res.get("text", raw_text)
+                res = await gpt_service.generate_response(OCR_CLEANUP_PROMPT, raw_text, route="cleanup",
+                                                          priority=Priority.BATCH, on_queued=make_queue_notifier(status_msg))
+                # Если нейросеть недоступна, отдаем сырой OCR вместо сообщения об ошибке
+                result_text = raw_text if res.get("error") else res.get("text", raw_text)
             else:
                 result_text = None
 
         # 3. Режим Сложный документ (VLM + DOCX)
         elif recog_type == "complex":
-            img_base64 = await encode_image_to_base64(bot, message.photo[-1].file_id)
-            result_text = await gpt_service.generate_vlm_response(VLM_COMPLEX_PROMPT, img_base64)
+            if api_scheduler.available("vlm"):
+                result_text = await gpt_service.generate_vlm_response(
+                    VLM_COMPLEX_PROMPT, photo_data, on_queued=make_queue_notifier(status_msg)
+                )
+            else:
+                # Gemma недоступна — собираем документ из сырого текста Vision OCR
+                result_text = await ocr_service.recognize_text(photo_data, on_queued=make_queue_notifier(status_msg))
 
             if result_text:
                 await status_msg.edit_text("📄 Создаю файл...")
-                docx_buf = create_formatted_docx(result_text)
+                docx_buf = await create_formatted_docx(result_text)
                 await message.reply_document(
                     BufferedInputFile(docx_buf.getvalue(), "document.docx"),
                     caption="✅ Файл готов."
@@ -152,8 +160,12 @@ async def handle_photo_recognition(message: Message, bot: Bot, state: FSMContext
 
         # 4. Режим Описания (VLM)
         elif recog_type == "describe":
-            img_base64 = await encode_image_to_base64(bot, message.photo[-1].file_id)
-            result_text = await gpt_service.generate_vlm_response(VLM_DESCRIBE_PROMPT, img_base64)
+            if not api_scheduler.available("vlm"):
+                await status_msg.edit_text("⚠️ Визуальная модель временно недоступна. Попробуйте позже.")
+                return
+            result_text = await gpt_service.generate_vlm_response(
+                VLM_DESCRIBE_PROMPT, photo_data, on_queued=make_queue_notifier(status_msg)
+            )
 
         # Отправка текстового результата (для simple и describe)
         if result_text:
@@ -171,6 +183,12 @@ async def handle_photo_recognition(message: Message, bot: Bot, state: FSMContext
     except Exception as e:
         logger.error(f"Recog Error: {e}")
         await message.answer(f"⚠️ Ошибка: {e}")
+    finally:
+        # Фото больше не нужно: отпускаем буфер сразу, не дожидаясь сборщика мусора
+        if photo_data is not None:
+            photo_data.release()
+        if photo_bytes is not None:
+            photo_bytes.close()
 
 
 # --- Обработка Аудио (в режиме распознавания) ---
@@ -0,0 +1,53 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+
+class InFlightMiddleware(BaseMiddleware):
+    def __init__(self):
+        """
+        Внешний middleware, который учитывает выполняющиеся обработчики апдейтов.
+        Нужен для корректной остановки: дождаться ответов, а не обрывать их на середине.
+        """
+        self._tasks: set[asyncio.Task] = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def count(self) -> int:
+        return len(self._tasks)
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        self._idle.clear()
+        try:
+            return await handler(event, data)
+        finally:
+            self._tasks.discard(task)
+            if not self._tasks:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> int:
+        """
+        Ждет завершения выполняющихся обработчиков не дольше timeout секунд.
+
+        :return: Сколько обработчиков так и не завершилось.
+        """
+        if self._tasks:
+            logger.info(f"Ожидаю завершения {len(self._tasks)} обработчиков (до {timeout:.0f} с)...")
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Не дождались {len(self._tasks)} обработчиков.")
+        return len(self._tasks)
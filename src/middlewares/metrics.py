@@ -0,0 +1,41 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import SkipHandler
+from aiogram.types import TelegramObject
+
+from src.core.tracing import handler_var
+from src.services.metrics import HANDLER_UPDATES, HANDLER_SECONDS
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware: считает вызовы и длительность каждого хендлера.
+    Регистрируется на уровне диспетчера и наследуется всеми вложенными роутерами.
+    Имя хендлера также сохраняется в контексте (handler_var) для учета токенов.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        handler_token = handler_var.set(name)
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await handler(event, data)
+        except SkipHandler:
+            outcome = "skipped"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            HANDLER_UPDATES.inc(handler=name, outcome=outcome)
+            HANDLER_SECONDS.observe(time.perf_counter() - started, handler=name)
+            handler_var.reset(handler_token)
@@ -0,0 +1,254 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import (
+    TelegramMethod, SendMessage, SendPhoto, SendDocument, SendVoice, SendAudio, SendVideo, SendAnimation,
+    SendMediaGroup, SendSticker, SendLocation, SendContact, SendPoll, CopyMessage, ForwardMessage,
+    EditMessageText, EditMessageCaption, EditMessageReplyMarkup, EditMessageMedia, DeleteMessage
+)
+
+from src.config import (
+    TELEGRAM_GLOBAL_RPS, TELEGRAM_CHAT_RPS, TELEGRAM_CHAT_BURST, TELEGRAM_GROUP_PER_MINUTE,
+    TELEGRAM_MAX_RETRY_AFTER
+)
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_WAIT_SECONDS = metrics.histogram(
+    "methodist_outbound_wait_seconds", "Ожидание исходящего вызова Bot API в очереди", ["priority"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+OUTBOUND_COALESCED = metrics.counter(
+    "methodist_outbound_coalesced_total", "Правки и удаления, поглощенные более поздним вызовом", ["method"]
+)
+OUTBOUND_RETRIES = metrics.counter(
+    "methodist_outbound_retries_total", "Повторы вызовов Bot API после RetryAfter", ["method"]
+)
+OUTBOUND_QUEUED = metrics.gauge("methodist_outbound_queued", "Исходящие вызовы Bot API в очереди")
+
+# Вызовы, на которые распространяются лимиты Telegram на отправку в чат
+LIMITED_METHODS = (
+    SendMessage, SendPhoto, SendDocument, SendVoice, SendAudio, SendVideo, SendAnimation, SendMediaGroup,
+    SendSticker, SendLocation, SendContact, SendPoll, CopyMessage, ForwardMessage,
+    EditMessageText, EditMessageCaption, EditMessageReplyMarkup, EditMessageMedia, DeleteMessage
+)
+EDIT_METHODS = (EditMessageText, EditMessageCaption, EditMessageReplyMarkup, EditMessageMedia)
+# Лимит чата считает новые сообщения; правки и удаления идут в общей очереди чата без него
+CHAT_PACED_METHODS = tuple(method for method in LIMITED_METHODS if method not in EDIT_METHODS + (DeleteMessage,))
+
+INTERACTIVE = 0  # Ответы пользователям
+BACKGROUND = 1   # Рассылки: уступают место ответам в общем лимите
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("outbound_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def background_sends():
+    """Вызовы Bot API внутри блока (и в созданных из него задачах) идут с фоновым приоритетом."""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: float = 1.0):
+        """
+        Token bucket: не больше rate вызовов в секунду в среднем и burst подряд.
+        Ожидающие получают токены по приоритету, при равном приоритете — в порядке очереди.
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, priority: int = INTERACTIVE):
+        if self.rate <= 0:
+            return
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._schedule()
+        await future
+
+    def _schedule(self):
+        if self._timer is None and self._waiters:
+            delay = max(0.0, (1 - self._tokens) / self.rate)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        self._timer = None
+        self._refill()
+        while self._waiters and self._tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():  # отмененные ожидающие токен не тратят
+                self._tokens -= 1
+                future.set_result(None)
+        self._schedule()
+
+    @property
+    def idle(self) -> bool:
+        """Никто не ждет и запас токенов полный — состояние можно не хранить."""
+        self._refill()
+        return not self._waiters and self._tokens >= self.burst
+
+
+class _Entry:
+    __slots__ = ("method", "key", "future", "followers", "started", "superseded")
+
+    def __init__(self, method: TelegramMethod, key: Optional[tuple]):
+        self.method = method
+        self.key = key  # (тип правки, message_id) — по нему склеиваются подряд идущие правки
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.followers = 0
+        self.started = False
+        self.superseded = False  # правку отменило удаление того же сообщения
+
+
+class _ChatQueue:
+    def __init__(self, limiter: RateLimiter):
+        self.lock = asyncio.Lock()  # asyncio.Lock будит ожидающих по очереди — это и есть FIFO чата
+        self.limiter = limiter
+        self.tail: Optional[_Entry] = None
+        self.pending = 0
+
+
+class OutboundDispatcher(BaseRequestMiddleware):
+    def __init__(self, global_rps: float = TELEGRAM_GLOBAL_RPS, chat_rps: float = TELEGRAM_CHAT_RPS,
+                 chat_burst: int = TELEGRAM_CHAT_BURST, group_per_minute: float = TELEGRAM_GROUP_PER_MINUTE,
+                 max_retry_after: float = TELEGRAM_MAX_RETRY_AFTER):
+        """
+        Middleware сессии бота: все исходящие сообщения, правки и удаления проходят через очереди.
+
+        - В каждом чате вызовы выполняются строго по порядку (FIFO), новые сообщения — не чаще лимита чата
+          (для групп — group_per_minute в минуту), так что пачка сообщений одному пользователю
+          тормозит только его чат.
+        - Общий лимит global_rps делят все чаты; рассылки (background_sends) пропускают ответы вперед.
+        - Правка сообщения, которая еще ждет очереди, заменяется более поздней правкой того же сообщения
+          («место в очереди: 5» -> «место в очереди: 3» уходит одним вызовом), а удаление сообщения
+          отменяет ждущую правку: ее вызовы получают TelegramBadRequest «message to edit not found»,
+          как если бы правка ушла после удаления.
+        - TelegramRetryAfter не доходит до обработчика: очередь чата ставится на паузу
+          и вызов повторяется, если пауза не дольше max_retry_after.
+
+        Остальные методы (getFile, answerCallbackQuery, sendChatAction...) проходят без очереди.
+        """
+        self.global_limiter = RateLimiter(global_rps, burst=max(1.0, global_rps))
+        self.chat_rps = chat_rps
+        self.chat_burst = chat_burst
+        self.group_rps = group_per_minute / 60
+        self.max_retry_after = max_retry_after
+        self._chats: dict[Any, _ChatQueue] = {}
+        OUTBOUND_QUEUED.set_function(lambda: self.queued)
+
+    @property
+    def queued(self) -> int:
+        return sum(queue.pending for queue in self._chats.values())
+
+    def _queue(self, chat_id) -> _ChatQueue:
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            if len(self._chats) >= 1000:
+                # Очереди чатов, где давно ничего не отправляли, больше не ограничивают отправку
+                for idle_chat in [key for key, value in self._chats.items() if not value.pending and value.limiter.idle]:
+                    del self._chats[idle_chat]
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            queue = self._chats[chat_id] = _ChatQueue(
+                RateLimiter(self.group_rps if is_group else self.chat_rps, burst=self.chat_burst)
+            )
+        return queue
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Any:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or not isinstance(method, LIMITED_METHODS):
+            return await make_request(bot, method)
+
+        queue = self._queue(chat_id)
+        tail = queue.tail
+        message_id = getattr(method, "message_id", None)
+        if tail is not None and not tail.started and message_id is not None and tail.key is not None \
+                and tail.key[1] == message_id:
+            if isinstance(method, EDIT_METHODS) and tail.key[0] is type(method):
+                # Подряд идущие правки одного сообщения: уйдет только последняя
+                tail.method = method
+                return await self._follow(tail, method)
+            if isinstance(method, DeleteMessage):
+                # Сообщение все равно будет удалено — ждущую правку не отправляем. Результат удаления (True)
+                # вызывающим правку не отдаем: они ждут Message, поэтому правка завершается ошибкой
+                tail.superseded = True
+                tail.key = None
+                OUTBOUND_COALESCED.inc(method=type(tail.method).__name__)
+
+        key = (type(method), message_id) if isinstance(method, EDIT_METHODS) and message_id else None
+        entry = _Entry(method, key)
+        queue.tail = entry
+        queue.pending += 1
+        priority = _priority.get()
+        queued_at = time.monotonic()
+        try:
+            async with queue.lock:
+                entry.started = True
+                if queue.tail is entry:
+                    queue.tail = None
+                if entry.superseded:
+                    raise TelegramBadRequest(entry.method, "Bad Request: message to edit not found")
+                if isinstance(entry.method, CHAT_PACED_METHODS):
+                    await queue.limiter.acquire()
+                await self.global_limiter.acquire(priority)
+                OUTBOUND_WAIT_SECONDS.observe(time.monotonic() - queued_at,
+                                              priority="background" if priority else "interactive")
+                result = await self._send(make_request, bot, entry.method, priority)
+        except BaseException as e:
+            if entry.followers and not entry.future.done():
+                entry.future.set_exception(e)
+            raise
+        else:
+            entry.future.set_result(result)
+            return result
+        finally:
+            queue.pending -= 1
+
+    @staticmethod
+    async def _follow(entry: _Entry, method: TelegramMethod) -> Any:
+        entry.followers += 1
+        OUTBOUND_COALESCED.inc(method=type(method).__name__)
+        # shield: отмена одного из ожидающих не отменяет общий вызов
+        return await asyncio.shield(entry.future)
+
+    async def _send(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod,
+                    priority: int) -> Any:
+        while True:
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if e.retry_after > self.max_retry_after:
+                    raise
+                OUTBOUND_RETRIES.inc(method=type(method).__name__)
+                logger.warning(f"Telegram просит подождать {e.retry_after} с перед {type(method).__name__}")
+                # Очередь чата стоит, пока мы держим ее блокировку; остальные чаты продолжают отправку
+                await asyncio.sleep(e.retry_after)
+                await self.global_limiter.acquire(priority)
+
+
+outbound_dispatcher = OutboundDispatcher()
@@ -0,0 +1,71 @@
+import logging
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from src.core.tracing import trace_id_var, user_id_var, new_trace_id, StackSampler, collapse_samples, dump_slow_trace
+
+logger = logging.getLogger(__name__)
+
+
+class TracingMiddleware(BaseMiddleware):
+    def __init__(self, slow_threshold: float, slow_logger: logging.Logger, sampler: Optional[StackSampler] = None):
+        """
+        Внешний middleware трассировки апдейтов.
+
+        Выдает каждому апдейту trace_id (попадает во все строки логов), замеряет время
+        от получения до завершения обработки и при превышении slow_threshold секунд
+        пишет трассировку с профилем стеков в отдельный ротируемый файл.
+        """
+        self.slow_threshold = slow_threshold
+        self.slow_logger = slow_logger
+        self.sampler = sampler
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        trace_id = new_trace_id()
+        token = trace_id_var.set(trace_id)
+        user = data.get("event_from_user")
+        user_token = user_id_var.set(user.id if user else None)
+        frame = sys._getframe()
+        if self.sampler:
+            self.sampler.register(frame, trace_id)
+
+        started = time.perf_counter()
+        error = None
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            error = repr(e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            samples = self.sampler.unregister(frame, trace_id) if self.sampler else None
+            if elapsed >= self.slow_threshold:
+                self._dump(event, data, trace_id, elapsed, error, samples)
+            user_id_var.reset(user_token)
+            trace_id_var.reset(token)
+
+    def _dump(self, event: TelegramObject, data: Dict[str, Any], trace_id: str, elapsed: float,
+              error: Optional[str], samples):
+        user = data.get("event_from_user")
+        record = {
+            "trace_id": trace_id,
+            "update_id": getattr(event, "update_id", None),
+            "event_type": event.event_type if isinstance(event, Update) else type(event).__name__,
+            "user_id": user.id if user else None,
+            "elapsed_seconds": round(elapsed, 3),
+            "error": error,
+        }
+        if samples is not None:
+            record["cpu_samples"] = sum(samples.values())
+            record["profile"] = collapse_samples(samples, self.sampler.interval)
+        logger.warning(f"Медленная обработка апдейта: {elapsed:.2f} с")
+        dump_slow_trace(self.slow_logger, record)
@@ -0,0 +1,240 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from enum import IntEnum
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from src.config import (
+    API_LIMITS, API_MAX_RETRIES, API_SLOW_CALL_SECONDS,
+    BREAKER_WINDOW_SECONDS, BREAKER_ERROR_RATE, BREAKER_OPEN_SECONDS
+)
+from src.services.circuit_breaker import CircuitBreaker, CircuitOpenError, CircuitState
+from src.services.metrics import UPSTREAM_RESPONSES, UPSTREAM_SECONDS, QUEUE_DEPTH, API_ACTIVE, BREAKER_STATE
+
+logger = logging.getLogger(__name__)
+
+# Коды, при которых запрос имеет смысл повторить (квоты и временные сбои Yandex Cloud)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+QueueCallback = Callable[[int], Awaitable[None]]
+
+
+class Priority(IntEnum):
+    """Приоритет запроса: чем меньше значение, тем раньше он покинет очередь."""
+    INTERACTIVE = 0  # Диалог с пользователем
+    NORMAL = 1       # Идеи, веб-поиск
+    BATCH = 2        # OCR, VLM, креативные тексты
+
+
+class _Lane:
+    def __init__(self, name: str, max_concurrency: int, rps: float):
+        """Очередь и лимиты одного API."""
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.interval = 1 / rps if rps > 0 else 0.0
+        self.active = 0
+        self.waiters: list[list] = []  # Куча из [priority, seq, future]
+        self.next_start = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for entry in self.waiters if not entry[2].done())
+
+
+class ApiScheduler:
+    def __init__(self, limits: dict[str, tuple[int, float]], max_retries: int = 3,
+                 base_delay: float = 0.5, max_delay: float = 10.0):
+        """
+        Общий планировщик запросов ко всем API Yandex Cloud.
+
+        Для каждого API ограничивает число одновременных запросов и RPS, выстраивает
+        ожидающих в очередь по приоритету и повторяет запросы при 429/5xx
+        с экспоненциальной задержкой и случайным разбросом (jitter).
+        Все сервисы используют один пул HTTP-соединений.
+        Для каждого API работает предохранитель: пока он разомкнут, запросы отклоняются сразу.
+        """
+        self.lanes = {name: _Lane(name, concurrency, rps) for name, (concurrency, rps) in limits.items()}
+        self.breakers = {
+            name: CircuitBreaker(
+                name,
+                window=BREAKER_WINDOW_SECONDS,
+                error_rate=BREAKER_ERROR_RATE,
+                slow_call=API_SLOW_CALL_SECONDS.get(name, 20.0),
+                open_seconds=BREAKER_OPEN_SECONDS
+            )
+            for name in limits
+        }
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._seq = itertools.count()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Общий HTTP-клиент с пулом соединений (создается при первом обращении)."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient()
+        return self._client
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+
+    async def request(
+            self,
+            api: str,
+            method: str,
+            url: str,
+            *,
+            priority: Priority = Priority.NORMAL,
+            on_queued: Optional[QueueCallback] = None,
+            **kwargs
+    ) -> httpx.Response:
+        """
+        Выполняет HTTP-запрос к API с учетом лимитов, очереди и повторов.
+
+        :param api: Имя API из API_LIMITS ("gpt", "gpt_lite", "vlm", "vision", "stt", "tts", "search").
+        :param on_queued: Вызывается с позицией в очереди, если запрос не может стартовать сразу.
+        :return: Последний полученный ответ (в том числе с ошибкой после исчерпания повторов).
+        :raises CircuitOpenError: если предохранитель API разомкнут — ответ нужно получить без него.
+        :raises httpx.TransportError: если сеть недоступна после всех попыток.
+        """
+        lane = self.lanes[api]
+        breaker = self.breakers[api]
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                UPSTREAM_RESPONSES.inc(api=api, status="circuit_open")
+                raise
+            try:
+                await self._acquire(lane, priority, on_queued if attempt == 0 else None)
+            except BaseException:
+                breaker.cancel_call()
+                raise
+
+            started = time.monotonic()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                breaker.record(False, time.monotonic() - started)
+                UPSTREAM_RESPONSES.inc(api=api, status="network_error")
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"[{api}] Сетевая ошибка ({e!r}), попытка {attempt + 1}/{self.max_retries}")
+                response = None
+            except BaseException:
+                breaker.cancel_call()
+                raise
+            else:
+                elapsed = time.monotonic() - started
+                breaker.record(response.status_code not in RETRY_STATUSES, elapsed)
+                UPSTREAM_RESPONSES.inc(api=api, status=response.status_code)
+                UPSTREAM_SECONDS.observe(elapsed, api=api)
+            finally:
+                self._release(lane)
+
+            if response is not None and (response.status_code not in RETRY_STATUSES or attempt == self.max_retries):
+                return response
+
+            delay = self._backoff(attempt, response)
+            if response is not None:
+                logger.warning(f"[{api}] Код {response.status_code}, повтор через {delay:.1f} с")
+            await asyncio.sleep(delay)
+
+        raise RuntimeError("unreachable")
+
+    def available(self, api: str) -> bool:
+        """False, если предохранитель API разомкнут и обращаться к нему бессмысленно."""
+        return self.breakers[api].available()
+
+    def stats(self) -> dict[str, dict]:
+        """Текущая загрузка очередей и состояние предохранителей (для мониторинга)."""
+        return {
+            name: {
+                "active": lane.active,
+                "queued": lane.queue_depth,
+                "limit": lane.max_concurrency,
+                "breaker": self.breakers[name].snapshot(),
+            }
+            for name, lane in self.lanes.items()
+        }
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        # "Full jitter": случайная задержка до экспоненциального потолка
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt + 1)))
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = max(delay, min(float(retry_after), self.max_delay))
+        return delay
+
+    async def _acquire(self, lane: _Lane, priority: Priority, on_queued: Optional[QueueCallback]):
+        if lane.active < lane.max_concurrency and not lane.queue_depth:
+            lane.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            entry = [int(priority), next(self._seq), future]
+            heapq.heappush(lane.waiters, entry)
+
+            # Отмена возможна и во время on_queued: ожидание из кучи нужно снять, иначе слот уйдет «мертвому» future
+            try:
+                if on_queued:
+                    position = sum(1 for other in lane.waiters if other[:2] <= entry[:2] and not other[2].done())
+                    try:
+                        await on_queued(position)
+                    except Exception as e:
+                        logger.debug(f"Не удалось сообщить позицию в очереди: {e}")
+                await future
+            except BaseException:
+                if future.done() and not future.cancelled():
+                    # Слот уже был передан этому запросу — возвращаем его следующему
+                    self._release(lane)
+                else:
+                    future.cancel()
+                raise
+
+        # Слот уже занят, а release в request() еще не действует — при отмене во время паузы возвращаем его здесь
+        try:
+            await self._throttle(lane)
+        except BaseException:
+            self._release(lane)
+            raise
+
+    def _release(self, lane: _Lane):
+        while lane.waiters:
+            _, _, future = heapq.heappop(lane.waiters)
+            if not future.done():
+                # Слот передается следующему по приоритету, счетчик активных не меняется
+                future.set_result(None)
+                return
+        lane.active -= 1
+
+    async def _throttle(self, lane: _Lane):
+        if not lane.interval:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, lane.next_start)
+        lane.next_start = start + lane.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+# Единственный экземпляр на процесс: лимиты общие для всех хендлеров
+api_scheduler = ApiScheduler(API_LIMITS, max_retries=API_MAX_RETRIES)
+
+# Значения очередей и предохранителей вычисляются только в момент выгрузки метрик
+_BREAKER_CODES = {CircuitState.CLOSED: 0, CircuitState.HALF_OPEN: 1, CircuitState.OPEN: 2}
+QUEUE_DEPTH.set_function(lambda: {(name,): lane.queue_depth for name, lane in api_scheduler.lanes.items()})
+API_ACTIVE.set_function(lambda: {(name,): lane.active for name, lane in api_scheduler.lanes.items()})
+BREAKER_STATE.set_function(
+    lambda: {(name,): _BREAKER_CODES[breaker.state] for name, breaker in api_scheduler.breakers.items()}
+)
@@ -0,0 +1,136 @@
+import logging
+import time
+from collections import deque
+from enum import Enum
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"        # Запросы идут как обычно
+    OPEN = "open"            # API считается недоступным, запросы отклоняются сразу
+    HALF_OPEN = "half_open"  # Пробные запросы после паузы
+
+
+class CircuitOpenError(Exception):
+    """API временно отключено предохранителем — ответ нужно получить без него."""
+
+    def __init__(self, name: str):
+        super().__init__(f"Сервис '{name}' временно недоступен")
+        self.name = name
+
+
+class CircuitBreaker:
+    def __init__(
+            self,
+            name: str,
+            window: float = 60.0,
+            min_calls: int = 5,
+            error_rate: float = 0.5,
+            slow_call: float = 20.0,
+            slow_rate: float = 0.8,
+            open_seconds: float = 30.0,
+            probe_calls: int = 1
+    ):
+        """
+        Предохранитель для одного API по скользящему окну ошибок и задержек.
+
+        :param window: Длина окна наблюдения в секундах.
+        :param min_calls: Минимум вызовов в окне, прежде чем делать выводы.
+        :param error_rate: Доля ошибок, при которой цепь размыкается.
+        :param slow_call: Порог "медленного" ответа в секундах.
+        :param slow_rate: Доля медленных ответов, при которой цепь размыкается.
+        :param open_seconds: Сколько держать цепь разомкнутой до пробных запросов.
+        :param probe_calls: Сколько пробных запросов пропускать в полуоткрытом состоянии.
+        """
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.probe_calls = probe_calls
+
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._calls: deque[tuple[float, bool, float]] = deque()  # (время, успех, задержка)
+        self.transitions: deque[tuple[float, str, str]] = deque(maxlen=50)
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state is CircuitState.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(CircuitState.HALF_OPEN)
+        return self._state
+
+    def available(self) -> bool:
+        """Можно ли сейчас рассчитывать на этот API (без резервирования пробного запроса)."""
+        state = self.state
+        return state is CircuitState.CLOSED or (state is CircuitState.HALF_OPEN and self._probes < self.probe_calls)
+
+    def before_call(self):
+        """
+        Проверяет, можно ли выполнить запрос.
+
+        :raises CircuitOpenError: если цепь разомкнута или лимит пробных запросов исчерпан.
+        """
+        state = self.state
+        if state is CircuitState.OPEN:
+            raise CircuitOpenError(self.name)
+        if state is CircuitState.HALF_OPEN:
+            if self._probes >= self.probe_calls:
+                raise CircuitOpenError(self.name)
+            self._probes += 1
+
+    def cancel_call(self):
+        """Запрос, пропущенный before_call, не состоялся (отмена) — освобождаем пробный слот."""
+        if self._state is CircuitState.HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+
+    def record(self, success: bool, latency: float):
+        """Учитывает результат запроса и при необходимости меняет состояние цепи."""
+        now = time.monotonic()
+
+        if self._state is CircuitState.HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if success and latency < self.slow_call:
+                self._calls.clear()
+                self._transition(CircuitState.CLOSED)
+            else:
+                self._open(now)
+            return
+
+        self._calls.append((now, success, latency))
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+
+        if self._state is CircuitState.CLOSED and len(self._calls) >= self.min_calls:
+            total = len(self._calls)
+            errors = sum(1 for _, ok, _ in self._calls if not ok)
+            slow = sum(1 for _, _, lat in self._calls if lat >= self.slow_call)
+            if errors / total >= self.error_rate or slow / total >= self.slow_rate:
+                self._open(now)
+
+    def snapshot(self) -> dict:
+        """Состояние предохранителя для мониторинга."""
+        total = len(self._calls)
+        errors = sum(1 for _, ok, _ in self._calls if not ok)
+        return {
+            "state": self.state.value,
+            "calls": total,
+            "error_rate": round(errors / total, 3) if total else 0.0,
+            "last_transition": self.transitions[-1] if self.transitions else None,
+        }
+
+    def _open(self, now: float):
+        self._opened_at = now
+        self._probes = 0
+        self._transition(CircuitState.OPEN)
+
+    def _transition(self, new_state: CircuitState):
+        if new_state is self._state:
+            return
+        logger.warning(f"Предохранитель '{self.name}': {self._state.value} -> {new_state.value}")
+        self.transitions.append((time.time(), self._state.value, new_state.value))
+        self._state = new_state
@@ -1,6 +1,6 @@
 import sqlite3
 import logging
-from src.config import BASE_DIR
+from src.config import BASE_DIR, DB_NAME
 
 logger = logging.getLogger(__name__)
 
@@ -8,7 +8,7 @@ class Database:
     def __init__(self, db_name="bot_users.db"):
         """
         Инициализация подключения к базе данных.
-        Файл базы данных будет создан в корневой директории проекта.
+        Файл базы данных будет создан в корневой директории проекта (абсолютный путь используется как есть).
         """
         self.db_path = BASE_DIR / db_name
         # Используем check_same_thread=False для корректной работы в асинхронной среде aiogram
@@ -42,6 +42,28 @@ class Database:
                 status TEXT DEFAULT 'active'
             )
         """)
+        self._execute("""
+            CREATE TABLE IF NOT EXISTS token_usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL,
+                day TEXT,
+                user_id INTEGER,
+                handler TEXT,
+                model TEXT,
+                input_tokens INTEGER,
+                output_tokens INTEGER
+            )
+        """)
+        self._execute("CREATE INDEX IF NOT EXISTS idx_token_usage_day ON token_usage (day, user_id)")
+        self._execute("""
+            CREATE TABLE IF NOT EXISTS telegram_files (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER,
+                size INTEGER,
+                file_id TEXT,
+                updated_at REAL
+            )
+        """)
         logger.info(f"База данных успешно инициализирована по пути: {self.db_path}")
 
     def add_user(self, user_id: int, username: str, first_name: str):
@@ -96,6 +118,91 @@ class Database:
             logger.error(f"Ошибка при поиске пользователя {user_id}: {e}")
             return None
 
+    def add_token_usage(self, rows: list[tuple]):
+        """
+        Пакетная запись расхода токенов одной транзакцией.
+        Строка: (created_at, day, user_id, handler, model, input_tokens, output_tokens).
+        """
+        try:
+            self.cursor.executemany(
+                "INSERT INTO token_usage (created_at, day, user_id, handler, model, input_tokens, output_tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+        except Exception as e:
+            logger.error(f"Ошибка при записи расхода токенов: {e}")
+            self.conn.rollback()
+
+    def get_token_usage_by_user(self, day: str) -> dict[int, int]:
+        """
+        Суммарный расход токенов за день по пользователям (для восстановления бюджетов после перезапуска).
+        """
+        try:
+            self.cursor.execute(
+                "SELECT user_id, SUM(input_tokens + output_tokens) FROM token_usage WHERE day = ? GROUP BY user_id",
+                (day,)
+            )
+            return {row[0]: row[1] for row in self.cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"Ошибка при чтении расхода токенов: {e}")
+            return {}
+
+    def get_token_report(self, day: str, group_by: str) -> list[tuple]:
+        """
+        Отчет о расходе токенов за день, сгруппированный по полю user_id, handler или model.
+        Возвращает строки (ключ, модель, вызовы, входные токены, выходные токены), по убыванию расхода.
+        """
+        if group_by not in ("user_id", "handler", "model"):
+            raise ValueError(f"Недопустимая группировка: {group_by}")
+        try:
+            self.cursor.execute(
+                f"SELECT {group_by}, model, COUNT(*), SUM(input_tokens), SUM(output_tokens) FROM token_usage "
+                f"WHERE day = ? GROUP BY {group_by}, model "
+                f"ORDER BY SUM(input_tokens + output_tokens) DESC",
+                (day,)
+            )
+            return self.cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Ошибка при построении отчета о токенах: {e}")
+            return []
+
+    def get_telegram_file_id(self, path: str, mtime_ns: int, size: int) -> str | None:
+        """
+        file_id ранее загруженного в Telegram файла, если файл с тех пор не менялся.
+        """
+        try:
+            self.cursor.execute(
+                "SELECT file_id FROM telegram_files WHERE path = ? AND mtime_ns = ? AND size = ?",
+                (path, mtime_ns, size)
+            )
+            row = self.cursor.fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Ошибка при чтении file_id для {path}: {e}")
+            return None
+
+    def set_telegram_file_id(self, path: str, mtime_ns: int, size: int, file_id: str, updated_at: float):
+        """
+        Запоминает file_id загруженного файла; запись для прежней версии файла заменяется.
+        """
+        self._execute(
+            "INSERT OR REPLACE INTO telegram_files (path, mtime_ns, size, file_id, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (path, mtime_ns, size, file_id, updated_at)
+        )
+
+    def delete_telegram_file_id(self, path: str):
+        self._execute("DELETE FROM telegram_files WHERE path = ?", (path,))
+
+    def close(self):
+        """
+        Закрытие соединения с базой данных при остановке бота.
+        """
+        try:
+            self.conn.close()
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии базы данных: {e}")
+
 # --- ВАЖНО: Создание экземпляра класса для экспорта ---
 # Именно эта строка позволяет делать 'from src.services.database import db'
-db = Database()
\ No newline at end of file
+db = Database(DB_NAME)
\ No newline at end of file
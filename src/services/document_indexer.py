@@ -0,0 +1,170 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from src.config import DOCUMENTS_DIR, DOCUMENT_CATALOG_PATH, DOCUMENT_INDEX_WORKERS
+from src.utils.document_text import SUPPORTED_EXTENSIONS, PdfReader, extract_document
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION = 1
+MAX_TERMS = 40
+
+_WORD_RE = re.compile(r"[а-яёa-z][а-яёa-z0-9]{3,}|\d{4}")
+_STOP_WORDS = {
+    "этот", "этой", "этом", "эти", "того", "тому", "также", "такой", "так", "которые", "который", "которая",
+    "которых", "может", "могут", "быть", "были", "было", "была", "будет", "если", "когда", "чтобы", "через",
+    "после", "перед", "между", "более", "менее", "очень", "всех", "всего", "свой", "своих", "своей", "него",
+    "нему", "них", "ними", "даже", "либо", "лишь", "только", "однако", "поэтому", "где", "здесь", "там",
+    "with", "from", "that", "this", "page", "стр",
+    # Слова из запросов на файл есть почти в любом документе и не отличают один файл от другого
+    "документ", "файл", "страниц", "текст",
+}
+# Типичные окончания: по основе «отчет» находятся и «отчеты», и «отчетов»
+_ENDINGS = sorted((
+    "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "ов", "ев", "ей", "ий", "ый", "ой", "ая",
+    "яя", "ое", "ее", "ые", "ие", "ам", "ям", "ах", "ях", "ом", "ем", "ию", "ия", "ие", "а", "я", "ы", "и",
+    "е", "о", "у", "ю", "ь"
+), key=len, reverse=True)
+
+
+def stem(word: str) -> str:
+    """Грубая основа русского слова: отбрасывает окончание, оставляя не меньше 4 букв."""
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 4:
+            return word[:-len(ending)]
+    return word
+
+
+def extract_terms(text: str, limit: int = MAX_TERMS) -> list[str]:
+    """Самые частые основы слов текста (без служебных слов)."""
+    counts = Counter()
+    for word in _WORD_RE.findall(text.lower().replace("ё", "е")):
+        term = stem(word)
+        if word not in _STOP_WORDS and term not in _STOP_WORDS:
+            counts[term] += 1
+    return [term for term, _ in counts.most_common(limit)]
+
+
+def index_file(path: str) -> dict:
+    """
+    Извлекает заголовок и термины одного файла. Выполняется в дочернем процессе,
+    поэтому функция модульная и принимает/возвращает только сериализуемые значения.
+    """
+    document = extract_document(Path(path))
+    return {
+        "title": document.title,
+        "title_terms": extract_terms(document.title, limit=12),
+        "terms": extract_terms(document.text),
+        "pages": len(document.pages),
+    }
+
+
+class DocumentIndexer:
+    def __init__(self, docs_dir: Path = DOCUMENTS_DIR, catalog_path: Path = DOCUMENT_CATALOG_PATH,
+                 workers: int = DOCUMENT_INDEX_WORKERS):
+        """
+        Каталог документов из data/documents, построенный по их содержимому.
+
+        Для каждого PDF и DOCX сохраняются заголовок и частотные термины, по которым
+        FileSearchService находит файлы без ручной записи в file_index.json.
+        Индексация инкрементальная: файлы с прежними mtime и размером не перечитываются,
+        новые и измененные разбираются параллельно в пуле процессов.
+        """
+        self.docs_dir = docs_dir
+        self.catalog_path = catalog_path
+        self.workers = workers
+
+    def load(self) -> dict[str, dict]:
+        try:
+            with open(self.catalog_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CATALOG_VERSION:
+                return data.get("files", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка чтения каталога документов: {e}")
+        return {}
+
+    def _save(self, files: dict[str, dict]):
+        # Пишем во временный файл и подменяем: читатели никогда не видят недописанный каталог
+        tmp_path = self.catalog_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CATALOG_VERSION, "files": files}, f, ensure_ascii=False, indent=1)
+        tmp_path.replace(self.catalog_path)
+
+    def _candidates(self) -> dict[str, Path]:
+        if not self.docs_dir.exists():
+            return {}
+        paths = {
+            path.name: path for path in sorted(self.docs_dir.iterdir())
+            if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS
+        }
+        if PdfReader is None:
+            skipped = [name for name in paths if name.lower().endswith(".pdf")]
+            if skipped:
+                logger.warning(f"pypdf не установлен, PDF не индексируются: {len(skipped)} файлов")
+            paths = {name: path for name, path in paths.items() if name not in skipped}
+        return paths
+
+    def update(self) -> dict[str, dict]:
+        """
+        Приводит каталог в соответствие с папкой документов и возвращает его.
+        Блокирующий вызов: из event loop запускать через asyncio.to_thread.
+        """
+        started = time.perf_counter()
+        old = self.load()
+        files: dict[str, dict] = {}
+        pending: dict[str, tuple[Path, int, int]] = {}
+        for name, path in self._candidates().items():
+            stat = path.stat()
+            entry = old.get(name)
+            if entry and entry.get("mtime_ns") == stat.st_mtime_ns and entry.get("size") == stat.st_size:
+                files[name] = entry
+            else:
+                pending[name] = (path, stat.st_mtime_ns, stat.st_size)
+
+        if pending:
+            names = list(pending)
+            paths = [str(pending[name][0]) for name in names]
+            if self.workers > 1 and len(paths) > 1:
+                with ProcessPoolExecutor(max_workers=min(self.workers, len(paths))) as pool:
+                    results = list(pool.map(_safe_index_file, paths))
+            else:
+                results = [_safe_index_file(path) for path in paths]
+
+            for name, result in zip(names, results):
+                if result is None:
+                    continue
+                _, mtime_ns, size = pending[name]
+                files[name] = {**result, "mtime_ns": mtime_ns, "size": size}
+
+        removed = len(set(old) - set(files))
+        if pending or removed or not self.catalog_path.exists():
+            self._save(files)
+        logger.info(
+            f"Каталог документов: {len(files)} файлов, переиндексировано {len(pending)}, удалено {removed} "
+            f"за {time.perf_counter() - started:.2f} с"
+        )
+        return files
+
+
+def _safe_index_file(path: str) -> dict | None:
+    try:
+        return index_file(path)
+    except Exception as e:
+        logger.error(f"Не удалось проиндексировать {Path(path).name}: {e}")
+        return None
+
+
+document_indexer = DocumentIndexer()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    document_indexer.update()
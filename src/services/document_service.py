@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from contextlib import aclosing
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from aiogram import Bot
+
+from src.config import DOC_CHUNK_CHARS, DOC_MAX_CHUNKS, DOC_SUMMARY_CONCURRENCY
+from src.core.prompts import DOC_MAP_PROMPT, DOC_SUMMARY_PROMPT, DOC_EXPLAIN_PROMPT
+from src.services.api_scheduler import Priority
+from src.services.metrics import metrics
+from src.services.yandex_gpt import YandexGPTService
+from src.utils.document_text import SUPPORTED_EXTENSIONS, iter_pages
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_ACTIONS = metrics.counter(
+    "methodist_document_actions_total", "Действия с документами пользователей", ["action", "cache"]
+)
+
+ACTION_PROMPTS = {"summarize": DOC_SUMMARY_PROMPT, "explain": DOC_EXPLAIN_PROMPT}
+MAX_CACHED_TEXT = 200_000  # извлеченный текст больше этого в кэше не держим
+
+
+class DocumentError(Exception):
+    """Документ нельзя обработать; текст исключения можно показать пользователю."""
+
+
+class DocumentProcessor:
+    def __init__(
+            self,
+            gpt_service: Optional[YandexGPTService] = None,
+            chunk_chars: int = DOC_CHUNK_CHARS,
+            max_chunks: int = DOC_MAX_CHUNKS,
+            concurrency: int = DOC_SUMMARY_CONCURRENCY,
+            cache_size: int = 128
+    ):
+        """
+        Обработка присланных пользователем PDF и DOCX: извлечение текста, выжимка, объяснение сути.
+
+        Файл скачивается потоково во временный файл (не в память), текст читается постранично генератором.
+        Длинные документы обрабатываются по схеме map-reduce: фрагменты кратко излагаются параллельно
+        (не больше concurrency вызовов YandexGPT одновременно), затем изложения сводятся в итоговый ответ.
+        Результаты кэшируются по file_unique_id: повторное действие с тем же файлом — мгновенно,
+        а выжимка и объяснение используют общие изложения фрагментов.
+        """
+        self.gpt_service = gpt_service or YandexGPTService()
+        self.chunk_chars = chunk_chars
+        self.max_chunks = max_chunks
+        self.concurrency = concurrency
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple[str, str], object] = OrderedDict()
+        self._inflight: dict[tuple[str, str], asyncio.Task] = {}
+
+    @staticmethod
+    def is_supported(file_name: str) -> bool:
+        return Path(file_name or "").suffix.lower() in SUPPORTED_EXTENSIONS
+
+    # --- Кэш ---
+    def _cache_get(self, key: tuple[str, str]):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        return None
+
+    def _cache_put(self, key: tuple[str, str], value):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _shared(self, key: tuple[str, str], factory: Callable[[], Awaitable],
+                      cacheable: Callable[[object], bool] = lambda value: True):
+        """
+        Результат из кэша, иначе — один общий расчет на все одновременные запросы с этим ключом
+        (повторное нажатие кнопки не запускает обработку заново). Ошибки не кэшируются.
+        """
+        cached = self._cache_get(key)
+        if cached is not None:
+            DOCUMENT_ACTIONS.inc(action=key[1], cache="hit")
+            return cached
+        task = self._inflight.get(key)
+        if task is None:
+            DOCUMENT_ACTIONS.inc(action=key[1], cache="miss")
+
+            async def compute():
+                value = await factory()
+                if cacheable(value):
+                    self._cache_put(key, value)
+                return value
+
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: отмена одного ожидающего не прерывает расчет для остальных
+        return await asyncio.shield(task)
+
+    # --- Чтение файла ---
+    @staticmethod
+    async def _iter_pages(path: Path) -> AsyncIterator[str]:
+        """Страницы читаются по одной в рабочем потоке, event loop не блокируется."""
+        pages = iter_pages(path)
+        sentinel = object()
+        try:
+            while (page := await asyncio.to_thread(next, pages, sentinel)) is not sentinel:
+                yield page
+        finally:
+            pages.close()
+
+    async def _with_file(self, bot: Bot, file: dict, handler):
+        """Скачивает файл во временный файл на диске, вызывает handler(path) и удаляет файл."""
+        suffix = Path(file["file_name"]).suffix.lower()
+        fd, name = tempfile.mkstemp(suffix=suffix, prefix="methodist_")
+        os.close(fd)
+        path = Path(name)
+        try:
+            # aiogram пишет файл на диск по частям, целиком в памяти он не держится
+            await bot.download(file["file_id"], destination=path)
+            return await handler(path)
+        except DocumentError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка обработки документа {file['file_name']}: {e}")
+            raise DocumentError("Не удалось прочитать файл. Проверьте, что это неповрежденный PDF или DOCX.")
+        finally:
+            path.unlink(missing_ok=True)
+
+    # --- Действия ---
+    async def extract_text(self, bot: Bot, file: dict) -> str:
+        async def extract(path: Path) -> str:
+            async with aclosing(self._iter_pages(path)) as pages:
+                text = "\n\n".join([page async for page in pages if page])
+            if not text.strip():
+                raise DocumentError("В файле нет текстового слоя (возможно, это скан). "
+                                    "Для сканов используйте режим распознавания фото.")
+            return text
+
+        return await self._shared(
+            (file["file_unique_id"], "extract"), lambda: self._with_file(bot, file, extract),
+            cacheable=lambda text: len(text) <= MAX_CACHED_TEXT
+        )
+
+    async def _summarize_chunk(self, semaphore: asyncio.Semaphore, text: str) -> str:
+        async with semaphore:
+            res = await self.gpt_service.generate_response(
+                DOC_MAP_PROMPT, text, route="cleanup", priority=Priority.BATCH
+            )
+        if res.get("error"):
+            logger.warning("Не удалось изложить фрагмент документа")
+            return ""
+        return res.get("text", "")
+
+    async def _map(self, path: Path) -> tuple[list[str], bool]:
+        """
+        Map-шаг: фрагменты по chunk_chars символов отправляются на изложение по мере чтения страниц,
+        поэтому извлечение текста и вызовы модели идут одновременно.
+
+        :return: (изложения фрагментов по порядку, был ли документ обрезан по max_chunks).
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks: list[asyncio.Task] = []
+        buffer: list[str] = []
+        size = 0
+        truncated = False
+
+        def submit():
+            nonlocal size
+            tasks.append(asyncio.create_task(self._summarize_chunk(semaphore, "\n\n".join(buffer))))
+            buffer.clear()
+            size = 0
+
+        try:
+            async with aclosing(self._iter_pages(path)) as pages:
+                async for page in pages:
+                    # Фрагменты заполняются до chunk_chars, страница может разойтись по нескольким фрагментам
+                    position = 0
+                    while position < len(page):
+                        # Лимит проверяется перед каждым фрагментом: одна большая страница (или абзац DOCX)
+                        # не должна давать больше max_chunks вызовов модели
+                        if len(tasks) >= self.max_chunks:
+                            truncated = True
+                            break
+                        part = page[position:position + self.chunk_chars - size]
+                        buffer.append(part)
+                        size += len(part)
+                        position += len(part)
+                        if size >= self.chunk_chars:
+                            submit()
+                    if truncated:
+                        break
+            if buffer:
+                # Текст копится в buffer, только пока лимит не исчерпан, поэтому остаток всегда отправляется
+                submit()
+            parts = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return [part for part in parts if part], truncated
+
+    async def _reduce(self, parts: list[str], prompt: str) -> str:
+        """Reduce-шаг: если изложения не помещаются в один запрос, они сворачиваются группами, пока не поместятся."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        limit = self.chunk_chars * 2
+        while len(parts) > 1 and sum(map(len, parts)) > limit:
+            groups, group, size = [], [], 0
+            for part in parts:
+                if group and size + len(part) > limit:
+                    groups.append(group)
+                    group, size = [], 0
+                group.append(part)
+                size += len(part)
+            groups.append(group)
+            parts = [
+                part for part in await asyncio.gather(
+                    *(self._summarize_chunk(semaphore, "\n\n".join(group)) for group in groups)
+                ) if part
+            ]
+
+        joined = "\n\n".join(f"Часть {i}:\n{part}" for i, part in enumerate(parts, 1))
+        res = await self.gpt_service.generate_response(prompt, joined, route="rag", priority=Priority.BATCH)
+        if res.get("error"):
+            raise DocumentError("Нейросеть сейчас недоступна, попробуйте позже.")
+        return res.get("text", "")
+
+    async def analyze(self, bot: Bot, file: dict, action: str) -> str:
+        """Выжимка (summarize) или объяснение сути (explain) документа."""
+        prompt = ACTION_PROMPTS[action]
+        uid = file["file_unique_id"]
+
+        async def run() -> str:
+            parts, truncated = await self._shared((uid, "map"), lambda: self._with_file(bot, file, self._map))
+            if not parts:
+                raise DocumentError("Не удалось извлечь из файла текст для анализа.")
+            text = await self._reduce(parts, prompt)
+            if truncated:
+                limit = self.max_chunks * self.chunk_chars // 1000
+                text += f"\n\n<i>Документ большой: учтены первые ~{limit} тыс. знаков.</i>"
+            return text
+
+        return await self._shared((uid, action), run)
+
+
+document_processor = DocumentProcessor()
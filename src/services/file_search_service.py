@@ -1,18 +1,51 @@
+import asyncio
 import json
 import logging
+from collections import Counter
 from pathlib import Path
-from src.config import BASE_DIR
+from typing import Iterable, Optional
+
+from src.config import DATA_DIR, DOCUMENTS_DIR
+from src.core.prompts import FILE_REQUEST_TRIGGERS
+from src.services.document_indexer import DocumentIndexer, document_indexer
+from src.utils.aho_corasick import AhoCorasick
 
 logger = logging.getLogger(__name__)
 
+# Вес совпадения по источнику: ручные ключевые слова точнее заголовка, заголовок точнее текста
+KEYWORD_WEIGHT = 3
+TITLE_WEIGHT = 2
+TERM_WEIGHT = 1
+
 
 class FileSearchService:
-    def __init__(self):
-        self.index_path = BASE_DIR / "data" / "file_index.json"
-        self.docs_dir = BASE_DIR / "data" / "documents"
-        self.file_index = self._load_index()
+    def __init__(self, index_path: Path = DATA_DIR / "file_index.json",
+                 docs_dir: Path = DOCUMENTS_DIR,
+                 triggers: Iterable[str] = FILE_REQUEST_TRIGGERS,
+                 indexer: Optional[DocumentIndexer] = document_indexer,
+                 min_score: int = 2):
+        """
+        Поиск документов для отправки.
+
+        Источники: ручной file_index.json (ключевые слова) и автоматический каталог DocumentIndexer
+        (заголовки и термины из содержимого файлов). Все ключевые слова и триггеры запроса файла
+        скомпилированы в автоматы Ахо — Корасик: сообщение просматривается за один проход,
+        сколько бы документов ни было в каталоге.
+
+        :param min_score: Минимальный суммарный вес совпадений (одно ручное ключевое слово, слово
+            заголовка или два термина из текста).
+        """
+        self.index_path = index_path
+        self.docs_dir = docs_dir
+        self.indexer = indexer
+        self.min_score = min_score
+        self.file_index: list[dict] = []
+        self._keywords: AhoCorasick[tuple[int, int]] = AhoCorasick()
+        self._triggers: AhoCorasick[None] = AhoCorasick((trigger.lower(), None) for trigger in triggers)
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.reload()
 
-    def _load_index(self):
+    def _load_index(self) -> list[dict]:
         try:
             with open(self.index_path, "r", encoding="utf-8") as f:
                 return json.load(f)
@@ -20,27 +53,104 @@ class FileSearchService:
             logger.error(f"Ошибка загрузки индекса файлов: {e}")
             return []
 
+    def _merge(self, catalog: dict[str, dict]) -> list[dict]:
+        """Ручные записи дополняются терминами из каталога; файлы без ручной записи берутся из каталога."""
+        file_index = []
+        for item in self._load_index():
+            if not item.get("filename"):
+                continue
+            generated = catalog.get(item["filename"], {})
+            file_index.append({**item, "terms": generated.get("terms", [])})
+        manual = {item["filename"] for item in file_index}
+        for filename, generated in catalog.items():
+            if filename not in manual:
+                file_index.append({
+                    "filename": filename,
+                    "title": generated.get("title") or filename,
+                    "keywords": [],
+                    "title_terms": generated.get("title_terms", []),
+                    "terms": generated.get("terms", []),
+                })
+        return file_index
+
+    def reload(self) -> int:
+        """
+        Перечитывает ручной индекс и каталог, пересобирает автомат ключевых слов.
+        Новые структуры подменяются целиком, поэтому параллельные поиски видят либо старый индекс, либо новый.
+        """
+        file_index = self._merge(self.indexer.load() if self.indexer else {})
+        # Автоматические термины, которые есть у большинства документов («библиотек», шапка организации),
+        # не помогают выбрать файл и только создают ложные совпадения
+        frequency = Counter(
+            term for item in file_index for term in set(item.get("terms", [])) | set(item.get("title_terms", []))
+        )
+        common_limit = max(2, len(file_index) // 2)
+
+        weights: dict[tuple[str, int], int] = {}
+        for position, item in enumerate(file_index):
+            sources = (("terms", TERM_WEIGHT), ("title_terms", TITLE_WEIGHT), ("keywords", KEYWORD_WEIGHT))
+            for source, weight in sources:
+                for keyword in item.get(source, []):
+                    if source != "keywords" and frequency[keyword] > common_limit:
+                        continue
+                    keyword = str(keyword).strip().lower().replace("ё", "е")
+                    if keyword:
+                        weights[keyword, position] = max(weights.get((keyword, position), 0), weight)
+        keywords = AhoCorasick(
+            (keyword, (position, weight)) for (keyword, position), weight in weights.items()
+        )
+        self.file_index, self._keywords = file_index, keywords
+        logger.info(f"Индекс файлов: {len(file_index)} документов, {len(keywords)} ключевых слов.")
+        return len(file_index)
+
+    async def refresh(self) -> int:
+        """Обновляет каталог по папке документов (в отдельном потоке) и перезагружает индекс."""
+        if self.indexer:
+            await asyncio.to_thread(self.indexer.update)
+        return self.reload()
+
+    def start(self):
+        """Фоновое обновление каталога при запуске бота: до его завершения поиск работает по прежнему каталогу."""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self.refresh())
+
+    def is_file_request(self, text: str) -> bool:
+        """Есть ли в сообщении слово-триггер запроса файла («скинь», «пришли», «документ»...)."""
+        return self._triggers.contains_any(text.lower())
+
+    def rank(self, query: str, limit: int = 5) -> list[tuple[int, dict]]:
+        """
+        Документы по убыванию релевантности: суммарный вес разных совпавших ключевых слов,
+        при равенстве — суммарная длина совпадений (длинное «прием отчетов» точнее, чем «2025»),
+        затем порядок в индексе. Документы с весом ниже min_score отбрасываются.
+        """
+        file_index, keywords = self.file_index, self._keywords
+        matched: dict[int, dict[str, int]] = {}
+        for match in keywords.iter(query.lower().replace("ё", "е")):
+            position, weight = match.value
+            matched.setdefault(position, {})[match.pattern] = weight
+
+        scored = sorted(
+            (
+                (sum(patterns.values()), sum(map(len, patterns)), -position)
+                for position, patterns in matched.items()
+            ),
+            reverse=True
+        )
+        return [
+            (score, file_index[-position]) for score, _, position in scored[:limit] if score >= self.min_score
+        ]
+
     def find_file(self, query: str) -> dict | None:
         """
         Ищет файл по совпадению ключевых слов.
         Возвращает словарь с данными файла или None.
         """
-        query_lower = query.lower()
-        best_match = None
-        max_hits = 0
-
-        for item in self.file_index:
-            hits = 0
-            for keyword in item["keywords"]:
-                if keyword in query_lower:
-                    hits += 1
+        ranked = self.rank(query, limit=1)
+        return ranked[0][1] if ranked else None
 
-            if hits > max_hits:
-                max_hits = hits
-                best_match = item
+    def get_full_path(self, filename: str) -> Path:
+        return self.docs_dir / filename
 
-        # Условие: должно совпасть хотя бы 1-2 ключевых слова
-        return best_match if max_hits >= 1 else None
 
-    def get_full_path(self, filename: str) -> Path:
-        return self.docs_dir / filename
\ No newline at end of file
+file_search_service = FileSearchService()
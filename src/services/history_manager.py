@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import math
+
+from aiogram.fsm.context import FSMContext
+
+from src.config import HISTORY_TOKEN_BUDGET, HISTORY_SUMMARY_TOKENS
+from src.core.prompts import HISTORY_SUMMARY_PROMPT
+from src.services.api_scheduler import Priority
+from src.services.metrics import metrics
+from src.services.request_scheduler import user_scheduler
+from src.services.yandex_gpt import YandexGPTService
+
+logger = logging.getLogger(__name__)
+
+# Средняя длина токена YandexGPT на русском тексте, в символах (оценка без вызова API токенизации)
+CHARS_PER_TOKEN = 3.5
+# Сколько последних сообщений (обмен "вопрос — ответ") хранится дословно
+VERBATIM_MESSAGES = 2
+
+HISTORY_TOKENS = metrics.histogram(
+    "methodist_history_prompt_tokens", "Оценка токенов истории диалога в промпте", ["key"],
+    buckets=(100, 250, 500, 1000, 1500, 2000, 3000, 5000)
+)
+HISTORY_COMPACTIONS = metrics.counter(
+    "methodist_history_compactions_total", "Сворачивания старых реплик в резюме", ["outcome"]
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    limit = int(tokens * CHARS_PER_TOKEN)
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+class HistoryManager:
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET, summary_tokens: int = HISTORY_SUMMARY_TOKENS):
+        """
+        История диалога в FSM с бюджетом в токенах, а не в репликах.
+
+        В FSM хранятся резюме старых реплик (ключ <key>_summary) и реплики, еще не вошедшие в резюме (<key>).
+        После каждого ответа старые реплики в фоне сворачиваются в резюме, дословно остается только
+        последний обмен — размер промпта ограничен, сколько бы ни длился диалог.
+        """
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.gpt = YandexGPTService()
+        self._compacting: set[tuple[int, str]] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    async def load(self, state: FSMContext, key: str = "history") -> tuple[str, list[dict]]:
+        """
+        Резюме и дословные реплики для промпта в пределах бюджета.
+        Реплики берутся с конца; последний обмен попадает всегда, при необходимости укороченным.
+        """
+        data = await state.get_data()
+        summary = truncate_to_tokens(data.get(f"{key}_summary", ""), self.summary_tokens)
+        budget = max(self.token_budget - estimate_tokens(summary), 0)
+
+        messages = []
+        for i, message in enumerate(reversed(data.get(key, []))):
+            tokens = estimate_tokens(message["text"])
+            if tokens > budget:
+                if i >= VERBATIM_MESSAGES:
+                    break
+                # Длинный ответ укорачиваем так, чтобы осталось место и для вопроса
+                message = {**message, "text": truncate_to_tokens(message["text"], budget // (VERBATIM_MESSAGES - i))}
+                tokens = estimate_tokens(message["text"])
+            messages.append(message)
+            budget -= tokens
+        messages.reverse()
+
+        HISTORY_TOKENS.observe(self.token_budget - budget, key=key)
+        return summary, messages
+
+    async def append(self, state: FSMContext, user_id: int, user_text: str, ai_text: str, key: str = "history",
+                     **extra):
+        """
+        Добавляет обмен репликами (и дополнительные поля FSM) и запускает сворачивание старых реплик в фоне,
+        чтобы не задерживать ответ пользователю.
+        """
+        async with user_scheduler.history_lock(user_id):
+            history = (await state.get_data()).get(key, [])
+            history = history + [{"role": "user", "text": user_text}, {"role": "assistant", "text": ai_text}]
+            await state.update_data({key: history, **extra})
+
+        if len(history) > VERBATIM_MESSAGES and (user_id, key) not in self._compacting:
+            # Отмечаем до create_task: иначе второй append до старта задачи запустит еще одно сворачивание
+            self._compacting.add((user_id, key))
+            task = asyncio.create_task(self._compact(state, user_id, key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def close(self, timeout: float = 10.0):
+        """Дожидается фоновых сворачиваний истории (при остановке — до закрытия HTTP-пула)."""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+    async def reset(self, state: FSMContext, key: str = "history"):
+        await state.update_data({key: [], f"{key}_summary": ""})
+
+    async def _compact(self, state: FSMContext, user_id: int, key: str):
+        try:
+            data = await state.get_data()
+            older = data.get(key, [])[:-VERBATIM_MESSAGES]
+            if not older:
+                return
+            summary = data.get(f"{key}_summary", "")
+            dialog = "\n".join(
+                f"{'Пользователь' if m['role'] == 'user' else 'Методист'}: "
+                f"{truncate_to_tokens(m['text'], self.token_budget)}"
+                for m in older
+            )
+            # Резюме ограничено в словах: в среднем ~7 символов на слово
+            max_words = int(self.summary_tokens * CHARS_PER_TOKEN / 7)
+            res = await self.gpt.generate_response(
+                HISTORY_SUMMARY_PROMPT.format(max_words=max_words), f"Новые реплики:\n{dialog}",
+                context_text=f"Текущее резюме:\n{summary or '(пусто)'}", route="cleanup", priority=Priority.BATCH
+            )
+
+            async with user_scheduler.history_lock(user_id):
+                current = (await state.get_data()).get(key, [])
+                if current[:len(older)] != older:
+                    # История успела смениться (сброс, смена жанра) — резюме уже неактуально
+                    return
+                if res.get("error"):
+                    # Резюме не обновилось: не даем дословной истории расти бесконечно
+                    HISTORY_COMPACTIONS.inc(outcome="error")
+                    await state.update_data({key: current[-3 * VERBATIM_MESSAGES:]})
+                    return
+                HISTORY_COMPACTIONS.inc(outcome="ok")
+                await state.update_data({
+                    key: current[len(older):],
+                    f"{key}_summary": truncate_to_tokens(res.get("text", summary), self.summary_tokens),
+                })
+        except Exception as e:
+            HISTORY_COMPACTIONS.inc(outcome="error")
+            logger.error(f"Ошибка сжатия истории пользователя {user_id}: {e}")
+        finally:
+            self._compacting.discard((user_id, key))
+
+
+history_manager = HistoryManager()
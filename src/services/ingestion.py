@@ -0,0 +1,277 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import yaml
+
+from src.config import DATA_DIR, PDF_DIR, MARKDOWN_DIR, DOCUMENT_INDEX_WORKERS
+from src.services.rag_engine import RagEngine
+from src.utils.document_text import SUPPORTED_EXTENSIONS, PdfReader, ExtractedDocument, extract_document
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+_TRANSLIT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z", "и": "i",
+    "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t",
+    "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y", "ь": "",
+    "э": "e", "ю": "yu", "я": "ya",
+}
+_YEAR_RE = re.compile(r"\b(19[5-9]\d|20[0-4]\d)\b")
+
+
+def slugify(text: str, max_length: int = 60) -> str:
+    """«Методические рекомендации 2019» -> metodicheskie_rekomendatsii_2019"""
+    latin = "".join(_TRANSLIT.get(char, char) for char in text.lower())
+    slug = re.sub(r"[^a-z0-9]+", "_", latin).strip("_")
+    return slug[:max_length].rstrip("_") or "document"
+
+
+def _is_heading(line: str) -> bool:
+    letters = [char for char in line if char.isalpha()]
+    return (
+        3 <= len(line) <= 100 and len(letters) >= 3 and line[-1] not in ".,;:"
+        and sum(char.isupper() for char in letters) / len(letters) > 0.8
+    )
+
+
+def to_markdown(document: ExtractedDocument) -> str:
+    """
+    Текст документа в markdown: строки, набранные прописными, становятся заголовками «##»,
+    строки, разорванные версткой PDF, склеиваются в абзацы.
+    """
+    blocks: list[str] = []
+    paragraph: list[str] = []
+
+    def flush():
+        if paragraph:
+            blocks.append(" ".join(paragraph))
+            paragraph.clear()
+
+    for page in document.pages:
+        for line in page.splitlines():
+            line = line.strip()
+            if not line:
+                flush()
+            elif _is_heading(line):
+                flush()
+                blocks.append(f"## {line.capitalize()}")
+            else:
+                # Маркированный или нумерованный пункт начинает новый абзац
+                if re.match(r"^([-•–*]|\d+[.)])\s", line):
+                    flush()
+                paragraph.append(line)
+                if line[-1] in ".!?:;":
+                    flush()
+        flush()
+    return "\n\n".join(blocks)
+
+
+def convert_file(source: str, target: str, slug: str) -> dict:
+    """
+    Конвертирует PDF/DOCX в markdown с front matter, который читает RagEngine.
+    Выполняется в дочернем процессе: принимает пути строками и сам пишет результат на диск.
+    """
+    source_path = Path(source)
+    document = extract_document(source_path)
+    year_match = _YEAR_RE.search(f"{document.title}\n{document.pages[0] if document.pages else ''}")
+    front_matter = {
+        "title": document.title,
+        "slug": slug,
+        "file_name": source_path.name,
+        "biblio_ref": "",
+        "year": int(year_match.group(1)) if year_match else "",
+        "type": "Документ",
+        "tags": [],
+    }
+    header = yaml.safe_dump(front_matter, allow_unicode=True, sort_keys=False, width=10_000)
+    Path(target).write_text(f"---\n{header}---\n\n{to_markdown(document)}\n", encoding="utf-8")
+    return {"title": document.title, "pages": len(document.pages)}
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class IngestResult:
+    converted: list[str] = field(default_factory=list)  # имена .md, созданных или обновленных
+    removed: list[str] = field(default_factory=list)  # имена .md, удаленных вместе с исходником
+    skipped: int = 0
+    failed: list[str] = field(default_factory=list)  # исходные файлы с ошибкой конвертации
+
+
+class KnowledgeIngestor:
+    def __init__(self, source_dir: Path = PDF_DIR, markdown_dir: Path = MARKDOWN_DIR,
+                 manifest_path: Path = DATA_DIR / "ingest_manifest.json", workers: int = DOCUMENT_INDEX_WORKERS):
+        """
+        Пополнение базы знаний: PDF и DOCX из data/pdf конвертируются в markdown с front matter
+        (title, slug, file_name...), который читает RagEngine.
+
+        Манифест хранит хэш содержимого каждого исходника, поэтому неизмененные файлы пропускаются.
+        Конвертация идет параллельно в пуле процессов. Исходники, для которых markdown уже подготовлен
+        вручную (совпадает file_name или slug), не трогаются.
+        """
+        self.source_dir = source_dir
+        self.markdown_dir = markdown_dir
+        self.manifest_path = manifest_path
+        self.workers = workers
+
+    def _load_manifest(self) -> dict[str, dict]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                return data.get("files", {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка чтения манифеста конвертации: {e}")
+        return {}
+
+    def _save_manifest(self, files: dict[str, dict]):
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": files}, f, ensure_ascii=False, indent=1)
+        tmp_path.replace(self.manifest_path)
+
+    def _manual_sources(self, generated: set[str]) -> tuple[set[str], set[str]]:
+        """file_name и slug из markdown, подготовленных вручную (не этим конвертером)."""
+        file_names, slugs = set(), set()
+        for md_file in self.markdown_dir.glob("*.md"):
+            if md_file.name in generated:
+                continue
+            doc = RagEngine._read_document(md_file)
+            if doc:
+                file_names.add(str(doc.metadata.get("file_name") or ""))
+                slugs.add(str(doc.metadata.get("slug") or ""))
+        return file_names, slugs
+
+    def _sources(self) -> list[Path]:
+        if not self.source_dir.exists():
+            return []
+        return [
+            path for path in sorted(self.source_dir.iterdir())
+            if path.is_file() and path.suffix.lower() in SUPPORTED_EXTENSIONS
+        ]
+
+    def run(self, force: bool = False) -> IngestResult:
+        """
+        Конвертирует новые и измененные исходники. Блокирующий вызов: из event loop — через asyncio.to_thread.
+
+        :param force: Переконвертировать все исходники, даже если их содержимое не менялось.
+        """
+        started = time.perf_counter()
+        result = IngestResult()
+        manifest = self._load_manifest()
+        manual_names, manual_slugs = self._manual_sources({entry["markdown"] for entry in manifest.values()})
+        used_slugs = set(manual_slugs) | {entry["slug"] for entry in manifest.values()}
+
+        pending: dict[str, dict] = {}
+        sources = self._sources()
+        for path in sources:
+            if path.name not in manifest and (path.name in manual_names or path.stem in manual_slugs):
+                continue
+            if PdfReader is None and path.suffix.lower() == ".pdf":
+                logger.warning(f"pypdf не установлен, {path.name} пропущен")
+                continue
+            stat = path.stat()
+            entry = manifest.get(path.name)
+            markdown_exists = entry is not None and (self.markdown_dir / entry["markdown"]).exists()
+            unchanged = (entry or {}).get("mtime_ns") == stat.st_mtime_ns and (entry or {}).get("size") == stat.st_size
+            if markdown_exists and not force and unchanged:
+                result.skipped += 1
+                continue
+
+            content_hash = _file_hash(path)
+            if markdown_exists and not force and entry.get("sha256") == content_hash:
+                # Файл перезаписан тем же содержимым — обновляем только mtime в манифесте
+                entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                result.skipped += 1
+                continue
+
+            if entry:
+                slug = entry["slug"]
+            else:
+                base = slug = slugify(path.stem)
+                suffix = 2
+                while slug in used_slugs:
+                    slug, suffix = f"{base}_{suffix}", suffix + 1
+                used_slugs.add(slug)
+            pending[path.name] = {
+                "slug": slug, "markdown": f"{slug}.md", "sha256": content_hash,
+                "mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+            }
+
+        if pending:
+            names = list(pending)
+            args = [
+                (str(self.source_dir / name), str(self.markdown_dir / pending[name]["markdown"]), pending[name]["slug"])
+                for name in names
+            ]
+            if self.workers > 1 and len(args) > 1:
+                with ProcessPoolExecutor(max_workers=min(self.workers, len(args))) as pool:
+                    outcomes = list(pool.map(_safe_convert_file, *zip(*args)))
+            else:
+                outcomes = [_safe_convert_file(*item) for item in args]
+
+            for name, outcome in zip(names, outcomes):
+                if outcome is None:
+                    result.failed.append(name)
+                    continue
+                manifest[name] = {**pending[name], "title": outcome["title"]}
+                result.converted.append(pending[name]["markdown"])
+
+        # Исходник удален — удаляем и сгенерированный из него markdown
+        present = {path.name for path in sources}
+        for name in [name for name in manifest if name not in present]:
+            markdown = manifest.pop(name)["markdown"]
+            (self.markdown_dir / markdown).unlink(missing_ok=True)
+            result.removed.append(markdown)
+
+        self._save_manifest(manifest)
+        logger.info(
+            f"Конвертация базы знаний: {len(result.converted)} сконвертировано, {result.skipped} без изменений, "
+            f"{len(result.removed)} удалено, {len(result.failed)} с ошибкой за {time.perf_counter() - started:.2f} с"
+        )
+        return result
+
+    async def ingest(self, rag: RagEngine, force: bool = False) -> IngestResult:
+        """Конвертация в отдельном потоке и инкрементальное обновление поиска по базе знаний."""
+        result = await asyncio.to_thread(self.run, force)
+        if result.converted or result.removed:
+            rag.update_documents(result.converted, result.removed)
+        return result
+
+
+def _safe_convert_file(source: str, target: str, slug: str) -> dict | None:
+    try:
+        return convert_file(source, target, slug)
+    except Exception as e:
+        logger.error(f"Не удалось сконвертировать {Path(source).name}: {e}")
+        return None
+
+
+knowledge_ingestor = KnowledgeIngestor()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Конвертация PDF/DOCX из data/pdf в markdown базы знаний")
+    parser.add_argument("--force", action="store_true", help="Переконвертировать все файлы")
+    parser.add_argument("--workers", type=int, default=DOCUMENT_INDEX_WORKERS, help="Процессов конвертации")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    knowledge_ingestor.workers = args.workers
+    knowledge_ingestor.run(force=args.force)
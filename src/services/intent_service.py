@@ -0,0 +1,132 @@
+import logging
+import random
+import re
+import time
+from datetime import datetime
+from html import escape
+from typing import Callable, Iterable, Optional
+
+from src.config import INTENT_REFRESH_SECONDS
+from src.core.prompts import SMALL_TALK_TRIGGERS, SMALL_TALK_ANSWERS, SMALL_TALK_FILLERS, STARTUP_SUGGESTIONS
+from src.services.metrics import metrics
+from src.utils.aho_corasick import AhoCorasick
+
+logger = logging.getLogger(__name__)
+
+INTENT_ANSWERS = metrics.counter(
+    "methodist_intent_answers_total", "Ответы на small talk без обращения к модели", ["intent"]
+)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _time_greeting(hour: int) -> str:
+    if 5 <= hour < 12:
+        return "Доброе утро"
+    if 12 <= hour < 18:
+        return "Добрый день"
+    if 18 <= hour < 23:
+        return "Добрый вечер"
+    return "Здравствуйте"
+
+
+class IntentEngine:
+    def __init__(
+            self,
+            triggers: dict[str, list[str]] = SMALL_TALK_TRIGGERS,
+            answers: dict[str, list[str]] = SMALL_TALK_ANSWERS,
+            fillers: Iterable[str] = SMALL_TALK_FILLERS,
+            topics_provider: Optional[Callable[[], Iterable[str]]] = None,
+            refresh_interval: float = INTENT_REFRESH_SECONDS,
+            max_words: int = 6,
+            max_topics: int = 5
+    ):
+        """
+        Распознавание small talk (приветствие, «кто ты», «что умеешь», благодарность) и готовые ответы на него.
+
+        Все триггеры скомпилированы в один автомат Ахо — Корасик, поэтому сообщение просматривается
+        за один проход независимо от числа триггеров. Ответы рендерятся заранее и перерисовываются
+        раз в refresh_interval секунд (приветствие по времени суток, актуальный список тем),
+        так что на чистый small talk бот отвечает мгновенно, без запроса к YandexGPT.
+
+        :param fillers: Слова, допустимые в чистом small talk помимо триггеров («спасибо большое»).
+        :param topics_provider: Возвращает названия тем базы знаний для ответа «что умеешь».
+        :param max_words: Сообщения длиннее считаются вопросом, а не small talk.
+        """
+        self.priority = {intent: rank for rank, intent in enumerate(triggers)}
+        self.automaton = AhoCorasick(
+            (trigger, intent) for intent, items in triggers.items() for trigger in items
+        )
+        self.answers = answers
+        self.fillers = frozenset(fillers)
+        self.topics_provider = topics_provider
+        self.refresh_interval = refresh_interval
+        self.max_words = max_words
+        self.max_topics = max_topics
+
+        self._rendered: dict[str, list[str]] = {}
+        self._rendered_at = 0.0
+
+    def _scan(self, text: str) -> tuple[Optional[str], int]:
+        """
+        Находит намерение с наивысшим приоритетом и считает слова, не покрытые триггерами и не входящие в fillers.
+        Триггер засчитывается только с начала слова («хай», но не «архайский»);
+        слово, начинающееся с триггера, покрывается целиком («здравствуй» -> «здравствуйте»).
+        """
+        words = [(match.start(), match.end()) for match in _WORD_RE.finditer(text)]
+        if not words or len(words) >= self.max_words:
+            return None, len(words)
+
+        best: Optional[str] = None
+        covered: set[int] = set()
+        for match in self.automaton.iter(text):
+            if match.start and text[match.start - 1].isalnum():
+                continue
+            if best is None or self.priority[match.value] < self.priority[best]:
+                best = match.value
+            # Слова, начало которых попало внутрь триггера, считаются частью фразы-триггера
+            covered.update(index for index, (start, _) in enumerate(words) if match.start <= start < match.end)
+        rest = sum(1 for index, (start, end) in enumerate(words)
+                   if index not in covered and text[start:end] not in self.fillers)
+        return best, rest
+
+    def match(self, text: str) -> Optional[str]:
+        """Намерение small talk в коротком сообщении или None."""
+        intent, _ = self._scan(text.lower())
+        return intent
+
+    def _render(self):
+        topics = []
+        if self.topics_provider:
+            try:
+                topics = [title for title in self.topics_provider() if title][:self.max_topics]
+            except Exception as e:
+                logger.error(f"Intent topics error: {e}")
+        topics_text = "\n".join(f"• {escape(str(title))}" for title in topics) or "• методическая работа библиотек"
+        greeting = _time_greeting(datetime.now().hour)
+        self._rendered = {
+            intent: [variant.replace("{greeting}", greeting).replace("{topics}", topics_text) for variant in variants]
+            for intent, variants in self.answers.items()
+        }
+        self._rendered_at = time.monotonic()
+
+    def refresh(self):
+        """Принудительно перерисовывает готовые ответы (например, после перезагрузки базы знаний)."""
+        self._render()
+
+    def answer(self, text: str, full_name: str) -> Optional[tuple[str, str, list[str]]]:
+        """
+        Готовый ответ, если сообщение целиком состоит из триггеров small talk и слов-заполнителей
+        («Привет!», «Спасибо большое», «А что ты умеешь?»). Любое другое слово делает сообщение запросом
+        («Привет, как оформить методичку?», «Помощь с отчетом») — возвращает None, его обрабатывает модель.
+
+        :return: (намерение, текст ответа, подсказки) или None.
+        """
+        intent, rest_words = self._scan(text.lower())
+        if intent is None or rest_words or intent not in self.answers:
+            return None
+        if time.monotonic() - self._rendered_at >= self.refresh_interval:
+            self._render()
+        variant = random.choice(self._rendered[intent])
+        INTENT_ANSWERS.inc(intent=intent)
+        return intent, variant.replace("{name}", escape(full_name)), list(STARTUP_SUGGESTIONS)
@@ -0,0 +1,216 @@
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм по умолчанию, в секундах: от быстрых локальных операций до долгих вызовов VLM
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """
+    Текущее значение. Может вычисляться в момент выгрузки через set_function,
+    чтобы не тратить время на обновление в горячем пути.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+        self._function: Optional[Callable[[], dict[tuple, float] | float]] = None
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], dict[tuple, float] | float]):
+        """
+        :param function: Возвращает число (метрика без меток) или словарь {кортеж значений меток: число}.
+        """
+        self._function = function
+
+    def render(self) -> list[str]:
+        values = self._values
+        if self._function is not None:
+            try:
+                result = self._function()
+                values = result if isinstance(result, dict) else {(): result}
+            except Exception as e:
+                logger.error(f"Ошибка вычисления метрики {self.name}: {e}")
+                values = {}
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    """Распределение значений (задержек) по корзинам."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Для каждой комбинации меток: [счетчики корзин..., +Inf], сумма
+        self._counts: dict[tuple, list[int]] = {}
+        self._sums: dict[tuple, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Замеряет длительность блока with (в том числе с await внутри)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = []
+        bounds = [f'le="{bound}"' for bound in self.buckets] + ['le="+Inf"']
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, bound)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {self._sums[key]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """Реестр метрик процесса с выгрузкой в текстовом формате Prometheus."""
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# --- Общие метрики бота ---
+STAGE_SECONDS = metrics.histogram(
+    "methodist_stage_seconds", "Длительность этапов подготовки ответа", ["stage"]
+)
+HANDLER_UPDATES = metrics.counter(
+    "methodist_handler_calls_total", "Вызовы хендлеров", ["handler", "outcome"]
+)
+HANDLER_SECONDS = metrics.histogram(
+    "methodist_handler_seconds", "Длительность работы хендлеров", ["handler"]
+)
+UPSTREAM_RESPONSES = metrics.counter(
+    "methodist_upstream_responses_total", "Ответы внешних API по кодам", ["api", "status"]
+)
+UPSTREAM_SECONDS = metrics.histogram(
+    "methodist_upstream_seconds", "Длительность запросов к внешним API", ["api"]
+)
+FSM_SESSIONS = metrics.gauge(
+    "methodist_fsm_sessions", "Активные FSM-сессии пользователей"
+)
+INFLIGHT_UPDATES = metrics.gauge(
+    "methodist_inflight_updates", "Обрабатываемые в данный момент апдейты"
+)
+QUEUE_DEPTH = metrics.gauge(
+    "methodist_api_queue_depth", "Запросы в очереди к внешнему API", ["api"]
+)
+API_ACTIVE = metrics.gauge(
+    "methodist_api_active_requests", "Выполняющиеся запросы к внешнему API", ["api"]
+)
+BREAKER_STATE = metrics.gauge(
+    "methodist_circuit_breaker_state", "Состояние предохранителя API (0 — замкнут, 1 — полуоткрыт, 2 — разомкнут)",
+    ["api"]
+)
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Поднимает локальный HTTP-эндпоинт /metrics для Prometheus."""
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
@@ -1,7 +1,9 @@
-import base64
 import logging
-import requests
+from typing import Optional
 from src.config import YANDEX_API_KEY, YANDEX_FOLDER_ID
+from src.services.api_scheduler import api_scheduler, Priority, QueueCallback
+from src.services.circuit_breaker import CircuitOpenError
+from src.utils.json_tools import Base64JsonBody, BytesLike
 
 logger = logging.getLogger(__name__)
 
@@ -16,25 +18,28 @@ class YandexOCRService:
         self.api_key = YANDEX_API_KEY
         self.folder_id = YANDEX_FOLDER_ID
         self.headers = {
-            "Authorization": f"Api-Key {self.api_key}",
-            "Content-Type": "application/json"
+            "Authorization": f"Api-Key {self.api_key}"
         }
 
-    def recognize_text(self, image_bytes: bytes) -> str:
+    async def recognize_text(
+            self,
+            image_bytes: BytesLike,
+            priority: Priority = Priority.BATCH,
+            on_queued: Optional[QueueCallback] = None
+    ) -> str:
         """
         Отправляет изображение в облачный сервис Yandex Vision и возвращает распознанный текст.
 
-        :param image_bytes: Бинарные данные изображения.
+        :param image_bytes: Бинарные данные изображения (bytes или memoryview, например BytesIO.getbuffer()).
+        :param on_queued: Уведомление о позиции в очереди при пиковой нагрузке.
         :return: Строка с распознанным текстом или пустая строка в случае ошибки.
         """
-        # Кодирование изображения в формат Base64, требуемый API
-        encoded_image = base64.b64encode(image_bytes).decode("utf-8")
-
-        # Формирование полезной нагрузки запроса согласно документации Yandex Cloud
+        # Формирование полезной нагрузки запроса согласно документации Yandex Cloud.
+        # Изображение кодируется в Base64 по частям прямо при отправке тела запроса
         payload = {
             "folderId": self.folder_id,
             "analyze_specs": [{
-                "content": encoded_image,
+                "content": Base64JsonBody.PLACEHOLDER,
                 "features": [{
                     "type": "TEXT_DETECTION",
                     "text_detection_config": {
@@ -44,8 +49,12 @@ class YandexOCRService:
             }]
         }
 
+        body = Base64JsonBody(payload, image_bytes)
         try:
-            response = requests.post(self.api_url, headers=self.headers, json=payload, timeout=30)
+            response = await api_scheduler.request(
+                "vision", "POST", self.api_url, headers={**self.headers, **body.headers}, content=body,
+                timeout=30.0, priority=priority, on_queued=on_queued
+            )
 
             if response.status_code != 200:
                 logger.error(f"Ошибка Yandex Vision API: {response.status_code} - {response.text}")
@@ -78,8 +87,13 @@ class YandexOCRService:
                 logger.error(f"Ошибка при парсинге JSON ответа Vision: {e}")
                 return ""
 
+        except CircuitOpenError:
+            logger.warning("Yandex Vision временно отключен предохранителем.")
+            return ""
         except Exception as e:
             logger.error(f"Критическая ошибка в YandexOCRService: {e}")
             return ""
+        finally:
+            body.release()
 
-        return ""
\ No newline at end of file
+        return ""
@@ -16,61 +16,93 @@ class Document:
 
 
 class RagEngine:
-    def __init__(self):
+    def __init__(self, markdown_dir: Path = MARKDOWN_DIR):
+        self.markdown_dir = markdown_dir
         self.documents = []
         self.slug_map = {}  # Словарь: "slug" -> "real_filename.pdf"
         self.load_documents()
 
     def load_documents(self):
         """Загружает MD файлы и строит карту слагов."""
-        if not MARKDOWN_DIR.exists():
-            logger.warning(f"Папка {MARKDOWN_DIR} не найдена!")
+        if not self.markdown_dir.exists():
+            logger.warning(f"Папка {self.markdown_dir} не найдена!")
             return
 
         count = 0
         self.documents = []
         self.slug_map = {}  # Очищаем перед загрузкой
 
-        for md_file in MARKDOWN_DIR.glob("*.md"):
-            try:
-                with open(md_file, "r", encoding="utf-8", errors='ignore') as f:
-                    content = f.read()
-
-                metadata = {}
-                body_content = content
-
-                # Разделяем по ---
-                parts = list(filter(None, content.split('---')))
-
-                if len(parts) >= 2:
-                    yaml_text = parts[0].strip()
-                    body_content = "---".join(parts[1:]).strip()
-
-                    try:
-                        metadata = yaml.safe_load(yaml_text)
-                        if not isinstance(metadata, dict): metadata = {}
-                    except Exception as e:
-                        logger.error(f"YAML Error в {md_file.name}: {e}")
-                        metadata = {}
-
-                # --- НОВОЕ: Сохраняем связь Slug -> Filename ---
-                slug = metadata.get('slug')
-                pdf_file = metadata.get('file_name')
-
-                if slug and pdf_file:
-                    self.slug_map[slug] = pdf_file
-                # -----------------------------------------------
-
-                doc = Document(content=body_content, metadata=metadata, filename=md_file.name)
-                self.documents.append(doc)
+        for md_file in self.markdown_dir.glob("*.md"):
+            doc = self._read_document(md_file)
+            if doc:
+                self._add(doc)
                 count += 1
 
-            except Exception as e:
-                logger.error(f"Ошибка чтения {md_file}: {e}")
-
         logger.info(f"Загружено {count} документов. Карта слагов: {len(self.slug_map)} записей.")
 
-    def search(self, query: str) -> tuple[str, dict]:
+    @staticmethod
+    def _read_document(md_file: Path) -> Document | None:
+        try:
+            with open(md_file, "r", encoding="utf-8", errors='ignore') as f:
+                content = f.read()
+
+            metadata = {}
+            body_content = content
+
+            # Разделяем по ---
+            parts = list(filter(None, content.split('---')))
+
+            if len(parts) >= 2:
+                yaml_text = parts[0].strip()
+                body_content = "---".join(parts[1:]).strip()
+
+                try:
+                    metadata = yaml.safe_load(yaml_text)
+                    if not isinstance(metadata, dict): metadata = {}
+                except Exception as e:
+                    logger.error(f"YAML Error в {md_file.name}: {e}")
+                    metadata = {}
+
+            return Document(content=body_content, metadata=metadata, filename=md_file.name)
+
+        except Exception as e:
+            logger.error(f"Ошибка чтения {md_file}: {e}")
+            return None
+
+    def _add(self, doc: Document):
+        self.documents.append(doc)
+        # Сохраняем связь Slug -> Filename
+        slug = doc.metadata.get('slug')
+        pdf_file = doc.metadata.get('file_name')
+        if slug and pdf_file:
+            self.slug_map[slug] = pdf_file
+
+    def update_documents(self, changed: list[str], removed: list[str] = ()) -> int:
+        """
+        Инкрементальное обновление без перечитывания всей папки: документы из changed
+        (имена .md в markdown_dir) загружаются заново, из removed — удаляются.
+        Список документов подменяется целиком, поэтому идущий параллельно поиск его не видит недостроенным.
+        """
+        dropped = set(changed) | set(removed)
+        documents = [doc for doc in self.documents if doc.filename not in dropped]
+        for filename in changed:
+            doc = self._read_document(self.markdown_dir / filename)
+            if doc:
+                documents.append(doc)
+        slug_map = {
+            doc.metadata["slug"]: doc.metadata["file_name"] for doc in documents
+            if doc.metadata.get("slug") and doc.metadata.get("file_name")
+        }
+        self.documents, self.slug_map = documents, slug_map
+        logger.info(f"База знаний обновлена: {len(changed)} изменено, {len(removed)} удалено, "
+                    f"всего {len(documents)} документов.")
+        return len(documents)
+
+    def rank(self, query: str, limit: int = 5) -> list[tuple[int, Document]]:
+        """
+        Документы, отсортированные по убыванию релевантности запросу (только с ненулевым счетом).
+        При равном счете порядок загрузки сохраняется.
+        """
         # Тюнинг запроса (синонимы)
         query_normalized = query.lower()
         replacements = {
@@ -84,8 +116,7 @@ class RagEngine:
             query_normalized = query_normalized.replace(slang, official)
 
         query_words = set(query_normalized.split())
-        best_doc = None
-        max_score = 0
+        scored = []
 
         for doc in self.documents:
             score = 0
@@ -98,11 +129,16 @@ class RagEngine:
                 count = text_lower.count(word)
                 score += min(count, 5)
 
-            if score > max_score:
-                max_score = score
-                best_doc = doc
+            if score > 0:
+                scored.append((score, doc))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:limit]
 
-        if best_doc and max_score > 0:
+    def search(self, query: str) -> tuple[str, dict]:
+        ranked = self.rank(query, limit=1)
+        if ranked:
+            max_score, best_doc = ranked[0]
             logger.info(f"Найден документ: {best_doc.metadata.get('title', 'Без названия')} (Score: {max_score})")
             return best_doc.content[:3000], best_doc.metadata
 
@@ -110,4 +146,7 @@ class RagEngine:
 
     def get_filename_by_slug(self, slug: str) -> str | None:
         """Возвращает имя файла PDF по слагу."""
-        return self.slug_map.get(slug)
\ No newline at end of file
+        return self.slug_map.get(slug)
+
+
+rag_service = RagEngine()
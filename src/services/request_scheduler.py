@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class RequestSuperseded(Exception):
+    """Запрос пользователя устарел: пришел более новый, и ответ на этот уже не нужен."""
+
+
+class UserRequestScheduler:
+    def __init__(self):
+        """
+        Планировщик запросов к нейросети в разрезе пользователя.
+
+        - Новый запрос отменяет незавершенную генерацию с другим ключом (старый ответ пользователь не прочтет).
+        - Одинаковые параллельные запросы (повторные нажатия кнопки) сливаются в один вызов API.
+        - Обновления истории диалога выполняются строго последовательно.
+        """
+        self._tickets: dict[int, int] = {}
+        self._inflight: dict[int, tuple[Hashable, asyncio.Task]] = {}
+        self._locks: dict[int, asyncio.Lock] = {}
+
+    def history_lock(self, user_id: int) -> asyncio.Lock:
+        """Блокировка для последовательной записи истории пользователя в FSM."""
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    async def run(self, user_id: int, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Выполняет генерацию для пользователя с учетом более новых запросов.
+
+        :param key: Ключ запроса. Запросы с одинаковым ключом объединяются.
+        :param factory: Функция, создающая корутину генерации.
+        :raises RequestSuperseded: если за время ожидания пришел более новый запрос.
+        """
+        ticket = self._tickets.get(user_id, 0) + 1
+        self._tickets[user_id] = ticket
+
+        current = self._inflight.get(user_id)
+        if current and current[0] == key and not current[1].done():
+            task = current[1]
+            logger.info(f"Запрос пользователя {user_id} объединен с уже выполняющимся.")
+        else:
+            if current and not current[1].done():
+                current[1].cancel()
+                logger.info(f"Устаревшая генерация пользователя {user_id} отменена.")
+            task = asyncio.create_task(factory())
+            self._inflight[user_id] = (key, task)
+            task.add_done_callback(lambda t: self._forget(user_id, t))
+
+        # asyncio.wait не отменяет общую задачу, если отменят только этот обработчик
+        await asyncio.wait({task})
+
+        if task.cancelled() or self._tickets.get(user_id) != ticket:
+            raise RequestSuperseded()
+        return task.result()
+
+    def _forget(self, user_id: int, task: asyncio.Task):
+        current = self._inflight.get(user_id)
+        if current and current[1] is task:
+            del self._inflight[user_id]
+        # Помечаем исключение как полученное, даже если все ожидающие уже ушли
+        if not task.cancelled() and task.exception():
+            logger.error(f"Ошибка генерации для пользователя {user_id}: {task.exception()}")
+
+
+user_scheduler = UserRequestScheduler()
@@ -1,7 +1,7 @@
-import httpx
 import logging
 from typing import Optional
 from src.config import YANDEX_API_KEY, YANDEX_FOLDER_ID
+from src.services.api_scheduler import api_scheduler, Priority
 
 logger = logging.getLogger(__name__)
 
@@ -29,26 +29,27 @@ class YandexSpeechKitService:
             "format": "oggopus"  # Telegram по умолчанию использует OGG OPUS
         }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    self.stt_url,
-                    headers=headers,
-                    params=params,
-                    content=audio_bytes,  # Отправляем байты напрямую
-                    timeout=30.0
-                )
+        try:
+            response = await api_scheduler.request(
+                "stt", "POST",
+                self.stt_url,
+                headers=headers,
+                params=params,
+                content=audio_bytes,  # Отправляем байты напрямую
+                timeout=30.0,
+                priority=Priority.INTERACTIVE
+            )
 
-                if response.status_code != 200:
-                    logger.error(f"STT v1 Error {response.status_code}: {response.text}")
-                    return None
+            if response.status_code != 200:
+                logger.error(f"STT v1 Error {response.status_code}: {response.text}")
+                return None
 
-                # Ответ v1 прост: {"result": "Текст"}
-                return response.json().get("result")
+            # Ответ v1 прост: {"result": "Текст"}
+            return response.json().get("result")
 
-            except Exception as e:
-                logger.error(f"STT Critical Error: {e}")
-                return None
+        except Exception as e:
+            logger.error(f"STT Critical Error: {e}")
+            return None
 
     async def text_to_speech(self, text: str) -> Optional[bytes]:
         """Синтезирует речь (API v1)."""
@@ -60,11 +61,13 @@ class YandexSpeechKitService:
             "emotion": "good"
         }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(self.tts_url, headers=headers, data=data, timeout=60.0)
-                if response.status_code != 200:
-                    return None
-                return response.content
-            except Exception:
-                return None
\ No newline at end of file
+        try:
+            response = await api_scheduler.request(
+                "tts", "POST", self.tts_url, headers=headers, data=data, timeout=60.0,
+                priority=Priority.INTERACTIVE
+            )
+            if response.status_code != 200:
+                return None
+            return response.content
+        except Exception:
+            return None
\ No newline at end of file
@@ -0,0 +1,84 @@
+import logging
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Optional, Union
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+
+from src.services.database import db
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+FILE_CACHE = metrics.counter(
+    "methodist_telegram_file_cache_total", "Отправка документов: повтор по file_id или загрузка с диска", ["result"]
+)
+
+SendDocument = Callable[[Union[str, FSInputFile]], Awaitable[Message]]
+
+
+class TelegramFileCache:
+    def __init__(self):
+        """
+        Кэш file_id документов, которые бот отправляет с диска.
+
+        После первой загрузки Telegram возвращает file_id, по которому тот же файл можно
+        отправить повторно без чтения с диска и без загрузки. Ключ — (путь, mtime, размер):
+        если файл заменили, запись перестает совпадать и файл загружается заново.
+        Записи хранятся в SQLite и переживают перезапуск бота.
+        """
+        self._memory: dict[str, tuple[int, int, str]] = {}
+
+    @staticmethod
+    def _signature(path: Path) -> tuple[str, int, int]:
+        stat = path.stat()
+        return str(path.resolve()), stat.st_mtime_ns, stat.st_size
+
+    def get(self, path: Path) -> Optional[str]:
+        key, mtime_ns, size = self._signature(path)
+        cached = self._memory.get(key)
+        if cached and cached[:2] == (mtime_ns, size):
+            return cached[2]
+        file_id = db.get_telegram_file_id(key, mtime_ns, size)
+        if file_id:
+            self._memory[key] = (mtime_ns, size, file_id)
+        return file_id
+
+    def remember(self, path: Path, file_id: str):
+        key, mtime_ns, size = self._signature(path)
+        self._memory[key] = (mtime_ns, size, file_id)
+        db.set_telegram_file_id(key, mtime_ns, size, file_id, time.time())
+
+    def forget(self, path: Path):
+        key = str(path.resolve())
+        self._memory.pop(key, None)
+        db.delete_telegram_file_id(key)
+
+    async def send(self, path: Path, send: SendDocument) -> Message:
+        """
+        Отправляет документ через send(document): по file_id, если файл уже загружался,
+        иначе с диска — и запоминает полученный file_id.
+
+        :param send: Например, lambda document: message.reply_document(document, caption=...).
+        """
+        file_id = self.get(path)
+        if file_id:
+            try:
+                sent = await send(file_id)
+                FILE_CACHE.inc(result="hit")
+                return sent
+            except TelegramBadRequest as e:
+                # file_id устарел (например, бот пересоздан) — загружаем файл заново
+                logger.warning(f"file_id для {path.name} отклонен: {e}")
+                FILE_CACHE.inc(result="stale")
+                self.forget(path)
+
+        sent = await send(FSInputFile(path))
+        FILE_CACHE.inc(result="upload")
+        if sent.document:
+            self.remember(path, sent.document.file_id)
+        return sent
+
+
+telegram_file_cache = TelegramFileCache()
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from src.config import (
+    YANDEX_LITE_MODEL_URI,
+    USER_DAILY_TOKEN_BUDGET, DAILY_TOKEN_BUDGET, TOKEN_BUDGET_SOFT_LIMIT, TOKEN_PRICES
+)
+from src.core.tracing import user_id_var, handler_var
+from src.services.database import db
+from src.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+TOKENS_USED = metrics.counter(
+    "methodist_llm_tokens_total", "Израсходованные токены LLM", ["model", "direction"]
+)
+BUDGET_DEGRADED = metrics.counter(
+    "methodist_budget_degraded_total", "Запросы, выполненные в урезанном режиме из-за бюджета", ["level"]
+)
+
+
+@dataclass(frozen=True)
+class BudgetPolicy:
+    """Параметры запроса к модели в зависимости от оставшегося бюджета."""
+    level: str
+    model_uri: Optional[str]  # None — модель выбирает маршрут
+    max_context_chars: Optional[int]  # None — контекст не обрезается
+    history_messages: int
+    max_tokens: int
+
+
+NORMAL_POLICY = BudgetPolicy("normal", None, None, 6, 2000)
+# Бюджет почти исчерпан: дешевая модель и урезанный контекст
+ECONOMY_POLICY = BudgetPolicy("economy", YANDEX_LITE_MODEL_URI, 1500, 4, 1000)
+# Бюджет исчерпан: отвечаем, но минимально — пользователь не остается без ответа
+MINIMAL_POLICY = BudgetPolicy("minimal", YANDEX_LITE_MODEL_URI, 800, 2, 500)
+
+
+def model_name(model_uri: str) -> str:
+    """gpt://<folder>/yandexgpt-lite/latest -> yandexgpt-lite"""
+    parts = model_uri.split("/")
+    return parts[3] if len(parts) > 3 else model_uri
+
+
+def estimate_cost(model: str, tokens: int) -> float:
+    """Ориентировочная стоимость в рублях по TOKEN_PRICES."""
+    return tokens / 1000 * TOKEN_PRICES.get(model, 0.0)
+
+
+class TokenAccountant:
+    def __init__(
+            self,
+            user_budget: int = USER_DAILY_TOKEN_BUDGET,
+            daily_budget: int = DAILY_TOKEN_BUDGET,
+            soft_limit: float = TOKEN_BUDGET_SOFT_LIMIT,
+            batch_size: int = 50,
+            flush_interval: float = 10.0
+    ):
+        """
+        Учет расхода токенов YandexGPT и Gemma с суточными бюджетами.
+
+        Вызовы копятся в буфере и пишутся в SQLite пачками (executemany) — по заполнению
+        буфера или раз в flush_interval секунд. Суточные суммы держатся в памяти,
+        поэтому проверка бюджета перед запросом не обращается к базе.
+        """
+        self.user_budget = user_budget
+        self.daily_budget = daily_budget
+        self.soft_limit = soft_limit
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._buffer: list[tuple] = []
+        self._day: Optional[str] = None
+        self._user_totals: dict[int, int] = {}
+        self._total = 0
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _roll_day(self):
+        """При смене суток сбрасывает счетчики; при первом обращении — восстанавливает их из базы."""
+        today = date.today().isoformat()
+        if today == self._day:
+            return
+        if self._day is not None:
+            self.flush()
+        self._day = today
+        self._user_totals = db.get_token_usage_by_user(today)
+        self._total = sum(self._user_totals.values())
+
+    def record(self, model_uri: str, input_tokens: int, output_tokens: int, user_id: Optional[int] = None,
+               handler: Optional[str] = None):
+        """
+        Учитывает один вызов модели. Пользователь и хендлер по умолчанию берутся
+        из контекста текущего апдейта (их выставляют middleware трассировки и метрик).
+        """
+        self._roll_day()
+        user_id = user_id if user_id is not None else user_id_var.get()
+        handler = handler or handler_var.get()
+        model = model_name(model_uri)
+        spent = input_tokens + output_tokens
+
+        self._buffer.append((time.time(), self._day, user_id, handler, model, input_tokens, output_tokens))
+        if user_id is not None:
+            self._user_totals[user_id] = self._user_totals.get(user_id, 0) + spent
+        self._total += spent
+        TOKENS_USED.inc(input_tokens, model=model, direction="input")
+        TOKENS_USED.inc(output_tokens, model=model, direction="output")
+
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def policy_for(self, user_id: Optional[int] = None) -> BudgetPolicy:
+        """Режим запроса с учетом суточного расхода пользователя и бота в целом."""
+        self._roll_day()
+        user_id = user_id if user_id is not None else user_id_var.get()
+        usage = self._total / self.daily_budget if self.daily_budget else 0.0
+        if user_id is not None and self.user_budget:
+            usage = max(usage, self._user_totals.get(user_id, 0) / self.user_budget)
+
+        if usage >= 1.0:
+            policy = MINIMAL_POLICY
+        elif usage >= self.soft_limit:
+            policy = ECONOMY_POLICY
+        else:
+            return NORMAL_POLICY
+        BUDGET_DEGRADED.inc(level=policy.level)
+        return policy
+
+    def user_spent(self, user_id: int) -> int:
+        self._roll_day()
+        return self._user_totals.get(user_id, 0)
+
+    def flush(self):
+        """Записывает накопленные вызовы одной транзакцией."""
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        db.add_token_usage(rows)
+
+    def start(self):
+        """Запускает периодический сброс буфера (вызывается из работающего event loop)."""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    async def close(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        self.flush()
+
+    def report(self, day: Optional[str] = None, top: int = 10) -> dict:
+        """Сводка расхода за день: итоги, топ пользователей, разбивка по хендлерам и моделям."""
+        self.flush()
+        day = day or date.today().isoformat()
+
+        def aggregate(rows: list[tuple]) -> list[dict]:
+            grouped: dict = {}
+            for key, model, calls, tokens_in, tokens_out in rows:
+                item = grouped.setdefault(key, {"key": key, "calls": 0, "input": 0, "output": 0, "cost": 0.0})
+                item["calls"] += calls
+                item["input"] += tokens_in or 0
+                item["output"] += tokens_out or 0
+                item["cost"] += estimate_cost(model, (tokens_in or 0) + (tokens_out or 0))
+            return sorted(grouped.values(), key=lambda item: item["input"] + item["output"], reverse=True)
+
+        by_model = aggregate(db.get_token_report(day, "model"))
+        return {
+            "day": day,
+            "calls": sum(item["calls"] for item in by_model),
+            "input": sum(item["input"] for item in by_model),
+            "output": sum(item["output"] for item in by_model),
+            "cost": sum(item["cost"] for item in by_model),
+            "by_model": by_model,
+            "by_handler": aggregate(db.get_token_report(day, "handler")),
+            "top_users": aggregate(db.get_token_report(day, "user_id"))[:top],
+        }
+
+
+token_accountant = TokenAccountant()
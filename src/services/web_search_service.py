@@ -1,19 +1,93 @@
-import requests
+import asyncio
+import httpx
 import logging
-from src.config import YANDEX_API_KEY, YANDEX_FOLDER_ID
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+from src.config import YANDEX_API_KEY, YANDEX_FOLDER_ID, WEB_SEARCH_CACHE_TTL, WEB_SEARCH_CACHE_SIZE
+from src.services.api_scheduler import api_scheduler, Priority, QueueCallback
+from src.services.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+WEB_SEARCH_REQUESTS = metrics.counter(
+    "methodist_web_search_requests_total", "Запросы веб-поиска по источнику ответа", ["source"]
+)
+WEB_SEARCH_SAVED_SECONDS = metrics.counter(
+    "methodist_web_search_saved_seconds_total", "Время ожидания Search API, сэкономленное кэшем"
+)
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s-]+")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """«Сроки  аттестации педагогов?» и «сроки аттестации педагогов» — один ключ кэша."""
+    query = _PUNCTUATION_RE.sub(" ", query.lower().replace("ё", "е"))
+    return _SPACES_RE.sub(" ", query).strip()
+
+
 class YandexWebSearchService:
-    def __init__(self):
+    def __init__(self, cache_ttl: float = WEB_SEARCH_CACHE_TTL, cache_size: int = WEB_SEARCH_CACHE_SIZE):
+        """
+        Генеративный поиск Yandex Search API.
+
+        Запросы идут через api_scheduler (очередь "search" ограничивает число одновременных поисков и RPS).
+        Ответы кэшируются на cache_ttl секунд по нормализованному запросу, а одинаковые запросы,
+        пришедшие, пока поиск еще выполняется, ждут его результата вместо отдельного вызова API.
+        """
         self.api_key = YANDEX_API_KEY
         self.folder_id = YANDEX_FOLDER_ID
         self.url = "https://searchapi.api.cloud.yandex.net/v2/gen/search"
         self.headers = {
             "Authorization": f"Api-Key {self.api_key}",
         }
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        # Ключ -> (момент устаревания, ответ API, сколько длился поиск)
+        self._cache: OrderedDict[str, tuple[float, dict, float]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
 
-    def generate_web_response(self, query: str) -> dict | None:
+    async def generate_web_response(self, query: str, on_queued: Optional[QueueCallback] = None) -> dict | None:
+        """
+        Ответ генеративного поиска: из кэша, из уже выполняющегося такого же поиска или новым запросом.
+        Ошибки и пустые ответы не кэшируются.
+        """
+        key = normalize_query(query)
+        cached = self._cache.get(key)
+        if cached is not None:
+            expires_at, result, elapsed = cached
+            if expires_at > time.monotonic():
+                self._cache.move_to_end(key)
+                WEB_SEARCH_REQUESTS.inc(source="cache")
+                WEB_SEARCH_SAVED_SECONDS.inc(elapsed)
+                return result
+            del self._cache[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            WEB_SEARCH_REQUESTS.inc(source="shared")
+        else:
+            WEB_SEARCH_REQUESTS.inc(source="api")
+            task = asyncio.ensure_future(self._search(key, query, on_queued))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: пользователь, отменивший ожидание, не прерывает поиск для остальных
+        return await asyncio.shield(task)
+
+    async def _search(self, key: str, query: str, on_queued: Optional[QueueCallback]) -> dict | None:
+        started = time.monotonic()
+        result = await self._request(query, on_queued)
+        if result:
+            elapsed = time.monotonic() - started
+            self._cache[key] = (time.monotonic() + self.cache_ttl, result, elapsed)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    async def _request(self, query: str, on_queued: Optional[QueueCallback] = None) -> dict | None:
         """
         Отправляет запрос к генеративному поиску.
         Добавляет инструкцию для приоритета официальных источников.
@@ -28,7 +102,10 @@ class YandexWebSearchService:
 
         try:
             # Увеличиваем таймаут, так как поиск может занимать время
-            response = requests.post(self.url, headers=self.headers, json=data, timeout=60)
+            response = await api_scheduler.request(
+                "search", "POST", self.url, headers=self.headers, json=data, timeout=60.0,
+                priority=Priority.NORMAL, on_queued=on_queued
+            )
 
             if response.status_code != 200:
                 logger.error(f"Yandex Search API Error {response.status_code}: {response.text}")
@@ -36,9 +113,12 @@ class YandexWebSearchService:
 
             return response.json()
 
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Критическая ошибка сети при запросе к Yandex Search API: {e}")
             return None
         except Exception as e:
             logger.error(f"Непредвиденная ошибка в web_search_service: {e}")
-            return None
\ No newline at end of file
+            return None
+
+
+web_search_service = YandexWebSearchService()
@@ -1,11 +1,47 @@
 import httpx
 import logging
-import json
-import requests
-from src.config import YANDEX_API_KEY, YANDEX_MODEL_URI, YANDEX_FOLDER_ID
+import time
+from dataclasses import dataclass
+from typing import Optional
+from src.config import YANDEX_API_KEY, YANDEX_MODEL_URI, YANDEX_FOLDER_ID, GPT_JSON_MODE, GPT_ROUTES
+from src.services.api_scheduler import api_scheduler, Priority, QueueCallback
+from src.services.circuit_breaker import CircuitOpenError
+from src.services.token_accounting import token_accountant, model_name, estimate_cost
+from src.services.metrics import metrics
+from src.core.prompt_templates import get_template
+from src.utils.json_tools import parse_model_json, Base64JsonBody, BytesLike
 
 logger = logging.getLogger(__name__)
 
+PROMPT_BUILD_SECONDS = metrics.histogram(
+    "methodist_prompt_build_seconds", "Время сборки промпта",
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01)
+)
+PROMPT_BYTES = metrics.histogram(
+    "methodist_prompt_bytes", "Размер промпта: общий префикс и переменная часть", ["part"],
+    buckets=(256, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+)
+GPT_PARSE_OUTCOMES = metrics.counter(
+    "methodist_gpt_parse_total",
+    "Разбор структурированного ответа GPT (json — без исправлений, failed — ответ потерян)", ["outcome"]
+)
+
+ROUTE_SECONDS = metrics.histogram(
+    "methodist_gpt_route_seconds", "Длительность запросов к GPT по маршрутам (с ожиданием в очереди)",
+    ["route", "model"]
+)
+ROUTE_COST = metrics.counter(
+    "methodist_gpt_route_cost_rub_total", "Ориентировочная стоимость запросов к GPT по маршрутам, ₽", ["route", "model"]
+)
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """Параметры запроса для класса задач."""
+    model_uri: str
+    temperature: float
+    max_tokens: int
+
 
 class YandexGPTService:
     def __init__(self):
@@ -15,6 +51,11 @@ class YandexGPTService:
         self.model_uri = YANDEX_MODEL_URI
         # Мультимодальная модель Gemma 3 (обязательно с суффиксом -it)
         self.gemma_uri = f"gpt://{self.folder_id}/gemma-3-27b-it/latest"
+        # Маршруты: дешевые задачи (болтовня, чистка текста) не занимают квоту основной модели
+        self.routes = {
+            name: ModelRoute(f"gpt://{self.folder_id}/{model}/latest", temperature, max_tokens)
+            for name, (model, temperature, max_tokens) in GPT_ROUTES.items()
+        }
 
         # Эндпоинты
         # Нативный эндпоинт для YandexGPT
@@ -22,66 +63,123 @@ class YandexGPTService:
         # OpenAI-совместимый эндпоинт для моделей Gallery (Gemma, Qwen и др.)
         self.vlm_url = "https://llm.api.cloud.yandex.net/v1/chat/completions"
 
-    def generate_response(
+    async def generate_response(
             self,
             system_prompt: str,
             user_text: str,
             context_text: str = "",
             history: list = None,
-            full_name: str = "Пользователь"
+            full_name: str = "",
+            summary: str = "",
+            route: str = "rag",
+            priority: Priority = Priority.INTERACTIVE,
+            on_queued: Optional[QueueCallback] = None
     ) -> dict:
         """
-        Синхронная генерация текстового ответа.
+        Асинхронная генерация текстового ответа.
+        Отмена корутины прерывает и HTTP-запрос, поэтому устаревшие генерации не дожидаются ответа API.
+
+        :param summary: Резюме ранних реплик диалога (см. HistoryManager); history — последние реплики дословно.
+        :param route: Класс задачи (chat, rag, general, cleanup, creative) — определяет модель, temperature и maxTokens.
+
+        При любой неудаче в ответе есть ключ "error": True — хендлер может показать
+        пользователю исходный материал (фрагмент базы знаний, сырой OCR) вместо ответа модели.
+
+        Расход токенов учитывается; при превышении суточного бюджета запрос выполняется
+        в урезанном режиме (короче контекст и история, более дешевая модель).
         """
+        policy = token_accountant.policy_for()
+        model_route = self.routes.get(route, self.routes["rag"])
+        model_uri = policy.model_uri or model_route.model_uri
+        if policy.max_context_chars is not None:
+            context_text = context_text[:policy.max_context_chars]
+
         headers = {
             "Authorization": f"Api-Key {self.api_key}",
             "Content-Type": "application/json"
         }
 
-        json_instruction = (
-            "ВАЖНО: Твой ответ ДОЛЖЕН БЫТЬ СТРОГО в формате JSON.\n"
-            "Используй HTML-теги <b></b> для жирного шрифта.\n"
-            '{\n'
-            '  "text": "Текст ответа...",\n'
-            '  "suggestions": ["Подсказка 1", "Подсказка 2"]\n'
-            '}\n'
-        )
-
-        final_system_prompt = f"{system_prompt}\n\nПользователь: {full_name}.\n\n{json_instruction}"
-
-        messages = [{"role": "system", "text": final_system_prompt}]
-        if history:
-            messages.extend(history[-6:])
-
-        messages.append({"role": "user", "text": f"Контекст:\n{context_text}\n\nВопрос:\n{user_text}"})
+        # Стабильный префикс (системный промпт + формат ответа) идет первым, переменные части — в конце
+        with PROMPT_BUILD_SECONDS.time():
+            template = get_template(system_prompt)
+            messages = template.build(
+                user_text, context_text, history[-policy.history_messages:] if history else (), summary, full_name
+            )
+        PROMPT_BYTES.observe(template.prefix_bytes, part="prefix")
+        tail_bytes = sum(len(m["text"].encode("utf-8")) for m in messages[len(template.prefix):])
+        PROMPT_BYTES.observe(tail_bytes, part="tail")
 
         data = {
-            "modelUri": self.model_uri,
-            "completionOptions": {"stream": False, "temperature": 0.3, "maxTokens": 2000},
+            "modelUri": model_uri,
+            "completionOptions": {
+                "stream": False,
+                "temperature": model_route.temperature,
+                "maxTokens": min(model_route.max_tokens, policy.max_tokens)
+            },
             "messages": messages
         }
+        if GPT_JSON_MODE:
+            # Режим JSON-ответа API: модель возвращает валидный объект без markdown-обрамления
+            data["jsonObject"] = True
 
+        model = model_name(model_uri)
+        lane = "gpt_lite" if model.endswith("-lite") else "gpt"
         try:
-            response = requests.post(self.text_url, headers=headers, json=data, timeout=30)
+            started = time.perf_counter()
+            response = await api_scheduler.request(
+                lane, "POST", self.text_url, headers=headers, json=data, timeout=30.0,
+                priority=priority, on_queued=on_queued
+            )
+            ROUTE_SECONDS.observe(time.perf_counter() - started, route=route, model=model)
             if response.status_code != 200:
                 logger.error(f"GPT Error {response.status_code}: {response.text}")
-                return {"text": "Ошибка нейросети.", "suggestions": []}
+                return {"text": "Ошибка нейросети.", "suggestions": [], "error": True}
+
+            result = response.json()['result']
+            usage = result.get('usage', {})
+            input_tokens, output_tokens = int(usage.get('inputTextTokens', 0)), int(usage.get('completionTokens', 0))
+            token_accountant.record(model_uri, input_tokens, output_tokens)
+            ROUTE_COST.inc(estimate_cost(model, input_tokens + output_tokens), route=route, model=model)
+            alternative = result['alternatives'][0]
+            raw_text = alternative['message']['text']
+        except CircuitOpenError:
+            return {"text": "Нейросеть временно недоступна.", "suggestions": [], "error": True}
+        except httpx.HTTPError as e:
+            logger.error(f"GPT Network Error: {e}")
+            return {"text": "Нейросеть временно недоступна.", "suggestions": [], "error": True}
+        except Exception as e:
+            # Неожиданный конверт ответа API — не ошибка разбора текста модели, в GPT_PARSE_OUTCOMES не идет
+            logger.error(f"GPT Response Error: {e!r}")
+            return {"text": "Ошибка обработки данных.", "suggestions": [], "error": True}
 
-            raw_text = response.json()['result']['alternatives'][0]['message']['text']
-            clean_json = raw_text.strip().replace("```json", "").replace("```", "")
-            return json.loads(clean_json)
+        try:
+            parsed, outcome = parse_model_json(raw_text)
         except Exception as e:
+            GPT_PARSE_OUTCOMES.inc(outcome="failed")
             logger.error(f"GPT Parse Error: {e}")
-            return {"text": "Ошибка обработки данных.", "suggestions": []}
-
-    async def generate_vlm_response(self, prompt: str, image_base64: str) -> str:
+            return {"text": "Ошибка обработки данных.", "suggestions": [], "error": True}
+        GPT_PARSE_OUTCOMES.inc(outcome=outcome)
+        if outcome != "json":
+            logger.warning(f"Ответ GPT разобран с исправлениями ({outcome}), статус {alternative.get('status')}")
+        if not parsed["text"].strip():
+            return {"text": "Нейросеть вернула пустой ответ.", "suggestions": [], "error": True}
+        return parsed
+
+    async def generate_vlm_response(
+            self,
+            prompt: str,
+            image: BytesLike,
+            priority: Priority = Priority.BATCH,
+            on_queued: Optional[QueueCallback] = None
+    ) -> str:
         """
         Асинхронная генерация ответа на основе изображения (Gemma 3).
         Использует корректный OpenAI-совместимый эндпоинт llm.api.
+
+        :param image: Байты JPEG (bytes или memoryview); в data URL они кодируются по частям при отправке.
         """
         headers = {
-            "Authorization": f"Api-Key {self.api_key}",
-            "Content-Type": "application/json"
+            "Authorization": f"Api-Key {self.api_key}"
         }
 
         # Стандартная структура OpenAI Chat Completions для мультимодальных моделей
@@ -98,7 +196,7 @@ class YandexGPTService:
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
+                                "url": Base64JsonBody.PLACEHOLDER
                             }
                         }
                     ]
@@ -108,19 +206,30 @@ class YandexGPTService:
             "temperature": 0.1
         }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                # ВАЖНО: запрос идет на llm.api.cloud.yandex.net/v1/chat/completions
-                response = await client.post(self.vlm_url, headers=headers, json=data, timeout=90.0)
-
-                if response.status_code != 200:
-                    logger.error(f"VLM Error {response.status_code}: {response.text}")
-                    return f"Ошибка анализа изображения (код {response.status_code}). Проверьте квоты на Gemma 3."
-
-                result = response.json()
-                # В OpenAI формате ответ лежит в choices[0].message.content
-                return result['choices'][0]['message']['content']
+        body = Base64JsonBody(data, image, prefix="data:image/jpeg;base64,")
+        try:
+            # ВАЖНО: запрос идет на llm.api.cloud.yandex.net/v1/chat/completions
+            response = await api_scheduler.request(
+                "vlm", "POST", self.vlm_url, headers={**headers, **body.headers}, content=body, timeout=90.0,
+                priority=priority, on_queued=on_queued
+            )
 
-            except Exception as e:
-                logger.error(f"VLM Critical Error: {e}")
-                return "Произошла ошибка при связи с визуальной моделью."
\ No newline at end of file
+            if response.status_code != 200:
+                logger.error(f"VLM Error {response.status_code}: {response.text}")
+                return f"Ошибка анализа изображения (код {response.status_code}). Проверьте квоты на Gemma 3."
+
+            result = response.json()
+            usage = result.get('usage', {})
+            token_accountant.record(
+                self.gemma_uri, int(usage.get('prompt_tokens', 0)), int(usage.get('completion_tokens', 0))
+            )
+            # В OpenAI формате ответ лежит в choices[0].message.content
+            return result['choices'][0]['message']['content']
+
+        except CircuitOpenError:
+            return "Визуальная модель временно недоступна. Попробуйте позже."
+        except Exception as e:
+            logger.error(f"VLM Critical Error: {e}")
+            return "Произошла ошибка при связи с визуальной моделью."
+        finally:
+            body.release()
\ No newline at end of file
@@ -0,0 +1,82 @@
+from collections import deque
+from typing import Any, Generic, Iterable, Iterator, NamedTuple, TypeVar
+
+T = TypeVar("T")
+
+
+class Match(NamedTuple):
+    start: int
+    end: int  # позиция после последнего символа
+    pattern: str
+    value: Any
+
+
+class AhoCorasick(Generic[T]):
+    def __init__(self, patterns: Iterable[tuple[str, T]] = ()):
+        """
+        Автомат Ахо — Корасик: поиск всех вхождений набора подстрок за один проход по тексту,
+        независимо от числа шаблонов. Шаблоны добавляются через add(), затем автомат компилируется build().
+
+        :param patterns: Пары (подстрока, связанное значение); одна подстрока может нести несколько значений.
+        """
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._own: list[list[tuple[str, T]]] = [[]]  # шаблоны, заканчивающиеся в узле
+        self._out: list[list[tuple[str, T]]] = [[]]  # то же плюс шаблоны по цепочке суффиксных ссылок
+        self._built = False
+        for pattern, value in patterns:
+            self.add(pattern, value)
+        self.build()
+
+    def add(self, pattern: str, value: T):
+        if not pattern:
+            return
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append([])
+            node = next_node
+        self._own[node].append((pattern, value))
+        self._built = False
+
+    def build(self):
+        """Вычисляет суффиксные ссылки обходом в ширину и объединяет выходы по ним."""
+        goto, fail = self._goto, self._fail
+        self._out = [list(own) for own in self._own]
+        queue = deque(goto[0].values())
+        for node in queue:
+            fail[node] = 0
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                self._out[child].extend(self._out[fail[child]])
+                queue.append(child)
+        self._built = True
+
+    def __len__(self) -> int:
+        return sum(len(own) for own in self._own)
+
+    def iter(self, text: str) -> Iterator[Match]:
+        """Все вхождения шаблонов в text (в том числе перекрывающиеся), по возрастанию позиции конца."""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for pattern, value in out[node]:
+                yield Match(i + 1 - len(pattern), i + 1, pattern, value)
+
+    def contains_any(self, text: str) -> bool:
+        return next(self.iter(text), None) is not None
@@ -0,0 +1,122 @@
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, Union
+
+import docx
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pypdf не установлен — PDF пропускаются, DOCX обрабатываются
+    PdfReader = None
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = {".pdf", ".docx"}
+DOCX_PAGE_CHARS = 3000  # в DOCX нет страниц — режем текст на порции сопоставимого размера
+
+Source = Union[str, Path, BinaryIO]
+
+
+@dataclass
+class ExtractedDocument:
+    title: str
+    pages: list[str]
+
+    @property
+    def text(self) -> str:
+        return "\n\n".join(page for page in self.pages if page)
+
+
+def _clean(text: str) -> str:
+    # Переносы слов на границе строк и лишние пробелы, типичные для текстового слоя PDF
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    text = re.sub(r"[ \t\u00a0]+", " ", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _first_line(pages: list[str]) -> str:
+    for page in pages:
+        for line in page.splitlines():
+            line = line.strip()
+            if len(line) > 3:
+                return line[:150]
+    return ""
+
+
+def iter_pdf_pages(source: Source) -> Iterator[str]:
+    """Текст PDF постранично; страницы читаются по одной, файл целиком в память не загружается."""
+    if PdfReader is None:
+        raise RuntimeError("Для извлечения текста из PDF нужен пакет pypdf")
+    reader = PdfReader(source)
+    for page in reader.pages:
+        try:
+            yield _clean(page.extract_text() or "")
+        except Exception as e:
+            logger.warning(f"Не удалось извлечь текст страницы PDF: {e}")
+            yield ""
+
+
+def iter_docx_pages(source: Source, page_chars: int = DOCX_PAGE_CHARS) -> Iterator[str]:
+    """Текст DOCX (абзацы и таблицы) порциями примерно по page_chars символов."""
+    document = docx.Document(source)
+    blocks = [paragraph.text for paragraph in document.paragraphs]
+    for table in document.tables:
+        for row in table.rows:
+            blocks.append(" | ".join(cell.text.strip() for cell in row.cells))
+
+    page, size = [], 0
+    for block in blocks:
+        block = block.strip()
+        if not block:
+            continue
+        page.append(block)
+        size += len(block)
+        if size >= page_chars:
+            yield _clean("\n".join(page))
+            page, size = [], 0
+    if page:
+        yield _clean("\n".join(page))
+
+
+def iter_pages(path: Path) -> Iterator[str]:
+    suffix = path.suffix.lower()
+    if suffix == ".pdf":
+        return iter_pdf_pages(path)
+    if suffix == ".docx":
+        return iter_docx_pages(path)
+    raise ValueError(f"Неподдерживаемый формат: {path.suffix}")
+
+
+def _pdf_title(path: Path) -> str:
+    try:
+        title = (PdfReader(path).metadata or {}).get("/Title") or ""
+    except Exception:
+        return ""
+    title = str(title).strip()
+    # Служебные заголовки вроде "Microsoft Word - doc1.docx" и нераскодированные <4D69...> бесполезны
+    if not title or title.startswith("<") or title.lower().startswith("microsoft") or "." in title[-6:]:
+        return ""
+    return title
+
+
+def _docx_title(path: Path) -> str:
+    document = docx.Document(path)
+    if document.core_properties.title:
+        return document.core_properties.title.strip()
+    for paragraph in document.paragraphs:
+        if paragraph.style is not None and paragraph.style.name.startswith(("Title", "Heading")) \
+                and paragraph.text.strip():
+            return paragraph.text.strip()[:150]
+    return ""
+
+
+def extract_document(path: Path) -> ExtractedDocument:
+    """
+    Заголовок и постраничный текст PDF или DOCX.
+    Заголовок берется из свойств документа, иначе — первая содержательная строка, иначе — имя файла.
+    """
+    pages = list(iter_pages(path))
+    title = _pdf_title(path) if path.suffix.lower() == ".pdf" else _docx_title(path)
+    return ExtractedDocument(title=title or _first_line(pages) or path.stem, pages=pages)
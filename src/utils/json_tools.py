@@ -0,0 +1,156 @@
+import base64
+import json
+import re
+from typing import AsyncIterator, Optional, Union
+
+_DECODER = json.JSONDecoder(strict=False)
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+
+
+def _scan_string(raw: str, start: int) -> tuple[str, int, bool]:
+    """
+    Читает строковый литерал JSON, начиная сразу после открывающей кавычки.
+    Возвращает (значение, позиция после литерала, закрыт ли литерал) — оборванная строка тоже возвращается.
+    """
+    i = start
+    length = len(raw)
+    while i < length:
+        char = raw[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == '"':
+            return _unescape(raw[start:i]), i + 1, True
+        i += 1
+    # Ответ оборвался внутри строки (лимит maxTokens) — отбрасываем незавершенную escape-последовательность
+    body = raw[start:]
+    if body.endswith("\\") and not body.endswith("\\\\"):
+        body = body[:-1]
+    return _unescape(body), length, False
+
+
+def _unescape(body: str) -> str:
+    try:
+        return _DECODER.decode(f'"{body}"')
+    except ValueError:
+        # Битая \\u-последовательность и т.п. — заменяем только самые частые экранирования
+        return body.replace('\\n', "\n").replace('\\"', '"').replace("\\\\", "\\")
+
+
+def _find_key(raw: str, key: str) -> Optional[int]:
+    """Позиция сразу после двоеточия за ключом "key"."""
+    match = re.search(rf'"{key}"\s*:\s*', raw)
+    return match.end() if match else None
+
+
+def _recover(raw: str) -> Optional[dict]:
+    """Посимвольно достает text и suggestions из испорченного или оборванного JSON."""
+    position = _find_key(raw, "text")
+    if position is None or position >= len(raw) or raw[position] != '"':
+        return None
+    text, _, _ = _scan_string(raw, position + 1)
+
+    suggestions = []
+    position = _find_key(raw, "suggestions")
+    if position is not None and position < len(raw) and raw[position] == "[":
+        i = position + 1
+        while i < len(raw):
+            char = raw[i]
+            if char == "]":
+                break
+            if char == '"':
+                value, i, closed = _scan_string(raw, i + 1)
+                if closed:
+                    suggestions.append(value)
+                continue
+            i += 1
+    return {"text": text, "suggestions": suggestions}
+
+
+def _normalize(data: dict) -> Optional[dict]:
+    text = data.get("text")
+    if not isinstance(text, str):
+        return None
+    suggestions = data.get("suggestions")
+    if not isinstance(suggestions, list):
+        suggestions = []
+    return {"text": text, "suggestions": [str(item) for item in suggestions if isinstance(item, (str, int, float))]}
+
+
+def parse_model_json(raw: str) -> tuple[dict, str]:
+    """
+    Разбирает ответ модели вида {"text": ..., "suggestions": [...]}.
+
+    Порядок: строгий JSON -> первый JSON-объект в тексте (лишние фразы, markdown-ограждения) ->
+    посимвольное восстановление полей из оборванного или испорченного JSON -> весь ответ как текст.
+    Оплаченный ответ не выбрасывается ни в одном из случаев.
+
+    :return: (данные, способ разбора: "json", "extracted", "recovered" или "raw").
+    """
+    cleaned = _FENCE_RE.sub("", raw.strip())
+
+    try:
+        data = _DECODER.decode(cleaned)
+        if isinstance(data, dict) and (result := _normalize(data)):
+            return result, "json"
+    except ValueError:
+        pass
+
+    start = cleaned.find("{")
+    if start != -1:
+        try:
+            data, _ = _DECODER.raw_decode(cleaned, start)
+            if isinstance(data, dict) and (result := _normalize(data)):
+                return result, "extracted"
+        except ValueError:
+            pass
+        if result := _recover(cleaned[start:]):
+            return result, "recovered"
+
+    return {"text": cleaned, "suggestions": []}, "raw"
+
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class Base64JsonBody:
+    """
+    Тело JSON-запроса, в одно из строковых полей которого вложены данные в base64.
+
+    Вместо b64encode(...).decode() -> f-строка -> json.dumps (три полноразмерные копии файла и еще
+    одна при отправке) тело отдается httpx по частям: JSON до поля, base64 блоками по chunk_size байт
+    исходных данных, JSON после поля. В памяти одновременно — только один блок. Длина известна заранее,
+    поэтому запрос уходит с Content-Length, а не chunked. Объект можно отправить повторно (ретраи).
+    """
+    PLACEHOLDER = "__BASE64_CONTENT__"
+
+    def __init__(self, payload: dict, data: BytesLike, prefix: str = "", chunk_size: int = 192 * 1024):
+        """
+        :param payload: JSON запроса; значение с данными задается строкой Base64JsonBody.PLACEHOLDER.
+        :param data: Исходные байты (например, BytesIO.getbuffer() — без копирования).
+        :param prefix: Текст перед base64 внутри того же поля, например "data:image/jpeg;base64,".
+        :param chunk_size: Кратно 3, чтобы блоки base64 склеивались без паддинга в середине.
+        """
+        head, tail = json.dumps(payload, ensure_ascii=False).split(self.PLACEHOLDER)
+        self._head = (head + prefix).encode("utf-8")
+        self._tail = tail.encode("utf-8")
+        self._data = memoryview(data).cast("B")
+        self.chunk_size = chunk_size - chunk_size % 3
+
+    def __len__(self) -> int:
+        return len(self._head) + 4 * ((len(self._data) + 2) // 3) + len(self._tail)
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {"Content-Type": "application/json", "Content-Length": str(len(self))}
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield self._head
+        data = self._data
+        for start in range(0, len(data), self.chunk_size):
+            yield base64.b64encode(data[start:start + self.chunk_size])
+        yield self._tail
+
+    def release(self):
+        """Освобождает ссылку на буфер с данными (после этого BytesIO можно закрыть или изменить)."""
+        self._data.release()
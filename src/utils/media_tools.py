@@ -1,37 +1,45 @@
 import io
-import base64
+import asyncio
 import re
 import logging
 import qrcode
 import cv2
 import numpy as np
 from typing import Optional
-from docx import Document
-from docx.shared import Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
 from aiogram import Bot
 
 # Импорты для распознавания
 from pyzbar.pyzbar import decode
 from PIL import Image
 
+from src.utils.json_tools import BytesLike
+from src.utils.markdown_docx import markdown_docx_renderer
+
 logger = logging.getLogger(__name__)
 
 
-async def decode_qr_code(bot: Bot, photo_id: str) -> str:
+async def read_telegram_file(bot: Bot, file) -> io.BytesIO:
+    """Скачивает файл Telegram в BytesIO; данные брать через getbuffer(), без копии getvalue()."""
+    buffer = io.BytesIO()
+    await bot.download(file, destination=buffer)
+    return buffer
+
+
+async def decode_qr_code(image_data: BytesLike) -> str:
     """
     Улучшенное распознавание QR-кода с предварительной обработкой изображения.
     Эффективно борется с муаром (сеткой пикселей) при фото с экрана.
+    Обработка OpenCV идет в рабочем потоке, чтобы не блокировать event loop.
     """
-    try:
-        # 1. Загрузка изображения
-        file_info = await bot.get_file(photo_id)
-        photo_bytes = io.BytesIO()
-        await bot.download_file(file_info.file_path, photo_bytes)
+    return await asyncio.to_thread(_decode_qr_code, image_data)
+
 
-        # Конвертируем байты в формат OpenCV (numpy array)
-        file_bytes = np.frombuffer(photo_bytes.getvalue(), dtype=np.uint8)
+def _decode_qr_code(image_data: BytesLike) -> str:
+    try:
+        # 1. Байты -> numpy array без копирования (frombuffer работает поверх того же буфера)
+        file_bytes = np.frombuffer(image_data, dtype=np.uint8)
         image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+        del file_bytes
 
         if image is None:
             return ""
@@ -39,6 +47,7 @@ async def decode_qr_code(bot: Bot, photo_id: str) -> str:
         # 2. ПРЕДОБРАБОТКА (Pre-processing)
         # Перевод в градации серого
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        del image  # цветной кадр больше не нужен — освобождаем до фильтрации
 
         # Применяем легкое размытие по Гауссу.
         # Это "размывает" пиксельную сетку монитора, помогая pyzbar увидеть общую структуру.
@@ -46,6 +55,7 @@ async def decode_qr_code(bot: Bot, photo_id: str) -> str:
 
         # Адаптивная бинаризация для создания высокого контраста
         thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+        del blurred
 
         # 3. ПОПЫТКА РАСПОЗНАВАНИЯ
         # Сначала пробуем распознать обработанное изображение
@@ -85,27 +95,9 @@ def generate_qr_image(text: str) -> io.BytesIO:
     return buf
 
 
-def create_formatted_docx(md_text: str, title: str = "Распознанный документ") -> io.BytesIO:
-    """Создание DOCX (без изменений)."""
-    doc = Document()
-    style = doc.styles['Normal']
-    style.font.name = 'Times New Roman'
-    style.font.size = Pt(12)
-    clean_text = re.sub(r'^(Вот|Here is|Результат|Analysis|Извлеченный|Ниже).*?[:\n]', '', md_text,
-                        flags=re.IGNORECASE | re.DOTALL).strip()
-    doc.add_heading(title, 0).alignment = WD_ALIGN_PARAGRAPH.CENTER
-    for line in clean_text.split('\n'):
-        line = line.strip()
-        if line: doc.add_paragraph(line)
-    buffer = io.BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
-    return buffer
-
-
-async def encode_image_to_base64(bot: Bot, photo_id: str) -> str:
-    """Кодирование в Base64 (без изменений)."""
-    file_info = await bot.get_file(photo_id)
-    photo_bytes = io.BytesIO()
-    await bot.download_file(file_info.file_path, photo_bytes)
-    return base64.b64encode(photo_bytes.getvalue()).decode('utf-8')
\ No newline at end of file
+async def create_formatted_docx(md_text: str, title: str = "Распознанный документ") -> io.BytesIO:
+    """
+    DOCX из markdown-ответа VLM: заголовки, списки, жирный шрифт и настоящие таблицы Word.
+    Сборка документа для больших сканов занимает заметное время, поэтому идет в рабочем потоке.
+    """
+    return await asyncio.to_thread(markdown_docx_renderer.render, md_text, title)
@@ -1,19 +1,226 @@
+import logging
 import re
-import textwrap
-from html import escape
+from html import escape, unescape
 from aiogram.types import Message
 from aiogram.exceptions import TelegramBadRequest
 
+logger = logging.getLogger(__name__)
+
+
+# Теги, которые понимает Telegram (parse_mode="HTML"); у остальных остается только текст
+ALLOWED_TAGS = {
+    "b": "b", "strong": "b", "i": "i", "em": "i", "u": "u", "ins": "u", "s": "s", "strike": "s", "del": "s",
+    "a": "a", "code": "code", "pre": "pre", "tg-spoiler": "tg-spoiler", "blockquote": "blockquote",
+}
+# Блочные теги превращаются в перенос строки, ячейки таблиц — в разделители « | »
+_BLOCK_TAGS = {"br", "table", "tr", "div", "p", "body", "html", "head"}
+_TELEGRAM_ENTITIES = {"lt", "gt", "amp", "quot"}
+MESSAGE_LIMIT = 4096
+
+_HTML_TOKEN_RE = re.compile(
+    r"<!--.*?-->|<![^>]*>"
+    r"|<(/?)([a-zA-Z][a-zA-Z0-9-]*)((?:\s+[^<>]*?)?)\s*/?>"
+    r"|&(#\d{1,7}|#[xX][0-9a-fA-F]{1,6}|[a-zA-Z][a-zA-Z0-9]{1,31});"
+    r"|\*\*|[<>&]",
+    re.DOTALL
+)
+_HREF_RE = re.compile(r"""href\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.IGNORECASE)
+_CODE_CLASS_RE = re.compile(r"""class\s*=\s*["']?(language-[\w+#-]+)""", re.IGNORECASE)
+_SPLIT_TOKEN_RE = re.compile(r"<[^>]*>|&[^;]*;")
+_TAG_RE = re.compile(r"<[^>]*>")
+
 
 def clean_html_for_telegram(text: str) -> str:
-    """Очищает HTML от запрещенных тегов."""
-    text = re.sub(r'<!DOCTYPE.*?>', '', text, flags=re.IGNORECASE | re.DOTALL)
-    text = re.sub(r'<br\s*/?>', '\n', text, flags=re.IGNORECASE)
-    text = re.sub(r'</?(table|tr|div|p|body|html|head).*?>', '\n', text, flags=re.IGNORECASE)
-    text = re.sub(r'<td.*?>', ' ', text, flags=re.IGNORECASE)
-    text = re.sub(r'</td>', ' | ', text, flags=re.IGNORECASE)
-    text = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', text)
-    return text.strip()
+    """
+    Приводит HTML ответа модели к подмножеству, которое принимает Telegram, за один проход токенизатора.
+
+    Неподдерживаемые теги удаляются (блочные — с переносом строки), **жирный** markdown становится <b>,
+    одиночные «<», «&» и неизвестные сущности экранируются, незакрытые теги закрываются, а лишние
+    закрывающие — отбрасываются. Внутри <code> и <pre> разметка не разбирается и выводится как текст.
+    """
+    out: list[str] = []
+    stack: list[str] = []  # открытые теги Telegram (нормализованные имена)
+    markdown_bold = False
+    position = 0
+
+    def close_to(name: str):
+        while stack:
+            tag = stack.pop()
+            out.append(f"</{tag}>")
+            if tag == name:
+                return
+
+    for match in _HTML_TOKEN_RE.finditer(text):
+        start = match.start()
+        if start > position:
+            out.append(text[position:start])
+        position = match.end()
+        token = match.group(0)
+        raw_name = match.group(2)
+        literal = stack and stack[-1] in ("code", "pre")
+
+        if raw_name is not None:
+            name = raw_name.lower()
+            closing = bool(match.group(1))
+            tag = ALLOWED_TAGS.get(name)
+            if literal and not (closing and tag in stack) and not (tag == "code" and stack[-1] == "pre"):
+                out.append(escape(token, quote=False))
+            elif tag is None:
+                if name in _BLOCK_TAGS:
+                    out.append("\n")
+                elif name in ("td", "th"):
+                    out.append(" | " if closing else " ")
+            elif closing:
+                if tag in stack:
+                    close_to(tag)
+            elif tag == "a":
+                href = _HREF_RE.search(match.group(3))
+                if href:
+                    url = next(group for group in href.groups() if group is not None)
+                    out.append(f'<a href="{escape(unescape(url))}">')
+                    stack.append("a")
+            elif tag == "code" and (language := _CODE_CLASS_RE.search(match.group(3))):
+                out.append(f'<code class="{language.group(1)}">')
+                stack.append("code")
+            else:
+                out.append(f"<{tag}>")
+                stack.append(tag)
+        elif token.startswith("<!"):
+            # Комментарии и <!DOCTYPE> выбрасываем
+            if literal:
+                out.append(escape(token, quote=False))
+        elif match.group(4) is not None:
+            entity = match.group(4)
+            if entity[0] == "#" or entity in _TELEGRAM_ENTITIES:
+                out.append(token)
+            else:
+                # &nbsp;, &mdash; и т.п. Telegram не знает — подставляем сам символ
+                out.append(escape(unescape(token), quote=False))
+        elif token == "**":
+            if literal:
+                out.append(token)
+            elif markdown_bold:
+                if "b" in stack:
+                    close_to("b")
+                markdown_bold = False
+            elif not markdown_bold and text.find("**", position, _line_end(text, position)) != -1:
+                out.append("<b>")
+                stack.append("b")
+                markdown_bold = True
+            else:
+                out.append(token)
+        else:
+            out.append(escape(token, quote=False))
+    out.append(text[position:])
+    out.extend(f"</{tag}>" for tag in reversed(stack))
+    return "".join(out).strip()
+
+
+def _line_end(text: str, position: int) -> int:
+    end = text.find("\n", position)
+    return len(text) if end == -1 else end
+
+
+def _visible_length(text: str) -> int:
+    """Длина в единицах UTF-16: так Telegram считает лимит сообщения (эмодзи — 2)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _cut_position(text: str, budget: int) -> int:
+    """Сколько символов text поместится в budget единиц UTF-16."""
+    cut = min(len(text), budget)
+    while cut and _visible_length(text[:cut]) > budget:
+        cut -= max(1, (_visible_length(text[:cut]) - budget) // 2)
+    return cut
+
+
+def split_html_for_telegram(text: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """
+    Делит очищенный HTML на минимальное число сообщений по limit видимых символов.
+
+    Резать стараемся по абзацу, строке или пробелу, но никогда внутри тега или сущности.
+    Теги, открытые на границе, закрываются в конце сообщения и открываются заново в начале следующего,
+    поэтому каждое сообщение — корректный HTML.
+    """
+    if _visible_length(text) <= limit:
+        return [text] if text else []
+
+    chunks: list[str] = []
+    parts: list[str] = []
+    open_tags: list[tuple[str, str]] = []  # (имя, открывающий тег целиком)
+    size = 0
+
+    def flush():
+        nonlocal size
+        body = "".join(parts)
+        closing = "".join(f"</{name}>" for name, _ in reversed(open_tags))
+        if size:
+            chunks.append((body + closing).strip())
+        parts[:] = [opening for _, opening in open_tags]
+        size = 0
+
+    def add_text(piece: str):
+        nonlocal size
+        while piece:
+            budget = limit - size
+            length = _visible_length(piece)
+            if length <= budget:
+                parts.append(piece)
+                size += length
+                return
+            cut = _cut_position(piece, budget)
+            head = piece[:cut]
+            # Лучшее место разреза: пустая строка, перенос строки, пробел — если сообщение
+            # при этом заполнено хотя бы наполовину, иначе сообщений выйдет больше необходимого
+            for separator in ("\n\n", "\n", " "):
+                index = head.rfind(separator)
+                if index > 0 and size + index >= limit // 2:
+                    cut = index + len(separator)
+                    break
+            else:
+                if size > limit // 2:
+                    cut = 0  # текущее сообщение и так заполнено — переносим слово целиком
+            parts.append(piece[:cut])
+            size += _visible_length(piece[:cut])
+            flush()
+            piece = piece[cut:].lstrip(" \n")
+
+    position = 0
+    for match in _SPLIT_TOKEN_RE.finditer(text):
+        if match.start() > position:
+            add_text(text[position:match.start()])
+        position = match.end()
+        token = match.group(0)
+        if token[0] == "&":
+            if size + 1 > limit:
+                flush()
+            parts.append(token)
+            size += 1
+        elif token.startswith("</"):
+            name = token[2:-1].strip().lower()
+            if open_tags and open_tags[-1][0] == name:
+                open_tags.pop()
+            parts.append(token)
+        else:
+            name = token[1:-1].split(None, 1)[0].lower()
+            open_tags.append((name, token))
+            parts.append(token)
+    if position < len(text):
+        add_text(text[position:])
+    flush()
+    return [chunk for chunk in chunks if chunk]
+
+
+def make_queue_notifier(status_msg: Message | None):
+    """Создает колбэк, сообщающий пользователю его место в очереди к API при пиковой нагрузке."""
+    async def notify(position: int):
+        if status_msg is None:
+            return
+        try:
+            await status_msg.edit_text(f"⏳ Сейчас много запросов. Ваше место в очереди: {position}")
+        except TelegramBadRequest:
+            pass
+    return notify
 
 
 def format_web_search_result(text: str, sources: list) -> str:
@@ -35,20 +242,16 @@ def format_web_search_result(text: str, sources: list) -> str:
 
 
 async def send_split_message(message: Message, text: str, reply_markup=None, disable_web_preview=False):
-    """Разбивает длинные сообщения."""
-    text = clean_html_for_telegram(text)
-    if len(text) <= 4096:
+    """Очищает HTML и отправляет текст минимальным числом сообщений; клавиатура — у последнего."""
+    chunks = split_html_for_telegram(clean_html_for_telegram(text))
+    for i, chunk in enumerate(chunks):
+        markup = reply_markup if i == len(chunks) - 1 else None
         try:
-            await message.answer(text, reply_markup=reply_markup, parse_mode="HTML",
+            await message.answer(chunk, reply_markup=markup, parse_mode="HTML",
+                                 disable_web_page_preview=disable_web_preview)
+        except TelegramBadRequest as e:
+            # Не должно случаться после очистки; отправляем видимый текст без разметки.
+            # parse_mode=None обязателен: у бота HTML по умолчанию, а после unescape в тексте могут быть «<» и «&»
+            logger.warning(f"Telegram отклонил HTML сообщения: {e}")
+            await message.answer(unescape(_TAG_RE.sub("", chunk)), reply_markup=markup, parse_mode=None,
                                  disable_web_page_preview=disable_web_preview)
-        except TelegramBadRequest:
-            await message.answer(escape(text), reply_markup=reply_markup)
-    else:
-        chunks = textwrap.wrap(text, width=4000, replace_whitespace=False, drop_whitespace=False)
-        for i, chunk in enumerate(chunks):
-            is_last = (i == len(chunks) - 1)
-            try:
-                await message.answer(chunk, reply_markup=reply_markup if is_last else None, parse_mode="HTML",
-                                     disable_web_page_preview=disable_web_preview)
-            except:
-                await message.answer(escape(chunk), reply_markup=reply_markup if is_last else None)
\ No newline at end of file